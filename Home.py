@@ -2,7 +2,7 @@ import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from utils import DataManager
+from utils import DataManager, plotly_chart
 
 
 
@@ -14,7 +14,7 @@ st.set_page_config(
 )
 
 # Instantiate the DataManager
-dm = DataManager()
+dm = DataManager("Home")
 # Load data (only once)
 #energy_data = dm.load_energy()
 
@@ -47,21 +47,27 @@ if optimization_method == "Gas Consumption":
     fig1 = go.Figure()
     fig1.add_trace(go.Scatter(x=df['timestamp'], y=df['gas'], mode='lines', name='Gas Consumption', line=dict(color='blue')))
     fig1.update_layout(title="Gas Consumption Over Time", xaxis_title="Timestamp", yaxis_title="Consumption (m³)")
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 
 elif optimization_method == "Water Usage":
     st.subheader("💧 Water Consumption Trend")
     fig2 = go.Figure()
     fig2.add_trace(go.Scatter(x=df['timestamp'], y=df['water'], mode='lines', name='Water Consumption', line=dict(color='green')))
     fig2.update_layout(title="Water Consumption Over Time", xaxis_title="Timestamp", yaxis_title="Consumption (m³)")
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, use_container_width=True)
 
 elif optimization_method == "Energy Efficiency":
     st.subheader("⚡ Energy Consumption Trend")
     fig3 = go.Figure()
     fig3.add_trace(go.Scatter(x=df['timestamp'], y=df['energy'], mode='lines', name='Energy Consumption', line=dict(color='red')))
     fig3.update_layout(title="Energy Consumption Over Time", xaxis_title="Timestamp", yaxis_title="Consumption (kWh)")
-    st.plotly_chart(fig3, use_container_width=True)
+    plotly_chart(fig3, use_container_width=True)
+
+memory = dm.memory_report()
+if not memory.empty:
+    with st.sidebar.expander("🧠 Shared dataset memory"):
+        st.dataframe(memory[["rows", "MB", "load_seconds", "source"]], use_container_width=True)
+        st.caption(f"Total: {memory['MB'].sum():,.1f} MB")
 
 st.markdown("""
     ### Take control of your building's energy footprint today
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+
+# Readings of meters with different sampling rates on one time grid. A reading
+# is the consumption of the interval starting at its timestamp, that interval
+# being the meter's usual spacing (the median gap between its readings). On a
+# grid finer than the meter, a reading is spread evenly over the steps it
+# covers; on a coarser grid, the readings within a step are summed. Either way
+# every campus keeps its total.
+
+ALIGN_FREQ = os.environ.get("DASH_ALIGN_FREQ", "H")
+
+
+def grid_step(freq):
+    # Length of one grid step in nanoseconds ("H", "15min", "D", ...).
+    return to_offset(freq).nanos
+
+
+def align(df, freq=ALIGN_FREQ):
+    # Consumption per (campus_id, timestamp) step of the grid, sorted, from a
+    # frame of readings sorted by (campus_id, timestamp).
+    step = grid_step(freq)
+    campus = df['campus_id'].to_numpy()
+    ns = df['timestamp'].to_numpy().astype('M8[ns]').view(np.int64)
+    values = df['consumption'].to_numpy(dtype=float)
+    # Each campus's reading interval in grid steps (as floats: the median of
+    # a timedelta column with NaT is wrong in groupby transforms).
+    gaps = df.groupby('campus_id', observed=True)['timestamp'].diff() / pd.Timedelta(step, "ns")
+    interval = gaps.groupby(df['campus_id'], observed=True).transform('median').fillna(1.0).to_numpy()
+    steps = np.maximum(1, np.rint(interval)).astype(np.int64)
+    if (steps > 1).any():
+        rows = np.repeat(np.arange(len(df)), steps)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(steps) - steps, steps)
+        campus, ns, values = campus[rows], ns[rows] + offsets * step, values[rows] / steps[rows]
+    index = pd.MultiIndex.from_arrays(
+        [campus, (ns // step * step).astype('M8[ns]')], names=['campus_id', 'timestamp'],
+    )
+    return pd.Series(values, index=index, name='consumption').groupby(level=[0, 1]).sum(min_count=1)
@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+from alignment import ALIGN_FREQ, align
+from anomalies import RollingAnomalyEngine
+from scoring import fit_scorer
+from simulation import UTILITIES, run_monte_carlo
+from storage import DATASETS
+from tariffs import BANDS, FLAT_RATES, TARIFF
+
+
+# The metrics behind the dashboard pages, computed from a DatasetStore without
+# Streamlit so they can also be produced in batch (see report.py).
+
+CO2_FACTORS = {"electricity": 0.233, "gas": 2.204, "water": 0.0015}  # kg per unit
+COST_FACTORS = FLAT_RATES  # USD per unit
+
+POLICIES = ["Reduce Heating by 10%", "Efficient Water Fixtures", "Solar Panels Installed", "Shorten Building Hours"]
+# Utility each policy reduces, and by how much by default (Sustainability page).
+POLICY_UTILITY = {
+    "Reduce Heating by 10%": "gas",
+    "Efficient Water Fixtures": "water",
+    "Solar Panels Installed": "electricity",
+    "Shorten Building Hours": "electricity",
+}
+DEFAULT_REDUCTIONS = {
+    "Reduce Heating by 10%": 0.10,
+    "Efficient Water Fixtures": 0.15,
+    "Solar Panels Installed": 0.25,
+    "Shorten Building Hours": 0.10,
+}
+# Resource savings per policy as (utility, share of its consumption) (Policy Simulation page).
+ALLOCATION_FACTORS = {
+    "Reduce Heating by 10%": ("electricity", 0.1),
+    "Efficient Water Fixtures": ("water", 0.15),
+    "Solar Panels Installed": ("electricity", 0.2),
+    "Shorten Building Hours": ("electricity", 0.1),
+}
+
+
+def campus_totals(store, campus_ids=None, agg="sum"):
+    # One column per utility type, one row per campus.
+    totals = pd.DataFrame({
+        utility: store.rollup(name, 'campus_id', campus_ids, agg=agg)
+        for name, (_, utility) in DATASETS.items()
+    })
+    return totals.fillna(0.0) if agg == "sum" else totals
+
+
+def daily_series(store, campus_ids=None):
+    # Daily consumption of every building, keyed by (utility_type, campus_id).
+    series = {}
+    for name, (_, utility) in DATASETS.items():
+        daily = store.rollup(name, ['campus_id', 'day'], campus_ids)
+        for campus_id, s in daily.groupby(level='campus_id', observed=True):
+            series[(utility, campus_id)] = s.droplevel('campus_id')
+    return series
+
+
+def utility_table(store, freq=ALIGN_FREQ, co2_factors=CO2_FACTORS, tariff=TARIFF):
+    # Every utility side by side: one row per campus and step of the `freq`
+    # grid, sorted by (campus_id, timestamp), with a column per utility (NaN
+    # where its meter has no reading), the tariff band, and the CO₂ (kg) and
+    # tariff cost (USD) of the step. Meters read at other rates are aligned
+    # to the grid (see alignment.py). Steps are priced at the band of their
+    # start, so a grid coarser than an hour only suits flat rates.
+    columns = {}
+    for name, (_, utility) in DATASETS.items():
+        frames, _ = store.batches(name)
+        columns[utility] = pd.concat([align(df, freq) for df in frames])
+    table = pd.DataFrame(columns).sort_index().reset_index()
+    utilities = list(columns)
+    table['band'] = tariff.classify(table['timestamp'])
+    usage = table[utilities].fillna(0.0)
+    table['co2'] = usage.to_numpy() @ np.array([co2_factors[u] for u in utilities])
+    codes = table['band'].cat.codes.to_numpy()
+    table['cost'] = sum(usage[u].to_numpy() * tariff.rates[u].reindex(BANDS).to_numpy()[codes] for u in utilities)
+    return table
+
+
+def cross_utility_kpis(table, utilities=UTILITIES):
+    # Per campus, in one pass over a utility table: consumption of every
+    # utility, CO₂ and cost, the share of the cost in the peak band, and the
+    # share of steps in which every meter reported.
+    reported = table[utilities].notna().all(axis=1)
+    peak_cost = table['cost'].where(table['band'] == "peak", 0.0)
+    grouped = table.assign(peak_cost=peak_cost, coverage=reported).groupby('campus_id', observed=True)
+    kpis = grouped[utilities + ['co2', 'cost', 'peak_cost']].sum()
+    kpis['coverage'] = grouped['coverage'].mean()
+    kpis['peak_cost_share'] = kpis.pop('peak_cost') / kpis['cost']
+    return kpis
+
+
+def time_of_use(store, name, campus_ids=None, tariff=TARIFF):
+    # Consumption and cost in each tariff band for every campus and day, from
+    # the band rollup (each reading was classified once, when it was built).
+    by_band = store.rollup(name, ['campus_id', 'day', 'band'], campus_ids).unstack('band')
+    bands = tariff.bands()
+    usage = by_band.reindex(columns=bands).set_axis(bands, axis=1).fillna(0.0)
+    cost = tariff.cost(usage, DATASETS[name][1])
+    out = pd.concat([usage, cost.add_suffix('_cost')], axis=1)
+    out['cost'] = cost.sum(axis=1)
+    return out
+
+
+def peak_off_peak(store, name, campus_ids=None, tariff=TARIFF):
+    # Consumption per band (and the peak to off-peak ratio) for every campus.
+    out = time_of_use(store, name, campus_ids, tariff)[tariff.bands()].groupby(level='campus_id').sum()
+    out = out.reindex(columns=BANDS, fill_value=0.0)
+    out['ratio'] = peak_ratio(out['peak'], out['off_peak'])
+    return out
+
+
+def peak_ratio(peak, off_peak):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.divide(peak, off_peak)
+
+
+def night_usage_alerts(df, hours=None, quantile=0.75):
+    # Readings during the night hours (the tariff's by default) above the
+    # frame's `quantile` of consumption.
+    hours = TARIFF.night_hours if hours is None else hours
+    threshold = df['consumption'].quantile(quantile)
+    return df[df['hour'].isin(hours) & (df['consumption'] > threshold)]
+
+
+def efficiency_scores(store, name="energy", campus_ids=None):
+    # Best (lowest) average consumption over each campus's own; 1 is the best.
+    averages = store.rollup(name, 'campus_id', campus_ids, agg="mean")
+    return averages.min() / averages
+
+
+def co2_emissions(totals, co2_factors=CO2_FACTORS):
+    # kg of CO₂ per utility (and in total) for each row of `totals`.
+    co2 = totals[list(co2_factors)] * pd.Series(co2_factors)
+    co2['total'] = co2.sum(axis=1)
+    return co2
+
+
+def policy_co2_savings(totals, policies=POLICIES, reductions=DEFAULT_REDUCTIONS, co2_factors=CO2_FACTORS):
+    # kg of CO₂ saved by each policy; works on one campus (Series) or many (DataFrame).
+    return {
+        policy: reductions[policy] * totals[POLICY_UTILITY[policy]] * co2_factors[POLICY_UTILITY[policy]]
+        for policy in policies
+    }
+
+
+def resource_savings(totals, policies=POLICIES):
+    savings = 0.0
+    for policy in policies:
+        utility, factor = ALLOCATION_FACTORS[policy]
+        savings = savings + factor * totals[utility]
+    return savings
+
+
+def cost_savings(savings, cost_factors=COST_FACTORS):
+    return savings * sum(cost_factors.values())
+
+
+def monte_carlo_reductions(policies=POLICIES, reductions=DEFAULT_REDUCTIONS):
+    # Per-utility consumption reductions for run_monte_carlo; policies acting
+    # on the same utility compound.
+    out = {utility: 0.0 for utility in UTILITIES}
+    for policy in policies:
+        utility = POLICY_UTILITY[policy]
+        out[utility] = 1 - (1 - out[utility]) * (1 - reductions[policy])
+    return out
+
+
+def monte_carlo_by_campus(means, variability=0.05, co2_factors=CO2_FACTORS, policies=POLICIES,
+                          reductions=DEFAULT_REDUCTIONS, years=10, simulations=1000):
+    # Monte Carlo CO₂ summary (mean/std/p5/p50/p95) per campus, from each
+    # campus's average consumption per utility.
+    variability = variability if isinstance(variability, dict) else {u: variability for u in UTILITIES}
+    utility_reductions = monte_carlo_reductions(policies, reductions)
+    rows = {}
+    for campus_id, base in means.fillna(0.0).iterrows():
+        _, rows[campus_id] = run_monte_carlo(
+            base.to_dict(), variability, co2_factors, reductions=utility_reductions,
+            years=years, simulations=simulations,
+        )
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def rolling_anomalies(store, name, campus_ids=None, window=7, threshold_factor=1.5, z_threshold=3.0, engine=None):
+    engine = engine or RollingAnomalyEngine(name, window, threshold_factor, z_threshold)
+    flagged = engine.refresh(store)
+    if campus_ids is not None:
+        flagged = flagged[flagged['campus_id'].isin(campus_ids)]
+    return flagged
+
+
+def isolation_outliers(store, name, campus_ids=None, contamination=0.05, features=("consumption",)):
+    df = store.view(name, campus_ids, columns=['consumption'])
+    scorer = fit_scorer(store.view(name), contamination, features, data_key=f"{name}-{store.version(name)}")
+    return df[scorer.predict(df)]
+
+
+def build_report(store, campus_ids=None, policies=POLICIES, reductions=DEFAULT_REDUCTIONS,
+                 co2_factors=CO2_FACTORS, variability=0.05, years=10, simulations=1000,
+                 contamination=0.05):
+    # Every page's KPIs for all (or the given) campuses: one row per campus in
+    # `kpis`, every flagged reading in `anomalies`, and overall figures in
+    # `summary`.
+    totals = campus_totals(store, campus_ids)
+    means = campus_totals(store, campus_ids, agg="mean")
+    kpis = pd.concat([totals.add_suffix('_total'), means.add_suffix('_mean')], axis=1)
+    for name, (_, utility) in DATASETS.items():
+        split = peak_off_peak(store, name, campus_ids)[['peak', 'off_peak', 'ratio']]
+        kpis[[f'{utility}_peak', f'{utility}_off_peak', f'{utility}_peak_ratio']] = split.reindex(kpis.index).to_numpy()
+        cost = time_of_use(store, name, campus_ids)['cost'].groupby(level='campus_id').sum()
+        kpis[f'{utility}_tariff_cost'] = cost.reindex(kpis.index).fillna(0.0)
+    kpis['efficiency_score'] = efficiency_scores(store, "energy")  # relative to every campus
+
+    co2 = co2_emissions(totals, co2_factors)
+    kpis = kpis.join(co2.add_prefix('co2_'))
+    saved = policy_co2_savings(totals, policies, reductions, co2_factors)
+    kpis['co2_saved_by_policies'] = sum(saved.values()) if saved else 0.0
+    kpis['co2_after_policies'] = kpis['co2_total'] - kpis['co2_saved_by_policies']
+    kpis['resource_savings'] = resource_savings(totals, policies)
+    kpis['cost_savings_usd'] = cost_savings(kpis['resource_savings'])
+    mc = monte_carlo_by_campus(means, variability, co2_factors, policies, reductions, years, simulations)
+    kpis = kpis.join(mc.add_prefix('mc_co2_'))
+
+    anomalies = []
+    for name in ("gas", "water"):
+        flagged = rolling_anomalies(store, name, campus_ids)
+        anomalies.append(flagged.assign(utility=DATASETS[name][1], method="rolling"))
+        kpis[f'{DATASETS[name][1]}_rolling_anomalies'] = flagged.groupby('campus_id').size()
+    outliers = isolation_outliers(store, "gas", campus_ids, contamination)
+    anomalies.append(outliers[['timestamp', 'campus_id', 'consumption']].assign(utility="gas", method="isolation_forest"))
+    kpis['gas_isolation_outliers'] = outliers.groupby('campus_id', observed=True).size()
+    alerts = night_usage_alerts(store.view("water", campus_ids, columns=['consumption', 'hour']))
+    anomalies.append(alerts[['timestamp', 'campus_id', 'consumption']].assign(utility="water", method="night_usage"))
+    kpis['water_night_alerts'] = alerts.groupby('campus_id', observed=True).size()
+    count_columns = [c for c in kpis if c.endswith(('_anomalies', '_outliers', '_alerts'))]
+    kpis[count_columns] = kpis[count_columns].fillna(0).astype(np.int64)
+    kpis.index.name = 'campus_id'
+
+    overall = totals.sum()
+    summary = {
+        "campuses": len(kpis),
+        "rows": {name: int(store.rollup(name, 'campus_id', campus_ids, agg="count").sum()) for name in DATASETS},
+        "versions": {name: store.version(name) for name in DATASETS},
+        "consumption": overall.to_dict(),
+        "peak_ratio": {
+            utility: float(peak_ratio(kpis[f'{utility}_peak'].sum(), kpis[f'{utility}_off_peak'].sum()))
+            for utility in overall.index
+        },
+        "co2_kg": float(kpis['co2_total'].sum()),
+        "co2_saved_by_policies_kg": float(kpis['co2_saved_by_policies'].sum()),
+        "cost_savings_usd": float(kpis['cost_savings_usd'].sum()),
+        "tariff": TARIFF.name,
+        "tariff_cost_usd": {utility: float(kpis[f'{utility}_tariff_cost'].sum()) for utility in overall.index},
+        "anomalies": {method: int(n) for method, n in pd.concat(anomalies)['method'].value_counts().items()},
+        "policies": {policy: reductions[policy] for policy in policies},
+    }
+    return {
+        "kpis": kpis.reset_index(),
+        "anomalies": pd.concat(anomalies, ignore_index=True),
+        "summary": summary,
+    }
@@ -0,0 +1,110 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import read_files
+from telemetry import span, timed
+
+
+RESULT_COLUMNS = ['timestamp', 'campus_id', 'consumption', 'rolling_mean', 'rolling_std', 'z_score', 'abnormal']
+
+
+class RollingAnomalyEngine:
+    """Per-campus rolling mean/std/z-score anomaly detection over a dataset.
+
+    Each reading is compared with the previous `window` readings of its own
+    campus. The only state kept per campus is that tail of `window` values and
+    the last timestamp scored, so new readings are scored incrementally; the
+    first refresh is a one-time backfill over the full history. Readings that
+    exceed `threshold_factor` times their rolling mean, or lie more than
+    `z_threshold` standard deviations from it, are appended to a separate
+    result table; the source frames are never modified.
+    """
+
+    def __init__(self, name, window=7, threshold_factor=1.5, z_threshold=3.0):
+        self.name = name
+        self.window = window
+        self.threshold_factor = threshold_factor
+        self.z_threshold = z_threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._tails = {}
+        self._last = {}
+        self._files = {}
+        self._results = []
+        self.scored = 0
+
+    def refresh(self, store):
+        # Score the files the store has gained since the last refresh. A
+        # changed or removed file, or a new reading older than one already
+        # scored, means history was rewritten and the backfill is redone.
+        with self._lock:
+            files = store.files(self.name)
+            if not self._files or any(files.get(path) != stat for path, stat in self._files.items()):
+                self._backfill(store)
+                return self.results()
+            new = [path for path in files if path not in self._files]
+            if new:
+                with span("read", f"read new {self.name} files"):
+                    batch = read_files(self.name, new).sort_values(['campus_id', 'timestamp'], kind="mergesort", ignore_index=True)
+                batch['timestamp'] = pd.to_datetime(batch['timestamp'])
+                cursor = batch['campus_id'].map(self._last)
+                if (batch['timestamp'] <= cursor).any():
+                    self._backfill(store)
+                    return self.results()
+                self.update(batch)
+                self._files.update({path: files[path] for path in new})
+            return self.results()
+
+    def _backfill(self, store):
+        # Out-of-core datasets arrive one campus at a time.
+        self.reset()
+        frames, self._files = store.batches(self.name)
+        for df in frames:
+            self.update(df)
+
+    @timed("score", "rolling anomalies")
+    def update(self, df):
+        # Score readings sorted by (campus_id, timestamp) that follow the
+        # campus's last scored reading; returns this batch's flagged rows.
+        frames = []
+        for campus, positions in df.groupby('campus_id', sort=False, observed=True).indices.items():
+            block = df.iloc[positions]
+            values = block['consumption'].to_numpy(dtype=np.float64)
+            tail = self._tails.get(campus, np.empty(0))
+            history = pd.Series(np.concatenate([tail, values]))
+            rolling = history.rolling(self.window)
+            mean = rolling.mean().shift(1).to_numpy()[len(tail):]
+            std = rolling.std().shift(1).to_numpy()[len(tail):]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z = (values - mean) / std
+            z[~np.isfinite(z)] = np.nan
+            abnormal = values > self.threshold_factor * mean
+            flagged = abnormal | (np.abs(z) > self.z_threshold)
+            self._tails[campus] = history.to_numpy()[-self.window:]
+            self._last[campus] = block['timestamp'].iloc[-1]
+            if flagged.any():
+                frames.append(pd.DataFrame({
+                    'timestamp': block['timestamp'].to_numpy()[flagged],
+                    'campus_id': block['campus_id'].to_numpy()[flagged],
+                    'consumption': values[flagged],
+                    'rolling_mean': mean[flagged],
+                    'rolling_std': std[flagged],
+                    'z_score': z[flagged],
+                    'abnormal': abnormal[flagged],
+                }))
+        self.scored += len(df)
+        batch = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RESULT_COLUMNS)
+        if len(batch):
+            self._results.append(batch)
+        return batch
+
+    def results(self):
+        if not self._results:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        if len(self._results) > 1:
+            self._results = [pd.concat(self._results, ignore_index=True)]
+        return self._results[0].copy(deep=False)
@@ -0,0 +1,251 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+
+from analytics import (
+    POLICIES, build_report, campus_totals, co2_emissions, isolation_outliers, policy_co2_savings, rolling_anomalies,
+)
+from anomalies import RollingAnomalyEngine
+from scoring import FEATURES
+from storage import DATASETS, FORECAST_TABLE, read_forecast_table
+from telemetry import attached, count_cache, registry, span
+from utils import ROLLUP_GRAINS, DatasetStore
+
+
+# HTTP access to the dashboard aggregates for other tools:
+#
+#   uvicorn api:app --port 8000
+#   curl 'localhost:8000/rollups/gas?by=day&campus=3'
+#   curl -H 'Accept: application/vnd.apache.arrow.stream' 'localhost:8000/rollups/energy?by=campus_id&by=month'
+#
+# Responses are cached in memory keyed on the path, query and the version of
+# the data they were computed from; that key is also the ETag, so clients
+# sending If-None-Match get a 304 without any work being done. /metrics
+# exports the span timings and cache hit rates (see telemetry.py).
+
+API_CACHE_ENTRIES = int(os.environ.get("DASH_API_CACHE_ENTRIES", "512"))
+# Rolling anomaly engines kept for /anomalies; each holds a dataset's history,
+# so only the most recently used parameter sets are kept.
+API_ENGINES = int(os.environ.get("DASH_API_ENGINES", "4"))
+# Interface `python api.py` listens on; localhost unless exposure is opted in to.
+API_HOST = os.environ.get("DASH_API_HOST", "127.0.0.1")
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+app = FastAPI(title="Sustainability Dashboard API")
+store = DatasetStore()
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=API_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cache = ResponseCache()
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def _dataset(name):
+    if name not in DATASETS:
+        raise HTTPException(404, f"Unknown dataset {name!r}; expected one of {sorted(DATASETS)}")
+    return name
+
+
+def _campuses(campus):
+    # Query strings arrive as text; match them to the stored campus ids.
+    if not campus:
+        return None
+    known = {str(c): c for name in DATASETS for c in store.campuses(name)}
+    return [known.get(c, c) for c in campus]
+
+
+def _engine(name, window, threshold, z):
+    key = (name, window, threshold, z)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = RollingAnomalyEngine(name, window, threshold, z)
+        _engines.move_to_end(key)
+        while len(_engines) > API_ENGINES:
+            _engines.popitem(last=False)
+    return engine
+
+
+def _forecast_version():
+    try:
+        return str(os.stat(FORECAST_TABLE).st_mtime_ns)
+    except OSError:
+        return "none"
+
+
+def _encode(df, fmt):
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_STREAM
+    return df.to_json(orient="records", date_format="iso").encode(), "application/json"
+
+
+def respond(request, versions, compute):
+    # Serve `compute()` (a DataFrame) as JSON or Arrow IPC, from the cache
+    # when the same query has been answered for the same data versions.
+    fmt = request.query_params.get("format")
+    if fmt is None:
+        fmt = "arrow" if ARROW_STREAM in request.headers.get("accept", "") else "json"
+    if fmt not in ("json", "arrow"):
+        raise HTTPException(400, "format must be 'json' or 'arrow'")
+    key = repr((request.url.path, sorted(request.query_params.multi_items()), versions, fmt))
+    etag = f'"{hashlib.sha1(key.encode()).hexdigest()[:24]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    entry = cache.get(etag)
+    count_cache("api_response", entry is not None)
+    if entry is None:
+        with attached("api"):
+            df = compute()
+            with span("serialize", f"{fmt} {request.url.path}"):
+                entry = _encode(df, fmt)
+        cache.put(etag, entry)
+    body, media_type = entry
+    return Response(body, media_type=media_type, headers=headers)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Span timings and cache hit rates in Prometheus text format.
+    return PlainTextResponse(registry.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/datasets")
+def datasets(request: Request):
+    versions = {name: store.version(name) for name in DATASETS}
+    return respond(request, versions, lambda: pd.DataFrame([
+        {"dataset": name, "utility": utility, "campuses": len(store.campuses(name)), "version": versions[name]}
+        for name, (_, utility) in DATASETS.items()
+    ]))
+
+
+@app.get("/rollups/{dataset}")
+def rollups(request: Request, dataset: str, by: List[str] = Query(...), campus: Optional[List[str]] = Query(None),
+            agg: str = "sum"):
+    # Same aggregates as the pages: e.g. by=day, by=campus_id&by=month, by=weekday&by=hour with agg=mean.
+    name = _dataset(dataset)
+    if not any(set(by) <= set(keys) for keys in ROLLUP_GRAINS.values()):
+        raise HTTPException(400, f"No rollup groups by {by}; available grains: {ROLLUP_GRAINS}")
+    if agg not in ("sum", "mean", "count"):
+        raise HTTPException(400, "agg must be 'sum', 'mean' or 'count'")
+    campus_ids = _campuses(campus)
+    return respond(request, store.version(name), lambda: store.rollup(name, by, campus_ids, agg=agg).reset_index())
+
+
+@app.get("/anomalies/{dataset}")
+def anomalies(request: Request, dataset: str, campus: Optional[List[str]] = Query(None), window: int = 7,
+              threshold: float = 1.5, z: float = 3.0):
+    # Readings flagged by the per-campus rolling engine (Anomalies page).
+    name = _dataset(dataset)
+    if window < 1:
+        raise HTTPException(400, "window must be at least 1 reading")
+    if threshold <= 0 or z <= 0:
+        raise HTTPException(400, "threshold and z must be positive")
+    engine = _engine(name, window, threshold, z)
+    campus_ids = _campuses(campus)
+    return respond(request, store.version(name), lambda: rolling_anomalies(store, name, campus_ids, engine=engine))
+
+
+@app.get("/outliers/{dataset}")
+def outliers(request: Request, dataset: str, campus: Optional[List[str]] = Query(None), contamination: float = 0.05,
+             feature: List[str] = Query(["consumption"])):
+    # IsolationForest outliers (Optimization page).
+    name = _dataset(dataset)
+    unknown = set(feature) - set(FEATURES)
+    if unknown:
+        raise HTTPException(400, f"Unknown features {sorted(unknown)}; expected some of {list(FEATURES)}")
+    if not 0 < contamination <= 0.5:
+        raise HTTPException(400, "contamination must be in (0, 0.5]")
+    campus_ids = _campuses(campus)
+    return respond(request, store.version(name), lambda: isolation_outliers(
+        store, name, campus_ids, contamination, tuple(feature),
+    )[['timestamp', 'campus_id', 'consumption']])
+
+
+@app.get("/forecasts")
+def forecasts(request: Request, model: Optional[str] = None, utility: Optional[str] = None,
+              campus: Optional[List[str]] = Query(None)):
+    # Latest per-building batch forecasts.
+    def compute():
+        table = read_forecast_table()
+        if table is None:
+            return pd.DataFrame(columns=['date', 'forecast', 'lower', 'upper', 'utility', 'campus_id', 'model', 'horizon'])
+        if model is not None:
+            table = table[table['model'] == model]
+        if utility is not None:
+            table = table[table['utility'] == utility]
+        if campus:
+            table = table[table['campus_id'].astype(str).isin(campus)]
+        return table
+
+    return respond(request, _forecast_version(), compute)
+
+
+@app.get("/co2")
+def co2(request: Request, campus: Optional[List[str]] = Query(None), policy: List[str] = Query([])):
+    # CO₂ per campus and utility, and what the given policies would save (Sustainability page).
+    unknown = set(policy) - set(POLICIES)
+    if unknown:
+        raise HTTPException(400, f"Unknown policies {sorted(unknown)}; expected some of {POLICIES}")
+    campus_ids = _campuses(campus)
+
+    def compute():
+        totals = campus_totals(store, campus_ids)
+        out = co2_emissions(totals)
+        out['saved_by_policies'] = sum(policy_co2_savings(totals, policy).values()) if policy else 0.0
+        out['after_policies'] = out['total'] - out['saved_by_policies']
+        out.index.name = 'campus_id'
+        return out.reset_index()
+
+    return respond(request, {name: store.version(name) for name in DATASETS}, compute)
+
+
+@app.get("/kpis")
+def kpis(request: Request, campus: Optional[List[str]] = Query(None)):
+    # One row per campus with every page's KPIs (as report.py writes them).
+    campus_ids = _campuses(campus)
+    return respond(request, {name: store.version(name) for name in DATASETS},
+                   lambda: build_report(store, campus_ids)["kpis"])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=API_HOST, port=int(os.environ.get("DASH_API_PORT", "8000")))
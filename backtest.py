@@ -0,0 +1,191 @@
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from batch_forecast import BATCH_WORKERS, batch_pool
+from forecasting import MODELS, forecast_daily
+from jobs import DONE
+from model_cache import data_fingerprint, model_cache
+
+
+# Rolling-origin backtests of the daily forecast models. Each series is cut at
+# several origins; for every origin a model is fitted on the days before it
+# and scored on the `horizon` days after it. The last origin leaves exactly
+# `horizon` days, the page's single holdout, and earlier ones step back
+# `step` days at a time. Errors are averaged over every fold of every
+# building, with MASE (MAE over that of a weekly seasonal naive forecast on
+# the training days) comparable across buildings of any size.
+#
+#   python backtest.py --utility electricity --horizon 30 --folds 6
+
+BACKTEST_FOLDS = int(os.environ.get("DASH_BACKTEST_FOLDS", "6"))
+# Shortest training history a fold may have, in days.
+MIN_TRAIN_DAYS = 90
+SEASON = 7
+SCORES = ["mase", "mape", "mae", "rmse", "fit_seconds", "fit_cached", "fold_cached"]
+# A model is accurate enough when its MASE is within this share of the best.
+ACCURACY_TOLERANCE = 0.05
+
+
+def cutoffs(days, horizon, folds=BACKTEST_FOLDS, step=None, min_train=MIN_TRAIN_DAYS):
+    # Training lengths of the folds of a `days`-long series, oldest first.
+    step = step or horizon
+    ends = [days - horizon - i * step for i in range(folds)]
+    return sorted(end for end in ends if end >= min_train)
+
+
+def score_fold(model, train, actual):
+    # Fit `model` on `train` and score its forecast of `actual`. Runs in a
+    # pool worker; the scores, with the fit time measured when the fold first
+    # ran, are kept in the model cache so an unchanged fold is never refitted.
+    key = model_cache.key(
+        "backtest", {"model": model, "params": MODELS[model][1]},
+        f"{data_fingerprint(train)}-{data_fingerprint(actual)}",
+    )
+    cached = model_cache.get(key)
+    if cached is not None:
+        return {**cached, "fold_cached": True}
+    hits = model_cache.hits
+    start = time.perf_counter()
+    forecast = forecast_daily(model, train, len(actual))['forecast'].to_numpy()
+    seconds = time.perf_counter() - start
+    values = actual.to_numpy()
+    errors = np.abs(forecast - values)
+    history = train.to_numpy()
+    naive = np.abs(history[SEASON:] - history[:-SEASON]).mean()
+    nonzero = values != 0
+    result = {
+        "mae": float(errors.mean()),
+        "rmse": float(np.sqrt((errors ** 2).mean())),
+        "mape": float((errors[nonzero] / np.abs(values[nonzero])).mean()) if nonzero.any() else np.nan,
+        "mase": float(errors.mean() / naive) if naive > 0 else np.nan,
+        "fit_seconds": seconds,
+        # The fit itself came from the model cache, so its time is no latency.
+        "fit_cached": model_cache.hits > hits,
+    }
+    model_cache.put(key, result)
+    return {**result, "fold_cached": False}
+
+
+class Backtest:
+    """Rolling-origin backtest of several models over many daily series.
+
+    Every (model, series, origin) fold is its own job in the pool, so the
+    folds of every building fit in parallel and a failing model only costs
+    its own folds. `leaderboard()` ranks the models by accuracy and fit time.
+    """
+
+    def __init__(self, pool, models, horizon, series, folds=BACKTEST_FOLDS, step=None):
+        self.models = list(models)
+        self.horizon = horizon
+        self.folds = folds
+        self.started = time.monotonic()
+        self.finished = None
+        self.jobs = {}
+        for key, s in series.items():
+            s = s.asfreq("D").interpolate()
+            for end in cutoffs(len(s), horizon, folds, step):
+                train, actual = s.iloc[:end], s.iloc[end:end + horizon]
+                job_key = f"{data_fingerprint(train)}-{data_fingerprint(actual)}"
+                for model in self.models:
+                    self.jobs[(model, key, train.index[-1])] = pool.submit(
+                        f"backtest-{model}-{job_key}", score_fold, model, train, actual,
+                    )
+
+    @property
+    def complete(self):
+        if self.finished is None and not any(job.active for job in self.jobs.values()):
+            self.finished = time.monotonic()
+        return self.finished is not None
+
+    def progress(self):
+        states = Counter(job.state for job in self.jobs.values())
+        finished = sum(not job.active for job in self.jobs.values())
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "total": len(self.jobs),
+            "finished": finished,
+            "states": dict(states),
+            "elapsed": elapsed,
+            "folds_per_second": finished / elapsed if elapsed else 0.0,
+        }
+
+    def table(self):
+        # One row per fold: model, series, last training day, state and scores.
+        rows = []
+        for (model, key, origin), job in self.jobs.items():
+            row = {"model": model, "series": key, "origin": origin, "state": job.state}
+            if job.state == DONE:
+                row.update(job.result)
+            rows.append(row)
+        return pd.DataFrame(rows, columns=["model", "series", "origin", "state"] + SCORES)
+
+    def leaderboard(self, tolerance=ACCURACY_TOLERANCE):
+        return leaderboard(self.table(), tolerance)
+
+
+def leaderboard(folds, tolerance=ACCURACY_TOLERANCE):
+    # Mean errors and median fit time of every model, most accurate first.
+    # `recommended` marks the fastest model whose MASE is within `tolerance`
+    # of the best one.
+    done = folds[folds['state'] == DONE]
+    board = done.groupby('model')[['mase', 'mape', 'mae', 'rmse']].mean().reindex(folds['model'].unique())
+    board['fit_seconds'] = done[~done['fit_cached'].astype(bool)].groupby('model')['fit_seconds'].median()
+    board['folds'] = done.groupby('model').size().reindex(board.index, fill_value=0)
+    board['failed'] = (folds['state'] != DONE).groupby(folds['model']).sum()
+    board = board.sort_values(['mase', 'fit_seconds'])
+    accurate = board['mase'] <= board['mase'].min() * (1 + tolerance)
+    board['recommended'] = False
+    if accurate.any():
+        board.loc[board.loc[accurate, 'fit_seconds'].fillna(np.inf).idxmin(), 'recommended'] = True
+    return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the forecast models on every building.")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--utility", default="electricity")
+    parser.add_argument("--campuses", nargs="+", help="only these campus ids (default: all)")
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--folds", type=int, default=BACKTEST_FOLDS)
+    parser.add_argument("--step", type=int, help="days between origins (default: the horizon)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--out", help="write the per-fold scores to this CSV file")
+    args = parser.parse_args()
+
+    # Here rather than at the top: pool workers import this module to run
+    # score_fold and need neither streamlit nor the store.
+    from analytics import daily_series
+    from utils import DatasetStore
+    store = DatasetStore()
+    campus_ids = args.campuses
+    if campus_ids is not None:
+        known = {str(c): c for c in store.campuses("energy")}
+        campus_ids = [known.get(c, c) for c in campus_ids]
+    series = {key: s for key, s in daily_series(store, campus_ids).items() if key[0] == args.utility}
+    run = Backtest(batch_pool(args.workers), args.models, args.horizon, series, args.folds, args.step)
+    while not run.complete:
+        progress = run.progress()
+        print(f"\rbacktest: {progress['finished']}/{progress['total']} folds", end="", file=sys.stderr)
+        time.sleep(1)
+    progress = run.progress()
+    print(
+        f"\rbacktest: {progress['total']} folds of {len(series)} series in {progress['elapsed']:.1f}s "
+        f"({progress['folds_per_second']:.2f} folds/s) {progress['states']}",
+        file=sys.stderr,
+    )
+    if args.out:
+        run.table().to_csv(args.out, index=False)
+    print(run.leaderboard().round(4).to_string())
+
+
+if __name__ == "__main__":
+    # Through the module, so pool jobs pickle backtest.score_fold rather than
+    # a function of __main__ the workers cannot import.
+    import backtest
+    backtest.main()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+from forecasting import forecast_daily
+from jobs import DONE, TrainingPool
+from model_cache import data_fingerprint
+from storage import write_forecast_table
+
+
+BATCH_WORKERS = int(os.environ.get("DASH_BATCH_WORKERS", os.cpu_count() or 1))
+# Hard limit on fitting one building's series.
+SERIES_TIMEOUT_S = float(os.environ.get("DASH_SERIES_TIMEOUT_S", "120"))
+
+
+def batch_pool(workers=BATCH_WORKERS, timeout=SERIES_TIMEOUT_S):
+    # Runs are not tied to a session, so their jobs are never abandoned.
+    return TrainingPool(workers, timeout, abandon_after=float("inf"))
+
+
+class BatchForecast:
+    """Forecasts for every (utility, campus) daily series, fitted in a pool.
+
+    Each series is its own job, so a slow or failing building only costs its
+    own timeout. Once every job has finished the successful forecasts are
+    written to the forecast table, replacing earlier forecasts of the same
+    series by this model.
+    """
+
+    def __init__(self, pool, model, horizon, series):
+        self.model = model
+        self.horizon = horizon
+        self.started = time.monotonic()
+        self.finished = None
+        self.jobs = {
+            key: pool.submit(f"batch-{model}-{horizon}-{data_fingerprint(s)}", forecast_daily, model, s, horizon)
+            for key, s in series.items()
+        }
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    @property
+    def complete(self):
+        return self.finished is not None
+
+    def progress(self):
+        states = Counter(job.state for job in self.jobs.values())
+        finished = sum(not job.active for job in self.jobs.values())
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "total": len(self.jobs),
+            "finished": finished,
+            "states": dict(states),
+            "elapsed": elapsed,
+            "series_per_second": finished / elapsed if elapsed else 0.0,
+        }
+
+    def table(self):
+        frames = []
+        for (utility, campus_id), job in self.jobs.items():
+            if job.state == DONE:
+                frames.append(job.result.reset_index().assign(utility=utility, campus_id=campus_id))
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True).assign(model=self.model, horizon=self.horizon)
+
+    def _collect(self):
+        while any(job.active for job in self.jobs.values()):
+            time.sleep(0.5)
+        table = self.table()
+        if table is not None:
+            write_forecast_table(table)
+        self.finished = time.monotonic()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import tempfile
+import time
+
+# Keep the forecast table and fitted models of the benchmark out of data/.
+os.environ["DASH_DATA_DIR"] = tempfile.mkdtemp(prefix="dash-bench-")
+
+from common import make_readings
+from batch_forecast import BatchForecast, batch_pool
+from forecasting import MODELS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch per-building forecasting throughput by worker count.")
+    parser.add_argument("--campuses", type=int, default=48)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--model", default="Holt-Winters", choices=list(MODELS))
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    df = make_readings(args.campuses * args.days * 24, args.campuses)
+    daily = df.groupby(['campus_id', df['timestamp'].dt.normalize()])['consumption'].sum()
+    series = {("electricity", campus_id): s.droplevel('campus_id') for campus_id, s in daily.groupby(level='campus_id')}
+    print(f"{len(series)} series of {args.days} days, {args.model}, {args.horizon}-day horizon")
+
+    print(f"{'workers':>8}{'seconds':>10}{'series/s':>10}{'speedup':>10}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        # A fresh model cache per round, so every round really fits.
+        os.environ["DASH_MODEL_CACHE_DIR"] = tempfile.mkdtemp(prefix="dash-bench-models-")
+        run = BatchForecast(batch_pool(workers), args.model, args.horizon, series)
+        while not run.complete:
+            time.sleep(0.1)
+        progress = run.progress()
+        assert progress['states'] == {"done": len(series)}, progress['states']
+        baseline = baseline or progress['elapsed']
+        print(f"{workers:>8}{progress['elapsed']:>10.2f}{progress['series_per_second']:>10.2f}{baseline / progress['elapsed']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
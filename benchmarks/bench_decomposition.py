@@ -0,0 +1,89 @@
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import timeit
+from decomposition import SEASONALITIES, Decomposer, fit, regular, stl_reach
+
+
+def make_series(days, freq, seed=0):
+    # Consumption with daily, weekly and yearly cycles plus noise.
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2020-01-01", periods=days * (24 if freq == "H" else 1), freq=freq)
+    hours = (index - index[0]) / pd.Timedelta(hours=1)
+    values = (
+        100 + 10 * np.sin(2 * np.pi * hours / 24) + 8 * np.sin(2 * np.pi * hours / 168)
+        + 20 * np.sin(2 * np.pi * hours / 8766) + rng.normal(0, 3, len(index))
+    )
+    return pd.Series(values, index=index, name="consumption")
+
+
+def served(decomposer, key, series, *args):
+    start = time.perf_counter()
+    result, how = decomposer.decompose(key, series, *args)
+    return result, how, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seasonal decomposition: full fits, cache hits and tail extensions.")
+    parser.add_argument("--days", type=int, default=800)
+    parser.add_argument("--new-days", type=int, default=2)
+    parser.add_argument("--campuses", type=int, default=50)
+    args = parser.parse_args()
+
+    from statsmodels.tsa.seasonal import STL, seasonal_decompose
+
+    daily = make_series(args.days, "D")
+    hourly = make_series(args.days, "H")
+    print(f"{args.days} days, {args.new_days} new per update")
+    print(f"{'series':<8}{'method':<33}{'full s':>9}{'cached s':>10}{'extended s':>12}{'splice err':>12}{'revision':>10}")
+    # The page's call before the cache: the whole daily series on every rerun.
+    current = timeit(lambda: seasonal_decompose(daily, model="additive", period=7))
+    print(f"{'daily':<8}{'seasonal_decompose (7)':<33}{current:>9.3f}{current:>10.3f}{current:>12.3f}")
+    for (series, freq, seasonalities), robust in itertools.product([
+        (daily, "D", ("weekly",)), (daily, "D", ("weekly", "yearly")),
+        (hourly, "H", ("daily",)), (hourly, "H", ("daily", "weekly")),
+    ], [True, False]):
+        new = args.new_days * (24 if freq == "H" else 1)
+        periods = {name: SEASONALITIES[freq][name] for name in seasonalities}
+        decomposer = Decomposer()
+        _, _, full = served(decomposer, "s", series.iloc[:-new], "STL", seasonalities, robust)
+        _, _, cached = served(decomposer, "s", series.iloc[:-new], "STL", seasonalities, robust)
+        result, how, extended = served(decomposer, "s", series, "STL", seasonalities, robust)
+        # Splice error against a full fit of the longer series, and how much
+        # the full fit itself revises the replaced points when the days arrive.
+        reference = fit(regular(series, freq), "STL", periods, robust)
+        before = fit(regular(series.iloc[:-new], freq), "STL", periods, robust)
+        replaced = before.index[-stl_reach(list(periods.values())):]
+        scale = reference["observed"].std()
+        error = (result["resid"] - reference["resid"]).abs().max() / scale
+        revision = (before["resid"] - reference["resid"]).loc[replaced].abs().max() / scale
+        label = f"{'robust ' if robust else ''}STL {'+'.join(seasonalities)}"
+        print(f"{'daily' if freq == 'D' else 'hourly':<8}{label:<33}{full:>9.3f}{cached:>10.4f}"
+              f"{extended:>12.3f}{error:>12.1%}{revision:>10.1%}  ({how})")
+    # Interpolated smoothers against statsmodels' defaults.
+    exact = timeit(lambda: STL(hourly.to_numpy(), period=24, robust=True).fit(), repeat=1)
+    jumped = timeit(lambda: fit(regular(hourly, "H"), "STL", {"daily": 24}, robust=True), repeat=1)
+    print(f"hourly robust STL (24): statsmodels defaults {exact:.2f}s, with smoother jumps {jumped:.2f}s")
+
+    # Every campus: first pass, rerun, then new days for every campus.
+    campuses = {campus_id: make_series(args.days, "D", seed=campus_id) for campus_id in range(args.campuses)}
+    decomposer = Decomposer()
+    for robust, (label, cut) in itertools.product(
+        [True, False], [("first pass", -args.new_days), ("rerun", -args.new_days), ("new days", None)],
+    ):
+        start = time.perf_counter()
+        hows = [
+            decomposer.decompose(campus_id, s.iloc[:cut], "STL", ("weekly",), robust)[1]
+            for campus_id, s in campuses.items()
+        ]
+        counts = pd.Series(hows).value_counts().to_dict()
+        print(f"{args.campuses} campuses, {'robust ' if robust else ''}STL weekly, {label}: "
+              f"{time.perf_counter() - start:.3f}s {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+
+import pandas as pd
+
+from common import make_readings, mb, timeit
+from utils import enrich
+
+
+def enrich_legacy(df, utility_type):
+    # The pre-compaction derivation, kept here as the baseline.
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['year'] = df['timestamp'].dt.year
+    df['month'] = df['timestamp'].dt.to_period("M").dt.to_timestamp()
+    df['hour'] = df['timestamp'].dt.hour
+    df['day'] = df['timestamp'].dt.date
+    df['weekday'] = df['timestamp'].dt.day_name()
+    df['utility_type'] = utility_type
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and groupby cost of the derived calendar columns.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    raw = make_readings(args.rows)
+    print(f"{len(raw):,} rows")
+    print(f"{'variant':<10}{'enrich s':>10}{'MB':>10}{'by day s':>10}{'by weekday s':>14}{'weekday x hour s':>18}")
+    for label, fn in [("legacy", enrich_legacy), ("compact", enrich)]:
+        enrich_s = timeit(lambda: fn(raw.copy(), "gas"), repeat=1)
+        df = fn(raw.copy(), "gas")
+        by_day = timeit(lambda: df.groupby('day')['consumption'].sum())
+        by_weekday = timeit(lambda: df.groupby('weekday')['consumption'].mean())
+        by_weekday_hour = timeit(lambda: df.groupby(['weekday', 'hour'])['consumption'].mean())
+        print(f"{label:<10}{enrich_s:>10.3f}{mb(df):>10.1f}{by_day:>10.3f}{by_weekday:>14.3f}{by_weekday_hour:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
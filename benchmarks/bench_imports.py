@@ -0,0 +1,60 @@
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+
+# Import cost of every page: its module-level imports are executed in a fresh
+# interpreter, as on the first visit to the page after a server start. The
+# slowest modules come from `python -X importtime`.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = "import streamlit, pandas, numpy"
+
+
+def page_imports(path):
+    # The page's top-level import statements, as source.
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    return "\n".join(
+        ast.get_source_segment(source, node) for node in ast.parse(source).body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_time(source):
+    # (wall seconds, [(cumulative seconds, module)]) for running `source`.
+    code = f"import time\nstart = time.perf_counter()\n{source}\nprint(time.perf_counter() - start)"
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in out.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                modules.append((int(cumulative) / 1e6, name.strip()))
+    return float(out.stdout.strip().splitlines()[-1]), sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of each page's module-level imports.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=3, help="slowest top-level modules to list per page")
+    args = parser.parse_args()
+
+    pages = [os.path.join(ROOT, "Home.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    baseline = min(import_time(BASELINE)[0] for _ in range(args.repeat))
+    print(f"{'baseline (' + BASELINE + ')':<40}{baseline:>8.2f}s")
+    print(f"{'page':<40}{'import s':>8}{'extra s':>9}  slowest imports")
+    for path in pages:
+        runs = [import_time(page_imports(path)) for _ in range(args.repeat)]
+        seconds, modules = min(runs)
+        slowest = ", ".join(f"{name} {s:.2f}s" for s, name in modules[:args.top])
+        print(f"{os.path.basename(path):<40}{seconds:>8.2f}{seconds - baseline:>9.2f}  {slowest}")
+
+
+if __name__ == "__main__":
+    main()
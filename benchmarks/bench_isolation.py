@@ -0,0 +1,47 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import make_readings, timeit
+from scoring import IsolationScorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IsolationForest fit/score throughput: refit per rerun vs the scoring service.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--campuses", type=int, default=50)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, -1])
+    args = parser.parse_args()
+
+    df = make_readings(args.rows, args.campuses)
+    print(f"{len(df):,} rows, {args.campuses} campuses")
+
+    def refit_per_rerun():
+        # What the pages did on every rerun.
+        labels = IsolationForest(contamination=0.05, random_state=42).fit_predict(df[['consumption']])
+        return np.array([1 if x == -1 else 0 for x in labels])
+
+    start = time.perf_counter()
+    legacy = refit_per_rerun()
+    print(f"{'refit + row-wise labels':<36}{time.perf_counter() - start:>8.2f}s")
+
+    scorer = IsolationScorer(0.05)
+    fit_s = timeit(lambda: scorer.fit(df), repeat=1)
+    print(f"{'fit (once per version)':<36}{fit_s:>8.2f}s")
+    assert np.array_equal(scorer.predict(df), legacy == 1)
+    for n_jobs in args.jobs:
+        score_s = timeit(lambda: scorer.predict(df, n_jobs=n_jobs))
+        print(f"{f'score, n_jobs={n_jobs}':<36}{score_s:>8.2f}s{len(df) / score_s / 1e6:>8.2f}M rows/s")
+
+    features = ("consumption", "hour", "weekday", "vs_baseline")
+    rich = IsolationScorer(0.05, features)
+    fit_s = timeit(lambda: rich.fit(df), repeat=1)
+    score_s = timeit(lambda: rich.predict(df))
+    print(f"{'fit, all features':<36}{fit_s:>8.2f}s")
+    print(f"{'score, all features':<36}{score_s:>8.2f}s{len(df) / score_s / 1e6:>8.2f}M rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+
+from common import make_readings
+from optimization import shift_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load shifting LP: problem size and solver time by block length.")
+    parser.add_argument("--campuses", type=int, default=115)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--flexible", type=float, default=0.2)
+    parser.add_argument("--days-per-solve", type=int, nargs="+", default=[1, 7, 31])
+    args = parser.parse_args()
+
+    df = make_readings(args.campuses * args.days * 24, args.campuses)
+    print(f"{len(df):,} hourly readings, {args.campuses} campuses, {args.days} days")
+    print(f"{'days/LP':>8}{'LPs':>6}{'variables':>12}{'constraints':>13}{'non-zeros':>12}"
+          f"{'build s':>9}{'solve s':>9}{'total s':>9}{'peak -%':>9}")
+    for days in args.days_per_solve:
+        _, stats = shift_load(df, "gas", args.flexible, days_per_solve=days)
+        assert stats["failed_days"] == 0, stats
+        reduction = 1 - stats["peak_after"] / stats["peak_before"]
+        print(f"{days:>8}{stats['solves']:>6}{stats['variables']:>12,}{stats['constraints']:>13,}{stats['nonzeros']:>12,}"
+              f"{stats['build_seconds']:>9.2f}{stats['solve_seconds']:>9.2f}{stats['seconds']:>9.2f}{reduction:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from common import timeit
+from analytics import (
+    DEFAULT_REDUCTIONS, campus_totals, efficiency_scores, monte_carlo_reductions, night_usage_alerts, time_of_use,
+)
+from anomalies import RollingAnomalyEngine
+from decomposition import Decomposer, decompose_campuses, seasonal_strength, total_series
+from forecasting import MODELS, forecast_arima, forecast_prophet
+from optimization import hourly_profile, shift_load
+from scenarios import ScenarioEngine, frontier, policy_combinations, scenario_grid
+from scoring import IsolationScorer
+from simulation import run_monte_carlo
+from storage import DATA_DIR, DATASETS
+from utils import DatasetStore
+
+
+# Times the compute path behind every page (load, filter, aggregate, model_fit,
+# figure) against whatever DASH_DATA_DIR holds, and writes the timings as JSON
+# so runs on different versions can be compared:
+#
+#   python synthetic.py /tmp/dash-10m --rows 10M
+#   DASH_DATA_DIR=/tmp/dash-10m python benchmarks/bench_pages.py --out before.json
+#   DASH_DATA_DIR=/tmp/dash-10m python benchmarks/bench_pages.py --out after.json --compare before.json
+#
+# Model fits call the model code directly, bypassing the model cache, and run
+# once; the other stages report the best of --repeat runs. Figures are
+# serialized to JSON as st.plotly_chart does.
+
+warnings.filterwarnings("ignore")
+
+STAGES = ["load", "filter", "aggregate", "model_fit", "figure"]
+
+
+class Stages:
+    # Accumulates the time spent in each stage; returns the stage's result.
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.seconds = {}
+
+    def __call__(self, stage, fn, repeat=None):
+        best = float("inf")
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + best
+        return result
+
+    def fit(self, fn):
+        return self("model_fit", fn, repeat=1)
+
+    def figure(self, fn):
+        return self("figure", lambda: fn().to_json())
+
+
+def energy_page(store, t):
+    campuses = store.campuses("energy")
+    daily = t("aggregate", lambda: store.rollup("energy", "day", campuses).reset_index())
+    totals = t("aggregate", lambda: store.rollup("energy", "campus_id", campuses).reset_index())
+    monthly = t("aggregate", lambda: store.rollup("energy", ["month", "campus_id"], campuses).reset_index())
+    heatmap = t("aggregate", lambda: store.rollup("energy", ["weekday", "hour"], campuses, agg="mean").unstack())
+    latest = store.time_bounds("energy", campuses)[1]
+    recent = t("filter", lambda: store.view("energy", campuses, start=latest - pd.Timedelta(days=7)))
+    daily_recent = t("aggregate", lambda: recent.groupby(recent['timestamp'].dt.date)['consumption'].sum().reset_index())
+    building = t("filter", lambda: store.view("energy", [campuses[0]]).tail(1000))
+    forecast = t.fit(lambda: forecast_prophet(daily.set_axis(['ds', 'y'], axis=1), 30))
+    t.figure(lambda: go.Figure([
+        go.Scatter(x=daily['day'], y=daily['consumption']), go.Scatter(x=forecast['ds'], y=forecast['yhat']),
+    ]))
+    t.figure(lambda: px.line(daily, x='day', y='consumption'))
+    t.figure(lambda: px.bar(totals, x='campus_id', y='consumption'))
+    t.figure(lambda: px.line(building, x='timestamp', y='consumption'))
+    t.figure(lambda: px.line(monthly, x='month', y='consumption', color='campus_id'))
+    t.figure(lambda: px.imshow(heatmap))
+    t.figure(lambda: px.bar(daily_recent, x='timestamp', y='consumption'))
+
+
+def utility_page(name):
+    # The gas and water pages share their layout.
+    def page(store, t):
+        campuses = store.campuses(name)
+        daily = t("aggregate", lambda: store.rollup(name, "day", campuses).reset_index())
+        totals = t("aggregate", lambda: store.rollup(name, "campus_id", campuses).reset_index())
+        monthly = t("aggregate", lambda: store.rollup(name, ["month", "campus_id"], campuses).reset_index())
+        hourly = t("aggregate", lambda: store.rollup(name, "hour", campuses, agg="mean").reset_index())
+        tou = t("aggregate", lambda: time_of_use(store, name, campuses))
+        t("aggregate", lambda: tou.sum())
+        compare = t("aggregate", lambda: tou[['peak', 'off_peak']].groupby(level='day').sum().rename_axis(
+            columns='time_type').stack().rename('consumption').reset_index())
+        if name == "water":
+            df = t("filter", lambda: store.view(name, campuses, columns=['consumption']))
+            t("aggregate", lambda: night_usage_alerts(df).groupby('hour')['consumption'].mean())
+        t.figure(lambda: px.line(daily, x='day', y='consumption'))
+        t.figure(lambda: px.bar(totals, x='campus_id', y='consumption'))
+        t.figure(lambda: px.line(monthly, x='month', y='consumption', color='campus_id'))
+        t.figure(lambda: px.line(hourly, x='hour', y='consumption'))
+        t.figure(lambda: px.line(compare, x='day', y='consumption', color='time_type'))
+    return page
+
+
+def anomalies_page(store, t):
+    energy = t("filter", lambda: store.view("energy"))
+    summary = t("aggregate", lambda: energy.groupby('timestamp')['consumption'].sum().reset_index())
+    water = t("filter", lambda: store.view("water"))
+    flagged = {
+        name: t.fit(lambda: RollingAnomalyEngine(name, 7, 1.5).refresh(store)) for name in ("gas", "water")
+    }
+    alerts = t("aggregate", lambda: night_usage_alerts(water))
+    t.figure(lambda: px.line(summary, x='timestamp', y='consumption'))
+    for name, rows in flagged.items():
+        t.figure(lambda: px.scatter(rows, x='timestamp', y='consumption', color='campus_id'))
+    t.figure(lambda: px.histogram(alerts, x='hour'))
+
+
+def optimization_page(store, t):
+    data = t("filter", lambda: store.view("gas"))
+    scorer = t.fit(lambda: IsolationScorer(0.05).fit(store.view("gas")))
+    flags = t("aggregate", lambda: scorer.predict(data))
+    t("aggregate", lambda: data.groupby('hour')['consumption'].mean().sort_values(ascending=False).head(5))
+    plan, _ = t.fit(lambda: shift_load(data, "gas"))
+    profile = t("aggregate", lambda: hourly_profile(plan))
+    forecast = t.fit(lambda: forecast_arima(data['consumption'], 48, order=(5, 1, 0)))
+    t.figure(lambda: go.Figure([
+        go.Scatter(x=data['timestamp'], y=data['consumption']),
+        go.Scatter(x=data.loc[flags, 'timestamp'], y=data.loc[flags, 'consumption'], mode='markers'),
+    ]))
+    t.figure(lambda: go.Figure([go.Scatter(x=np.arange(len(forecast)), y=forecast)]))
+    t.figure(lambda: go.Figure([go.Scatter(x=profile.index, y=profile[column]) for column in profile]))
+
+
+def forecast_page(store, t):
+    data = t("aggregate", lambda: store.rollup("energy", "day").rename_axis('date').to_frame())
+    scorer = t.fit(lambda: IsolationScorer(0.05).fit(data))
+    data['anomaly'] = scorer.predict(data)
+    horizon = 30
+    train = data['consumption'].iloc[:-horizon]
+    fits = {}
+    for model, (fn, params) in MODELS.items():
+        fits[model] = t.fit(lambda: fn(train, horizon, **params))
+    # Fresh decomposers, so nothing is served from their caches.
+    decomp, _ = t.fit(lambda: Decomposer().decompose("energy", total_series(store, "energy")))
+    decomps, _ = t.fit(lambda: decompose_campuses(Decomposer(), store, "energy"))
+    t("aggregate", lambda: pd.DataFrame({campus_id: seasonal_strength(d) for campus_id, d in decomps.items()}).T)
+    for result in fits.values():
+        t.figure(lambda: go.Figure([
+            go.Scatter(x=train.index, y=train), go.Scatter(x=data.index[-horizon:], y=result['forecast']),
+        ]))
+    t.figure(lambda: go.Figure([
+        go.Scatter(x=data.index, y=data['consumption']),
+        go.Scatter(x=data.index[data['anomaly']], y=data.loc[data['anomaly'], 'consumption'], mode='markers'),
+    ]))
+    t.figure(lambda: go.Figure([go.Scatter(x=decomp.index, y=decomp[column]) for column in decomp.columns[1:]]))
+
+
+def policy_page(store, t):
+    campus = store.campuses("energy")[0]
+    engine = t("aggregate", lambda: ScenarioEngine(campus_totals(store)))
+    results = t("aggregate", lambda: engine.evaluate(policy_combinations(DEFAULT_REDUCTIONS)))
+    effects = results["resource_savings"][campus]
+    by_campus = results["resource_savings"].iloc[-1].sort_values(ascending=False)
+    t.figure(lambda: go.Figure([go.Bar(x=[scenario], y=[savings]) for scenario, savings in effects.items()]))
+    t.figure(lambda: px.bar(x=by_campus.index.astype(str), y=by_campus.values))
+
+
+def sustainability_page(store, t):
+    campus = store.campuses("energy")[0]
+    engine = t("aggregate", lambda: ScenarioEngine(campus_totals(store)))
+    means = t("aggregate", lambda: campus_totals(store, [campus], agg="mean").loc[campus])
+    grouped = t("aggregate", lambda: store.rollup("energy", "campus_id", agg="mean"))
+    t("aggregate", lambda: efficiency_scores(store)[campus])
+    grid = scenario_grid()
+    saved = t("aggregate", lambda: engine.evaluate(grid)["co2_saved"][campus])
+    best = t("aggregate", lambda: frontier(grid.sum(axis=1), saved))
+    results, _ = t.fit(lambda: run_monte_carlo(
+        means.to_dict(), {"electricity": 0.05, "gas": 0.05, "water": 0.05}, {"electricity": 0.233, "gas": 2.204, "water": 0.0015},
+        reductions=monte_carlo_reductions(), years=10, simulations=1000,
+    ))
+    t.figure(lambda: px.bar(grouped))
+    t.figure(lambda: px.histogram(results, nbins=30))
+    t.figure(lambda: px.scatter(x=grid.sum(axis=1), y=saved).add_trace(go.Scatter(x=grid.sum(axis=1)[best], y=saved[best])))
+
+
+# page -> (datasets it reads, compute path)
+PAGES = {
+    "energy_consumption": (["energy"], energy_page),
+    "gas_consumption": (["gas"], utility_page("gas")),
+    "water_consumption": (["water"], utility_page("water")),
+    "Anomalies_Detection": (["energy", "gas", "water"], anomalies_page),
+    "Consumption_optimazation": (["gas"], optimization_page),
+    "Consumption_Forcast": (["energy"], forecast_page),
+    "Policy_simulation": (list(DATASETS), policy_page),
+    "Sustainability_Impact": (list(DATASETS), sustainability_page),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline, tolerance):
+    # Prints every stage next to the baseline; returns the regressions.
+    regressions = []
+    print(f"\n{'page':<28}{'stage':<12}{'base s':>10}{'now s':>10}{'ratio':>8}")
+    for page, stages in results["pages"].items():
+        for stage, seconds in stages.items():
+            before = baseline.get("pages", {}).get(page, {}).get(stage)
+            if not before:
+                continue
+            ratio = seconds / before
+            slower = ratio > tolerance and seconds - before > 0.01
+            if slower:
+                regressions.append((page, stage, ratio))
+            print(f"{page:<28}{stage:<12}{before:>10.3f}{seconds:>10.3f}{ratio:>7.2f}x{' !' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every page's load/filter/aggregate/model_fit/figure stages.")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<revision>-<rows>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    # Source load per dataset: parquet (also writes the Arrow snapshot), then
+    # the Arrow snapshot a new process starts from.
+    load = {}
+    for name in sorted({name for page in args.pages for name in PAGES[page][0]}):
+        load[name] = {
+            "parquet_s": timeit(lambda: DatasetStore()._load(name, use_cache=False), repeat=1),
+            "arrow_cache_s": timeit(lambda: DatasetStore()._load(name), repeat=args.repeat),
+        }
+    store = DatasetStore()
+    for name in load:
+        load[name]["rows"] = len(store.get(name))
+    rows = sum(entry["rows"] for entry in load.values())
+    print(f"{DATA_DIR}: {rows:,} rows in {sorted(load)}")
+
+    pages = {}
+    for page in args.pages:
+        datasets, compute = PAGES[page]
+        t = Stages(args.repeat)
+        t.seconds["load"] = sum(load[name]["arrow_cache_s"] for name in datasets)
+        compute(store, t)
+        pages[page] = {stage: t.seconds[stage] for stage in STAGES if stage in t.seconds}
+        print(f"{page:<28}" + "".join(f"{stage} {seconds:.3f}s  " for stage, seconds in pages[page].items()))
+
+    revision = git_revision()
+    results = {
+        "meta": {
+            "revision": revision,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "data_dir": DATA_DIR,
+            "rows": rows,
+            "campuses": {name: len(store.campuses(name)) for name in load},
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "load": load,
+        "pages": pages,
+    }
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"{revision}-{rows}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"-> {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than {args.tolerance}x the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
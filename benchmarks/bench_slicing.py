@@ -0,0 +1,46 @@
+import argparse
+
+import pandas as pd
+
+from common import make_readings, timeit
+from utils import CampusTimeIndex, sort_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Boolean-mask selections vs the sorted campus/time index.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--campuses", type=int, default=100)
+    args = parser.parse_args()
+
+    df = sort_frame(make_readings(args.rows, args.campuses))
+    build = timeit(lambda: CampusTimeIndex(df), repeat=1)
+    index = CampusTimeIndex(df)
+    campus = df['campus_id'].iloc[len(df) // 2]
+    several = list(df['campus_id'].unique()[:args.campuses // 4])
+    latest = df['timestamp'].max()
+    week_ago = latest - pd.Timedelta(days=7)
+    print(f"{len(df):,} rows, {args.campuses} campuses, index built in {build:.3f}s")
+
+    cases = [
+        ("one campus",
+         lambda: df[df['campus_id'] == campus],
+         lambda: index.take(df, index.ranges([campus]))),
+        (f"{len(several)} campuses (isin)",
+         lambda: df[df['campus_id'].isin(several)],
+         lambda: index.take(df, index.ranges(several))),
+        ("last 7 days",
+         lambda: df[df['timestamp'] >= df['timestamp'].max() - pd.Timedelta(days=7)],
+         lambda: index.take(df, index.ranges(start=index.bounds()[1] - pd.Timedelta(days=7)))),
+        ("one campus, last 7 days",
+         lambda: df[(df['campus_id'] == campus) & (df['timestamp'] >= week_ago)],
+         lambda: index.take(df, index.ranges([campus], start=week_ago))),
+    ]
+    print(f"{'selection':<28}{'mask s':>10}{'index s':>10}{'speedup':>10}")
+    for label, mask, indexed in cases:
+        assert mask().reset_index(drop=True).equals(indexed().reset_index(drop=True))
+        mask_s, index_s = timeit(mask), timeit(indexed)
+        print(f"{label:<28}{mask_s:>10.4f}{index_s:>10.4f}{mask_s / index_s:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
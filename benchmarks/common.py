@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks are run from the repo root: `python benchmarks/<script>.py`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_readings(rows, campuses=50, seed=0):
+    # Hourly readings for `campuses` buildings, sized to roughly `rows` rows.
+    rng = np.random.default_rng(seed)
+    hours = max(rows // campuses, 1)
+    ts = pd.date_range("2020-01-01", periods=hours, freq="H")
+    df = pd.DataFrame({
+        "timestamp": np.tile(ts.values, campuses),
+        "campus_id": np.repeat(np.arange(1, campuses + 1), hours),
+    })
+    df["consumption"] = rng.gamma(4.0, 10.0, len(df))
+    return df
+
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
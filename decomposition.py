@@ -0,0 +1,235 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from model_cache import data_fingerprint
+from telemetry import count_cache, span
+
+
+# Seasonal decomposition of daily or hourly consumption into a trend, one
+# seasonal component per seasonality and a residual. "STL" is STL (robust to
+# outliers on request), run in turn for every seasonality as in MSTL;
+# "Classical" is the moving-average decomposition with a single period.
+# Results are cached per series. STL's smoothers only reach a few cycles of
+# the longest period, so when a series has only gained points at its end, the
+# components older than that reach can be kept and the rest taken from a fit
+# over the tail.
+
+DECOMPOSITION_ENTRIES = int(os.environ.get("DASH_DECOMPOSITION_ENTRIES", "512"))
+METHODS = ["STL", "Classical"]
+# Period of each seasonality in points, by resolution. Yearly cycles are
+# decomposed from daily points; an 8760-hour smoother is far too slow.
+SEASONALITIES = {
+    "D": {"weekly": 7, "yearly": 365},
+    "H": {"daily": 24, "weekly": 168},
+}
+RESOLUTIONS = {"D": "Daily", "H": "Hourly"}
+# Seasonal smoother span in cycles (statsmodels' STL default; with several
+# seasonalities MSTL's 11, 15, ...), and the passes over all seasonalities.
+SEASONAL_WINDOW = 7
+MSTL_ITERATIONS = 2
+# Largest difference, as a share of the series' standard deviation, allowed
+# between a tail fit and the cached components where they overlap.
+SPLICE_TOLERANCE = float(os.environ.get("DASH_SPLICE_TOLERANCE", "0.02"))
+
+
+def seasonal_windows(periods):
+    if len(periods) == 1:
+        return [SEASONAL_WINDOW]
+    return [SEASONAL_WINDOW + 4 * i for i in range(1, len(periods) + 1)]
+
+
+def stl_options(period, seasonal, robust):
+    # statsmodels' default trend and low-pass windows. Each smoother is
+    # evaluated at every ceil(window / 10)-th point and interpolated between,
+    # as in the original STL, which is many times faster at almost no cost.
+    trend = int(math.ceil(1.5 * period / (1 - 1.5 / seasonal)))
+    trend += trend % 2 == 0
+    low_pass = period + 1 + (period % 2 == 1)
+    return {
+        "period": period, "seasonal": seasonal, "trend": trend, "low_pass": low_pass, "robust": robust,
+        "seasonal_jump": math.ceil(seasonal / 10), "trend_jump": math.ceil(trend / 10),
+        "low_pass_jump": math.ceil(low_pass / 10),
+    }
+
+
+def stl_reach(periods):
+    # Points on either side that can move the components of a point.
+    return max(
+        (seasonal // 2 + 1) * period + stl_options(period, seasonal, False)["trend"]
+        for period, seasonal in zip(periods, seasonal_windows(periods))
+    )
+
+
+def resolution(index):
+    # "H" or "D" from the typical spacing of a DatetimeIndex.
+    return "H" if pd.Series(index).diff().median() < pd.Timedelta(days=1) else "D"
+
+
+def regular(series, freq):
+    # One point per step, in time order; gaps are interpolated since STL needs
+    # every point.
+    series = series.astype(float).sort_index().asfreq(freq)
+    return series.interpolate(limit_direction="both").rename("observed")
+
+
+def fit(series, method, periods, robust=False):
+    # Decomposition of a regular series: observed, trend, seasonal_<name> for
+    # every (name, period) of `periods` and resid.
+    values = series.to_numpy()
+    names = list(periods)
+    if method == "Classical":
+        from statsmodels.tsa.seasonal import seasonal_decompose
+        result = seasonal_decompose(values, model="additive", period=periods[names[0]])
+        trend, seasonal = result.trend, result.seasonal[None, :]
+    else:
+        from statsmodels.tsa.seasonal import STL
+        seasonal = np.zeros((len(names), len(values)))
+        deseasonalized = values.copy()
+        windows = seasonal_windows(names)
+        for _ in range(MSTL_ITERATIONS if len(names) > 1 else 1):
+            for i, name in enumerate(names):
+                deseasonalized = deseasonalized + seasonal[i]
+                result = STL(deseasonalized, **stl_options(periods[name], windows[i], robust)).fit()
+                seasonal[i] = result.seasonal
+                deseasonalized = deseasonalized - seasonal[i]
+        trend = result.trend
+    out = pd.DataFrame({"observed": values, "trend": trend}, index=series.index)
+    for i, name in enumerate(names):
+        out[f"seasonal_{name}"] = seasonal[i]
+    out["resid"] = values - trend - seasonal.sum(axis=0)
+    return out
+
+
+def seasonal_strength(decomposition):
+    # Share of the detrended variance explained by each seasonal component
+    # (0 = none, 1 = all of it).
+    resid = decomposition["resid"]
+    return pd.Series({
+        column[len("seasonal_"):]: max(0.0, 1 - resid.var() / (decomposition[column] + resid).var())
+        for column in decomposition.columns if column.startswith("seasonal_")
+    })
+
+
+class Decomposer:
+    """Seasonal decompositions of named series, cached per series and data.
+
+    A series whose data is unchanged since the last call is served from the
+    cache. One that only gained points at its end is extended: STL is refitted
+    from four reaches before the first new point and its components replace
+    the cached ones from one reach before it, provided the two fits agree
+    where they overlap. Anything else is refitted in full: a series with a
+    quarter of its points new since its last full fit, robust STL (it weighs
+    every point by the median residual of the whole series, so tail fits
+    drift) and Classical decomposition (its seasonal means span the whole
+    series).
+    """
+
+    def __init__(self, max_entries=DECOMPOSITION_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decompose(self, key, series, method="STL", seasonalities=("weekly",), robust=False):
+        # (decomposition, how it was served: "cached", "extended" or "fitted").
+        # Seasonalities that do not apply to the series' resolution, or that
+        # it does not span twice, are left out.
+        freq = resolution(series.index)
+        series = regular(series, freq)
+        periods = {
+            name: period for name, period in SEASONALITIES[freq].items()
+            if name in seasonalities and 2 * period <= len(series)
+        }
+        if method == "Classical":
+            periods = dict(list(periods.items())[:1])
+        if not periods:
+            raise ValueError(f"{key}: {len(series)} points are too few for a {'/'.join(seasonalities)} decomposition")
+
+        entry_key = (key, method, tuple(periods), robust)
+        fingerprint = data_fingerprint(series)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                self._entries.move_to_end(entry_key)
+        count_cache("decomposition", entry is not None and entry[0] == fingerprint)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1], "cached"
+
+        result = None
+        if entry is not None and method == "STL" and not robust and len(series) - entry[2] <= entry[2] // 4:
+            result = self._extend(key, entry[1], series, periods)
+        how = "extended" if result is not None else "fitted"
+        if result is None:
+            with span("model_fit", f"{method} decomposition of {key}"):
+                result = fit(series, method, periods, robust)
+        # The length at the last full fit.
+        fitted = entry[2] if how == "extended" else len(series)
+        with self._lock:
+            self._entries[entry_key] = (fingerprint, result, fitted)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result, how
+
+    def _extend(self, key, cached, series, periods):
+        known = len(cached)
+        if len(series) <= known or not series.index[:known].equals(cached.index):
+            return None
+        if not np.array_equal(series.to_numpy()[:known], cached["observed"].to_numpy()):
+            return None
+        reach = stl_reach(list(periods.values()))
+        start = known - 4 * reach
+        if start <= 0 or len(series) - start > len(series) // 2:
+            return None
+        with span("model_fit", f"STL tail of {key}"):
+            tail = fit(series.iloc[start:], "STL", periods)
+        # Where the tail fit and the cached fit should agree (past the tail's
+        # own start-up and before the points the new data can move), they
+        # have to, or the splice is not trusted.
+        overlap = slice(start + reach, known - reach)
+        drift = (tail["resid"].loc[cached.index[overlap]] - cached["resid"].iloc[overlap]).abs().max()
+        if drift > SPLICE_TOLERANCE * series.std():
+            return None
+        return pd.concat([cached.iloc[:known - reach], tail.iloc[known - reach - start:]])
+
+
+def total_series(store, name, freq="D"):
+    # Consumption of every campus of `name` together, per day or hour.
+    if freq == "D":
+        return store.rollup(name, 'day')
+    df = store.view(name, columns=['timestamp', 'consumption'])
+    return df.groupby('timestamp')['consumption'].sum()
+
+
+def campus_series(store, name, freq="D"):
+    # (campus_id, consumption per day or hour) for every campus of `name`.
+    if freq == "D":
+        daily = store.rollup(name, ['campus_id', 'day'])
+        for campus_id, s in daily.groupby(level='campus_id', observed=True):
+            yield campus_id, s.droplevel('campus_id')
+        return
+    frames, _ = store.batches(name)
+    for df in frames:
+        hourly = df.groupby(['campus_id', 'timestamp'], observed=True)['consumption'].sum()
+        for campus_id, s in hourly.groupby(level='campus_id', observed=True):
+            yield campus_id, s.droplevel('campus_id')
+
+
+def decompose_campuses(decomposer, store, name, freq="D", method="STL", seasonalities=("weekly",), robust=False):
+    # ({campus_id: decomposition}, {how: count}) for every campus of `name`
+    # with enough history; each campus is cached and extended on its own.
+    results, served = {}, {}
+    with span("model_fit", f"{method} decomposition of every {name} campus"):
+        for campus_id, s in campus_series(store, name, freq):
+            try:
+                results[campus_id], how = decomposer.decompose(
+                    (name, campus_id, freq), s, method, seasonalities, robust,
+                )
+            except ValueError:
+                continue
+            served[how] = served.get(how, 0) + 1
+    return results, served
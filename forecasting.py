@@ -0,0 +1,141 @@
+import inspect
+
+import pandas as pd
+
+from model_cache import model_cache
+
+
+# The modelling libraries are imported by the fitters themselves so that
+# importing this module stays cheap for pages that never fit anything.
+#
+# State-space fits (SARIMAX, ARIMA) carry every filtered state in their results,
+# which pickles to hundreds of MB on hourly data. For those only the estimated
+# parameters are cached; given `fitted_params` the fitter just re-runs the
+# Kalman filter, which reproduces the results without any optimisation.
+
+def fit_sarimax(series, order=(1, 1, 1), seasonal_order=(1, 1, 1, 7), fitted_params=None):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    model = SARIMAX(series, order=order, seasonal_order=seasonal_order)
+    return model.filter(fitted_params) if fitted_params is not None else model.fit(disp=False)
+
+
+def fit_holt_winters(series, trend="add", seasonal="add", seasonal_periods=7):
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    return ExponentialSmoothing(series, trend=trend, seasonal=seasonal, seasonal_periods=seasonal_periods).fit()
+
+
+def fit_arima(series, order=(5, 1, 0), fitted_params=None):
+    from statsmodels.tsa.arima.model import ARIMA
+    model = ARIMA(series, order=order)
+    return model.filter(fitted_params) if fitted_params is not None else model.fit()
+
+
+def fit_prophet(daily):
+    # `daily` has Prophet's ds / y columns.
+    from prophet import Prophet
+    model = Prophet()
+    model.fit(daily)
+    return model
+
+
+FITTERS = {
+    "sarimax": fit_sarimax,
+    "holt_winters": fit_holt_winters,
+    "arima": fit_arima,
+    "prophet": fit_prophet,
+}
+PARAMS_ONLY = {"sarimax", "arima"}
+
+
+def model_params(model_type, **params):
+    # Explicit params merged over the fitter's defaults, so equivalent calls
+    # share a cache key.
+    signature = inspect.signature(FITTERS[model_type])
+    defaults = {
+        name: p.default for name, p in list(signature.parameters.items())[1:]
+        if p.default is not inspect.Parameter.empty and name != "fitted_params"
+    }
+    return {**defaults, **params}
+
+
+def fit_model(model_type, data, **params):
+    # Fitted model for this type/params/data, reused from the on-disk model
+    # cache when any process has fitted it before.
+    params = model_params(model_type, **params)
+    fit = FITTERS[model_type]
+    key = model_cache.key(model_type, params, data)
+    cached = model_cache.get(key)
+    if model_type in PARAMS_ONLY:
+        if cached is not None:
+            return fit(data, fitted_params=cached, **params)
+        results = fit(data, **params)
+        model_cache.put(key, results.params)
+        return results
+    if cached is None:
+        cached = fit(data, **params)
+        model_cache.put(key, cached)
+    return cached
+
+
+# Forecast helpers return small frames so they can run in a training worker
+# (see jobs.py) and ship only the forecast back, not the fitted model.
+
+def interval_frame(forecast):
+    # forecast / lower / upper from a state-space model's get_forecast().
+    conf_int = forecast.conf_int()
+    return pd.DataFrame({
+        "forecast": forecast.predicted_mean,
+        "lower": conf_int.iloc[:, 0],
+        "upper": conf_int.iloc[:, 1],
+    })
+
+
+def forecast_sarimax(series, steps, **params):
+    return interval_frame(fit_model("sarimax", series, **params).get_forecast(steps=steps))
+
+
+def forecast_holt_winters(series, steps, **params):
+    forecast = fit_model("holt_winters", series, **params).forecast(steps)
+    return pd.DataFrame({"forecast": forecast, "lower": forecast * 0.95, "upper": forecast * 1.05})
+
+
+def forecast_arima(series, steps, **params):
+    return fit_model("arima", series, **params).forecast(steps=steps)
+
+
+def forecast_arima_interval(series, steps, **params):
+    return interval_frame(fit_model("arima", series, **params).get_forecast(steps=steps))
+
+
+def forecast_prophet(daily, periods):
+    model = fit_model("prophet", daily)
+    future = pd.DataFrame({'ds': pd.date_range(daily['ds'].max(), periods=periods + 1, freq='D')[1:]})
+    return model.predict(future)
+
+
+def forecast_prophet_interval(series, steps):
+    forecast = forecast_prophet(pd.DataFrame({'ds': series.index, 'y': series.to_numpy()}), steps)
+    return pd.DataFrame({
+        "forecast": forecast['yhat'].to_numpy(),
+        "lower": forecast['yhat_lower'].to_numpy(),
+        "upper": forecast['yhat_upper'].to_numpy(),
+    })
+
+
+# Models offered for daily series, with the hyperparameters the pages use.
+MODELS = {
+    "SARIMAX": (forecast_sarimax, dict(order=(1, 1, 1), seasonal_order=(1, 1, 1, 7))),
+    "Holt-Winters": (forecast_holt_winters, dict(trend="add", seasonal="add", seasonal_periods=7)),
+    "ARIMA": (forecast_arima_interval, dict(order=(5, 1, 0))),
+    "Prophet": (forecast_prophet_interval, {}),
+}
+
+
+def forecast_daily(model, series, horizon):
+    # Forecast of a daily series for the `horizon` days after it. Days
+    # without readings are interpolated so the series has a daily frequency.
+    series = series.asfreq("D").interpolate()
+    forecast_fn, params = MODELS[model]
+    forecast = forecast_fn(series, horizon, **params)
+    forecast.index = pd.date_range(series.index.max() + pd.Timedelta(days=1), periods=horizon, freq="D", name="date")
+    return forecast
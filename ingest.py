@@ -0,0 +1,30 @@
+import argparse
+
+import pandas as pd
+
+from storage import DATASETS, write_batch
+
+
+# Appends a batch of meter readings (csv or parquet with timestamp, campus_id
+# and consumption columns) to a dataset. Running dashboards pick the new rows
+# up on their next sync (DASH_SYNC_INTERVAL_S) without a reload.
+#
+#   python ingest.py gas new_gas_readings.csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new meter readings to a dataset.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.path.endswith(".parquet"):
+        batch = pd.read_parquet(args.path)
+    else:
+        batch = pd.read_csv(args.path)
+    written = write_batch(args.dataset, batch)
+    print(f"{args.dataset}: {len(written)} new readings appended ({len(batch) - len(written)} duplicates skipped)")
+
+
+if __name__ == "__main__":
+    main()
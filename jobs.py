@@ -0,0 +1,210 @@
+import os
+import pickle
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from telemetry import count_cache, current_page, observe
+
+
+TRAINING_WORKERS = int(os.environ.get("DASH_TRAINING_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hard limit on a single fit, and how long a job may go unpolled before it is
+# considered abandoned (every session waiting on it has gone away).
+TRAINING_TIMEOUT_S = float(os.environ.get("DASH_TRAINING_TIMEOUT_S", "600"))
+ABANDON_AFTER_S = float(os.environ.get("DASH_TRAINING_ABANDON_S", "120"))
+KEEP_FINISHED = 128
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = "pending", "running", "done", "failed", "cancelled", "timed out"
+
+
+def _serve():
+    # Worker loop, run as `python jobs.py`. Workers are started as a plain
+    # script rather than through multiprocessing, which would re-run the
+    # Streamlit page that happens to be registered as __main__. Jobs arrive
+    # pickled on stdin and results leave on the original stdout; fd 1 itself
+    # is pointed at stderr so library output cannot corrupt the stream.
+    results = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    while True:
+        try:
+            fn, args, kwargs = pickle.load(sys.stdin.buffer)
+        except EOFError:
+            return
+        try:
+            payload = pickle.dumps((DONE, fn(*args, **kwargs)), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            payload = pickle.dumps((FAILED, traceback.format_exc()), protocol=pickle.HIGHEST_PROTOCOL)
+        results.write(payload)
+        results.flush()
+
+
+class Job:
+
+    def __init__(self, key, fn, args, kwargs):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.last_polled = self.submitted
+        self.cancel_requested = False
+        # Page that first asked for the fit, for its model_fit timing.
+        self.page = current_page()
+
+    @property
+    def done(self):
+        return self.state == DONE
+
+    @property
+    def active(self):
+        return self.state in (PENDING, RUNNING)
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - (self.started or self.submitted)
+
+
+class TrainingPool:
+    """Bounded pool of worker processes for model fits.
+
+    `workers` long-lived processes take jobs from a shared queue, so the
+    modelling libraries are imported once per worker rather than once per
+    fit. A worker running a job that times out or is cancelled is killed and
+    replaced. Jobs are deduplicated by key: sessions asking for the same fit
+    share one job and its result. Jobs nobody has polled for `abandon_after`
+    seconds are cancelled.
+    """
+
+    def __init__(self, workers=TRAINING_WORKERS, timeout=TRAINING_TIMEOUT_S, abandon_after=ABANDON_AFTER_S):
+        self.workers = workers
+        self.timeout = timeout
+        self.abandon_after = abandon_after
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            shared = job is not None and job.state in (PENDING, RUNNING, DONE)
+            count_cache("training_jobs", shared)
+            if shared:
+                job.last_polled = time.monotonic()
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key, fn, args, kwargs)
+            self._jobs[key] = job
+            self._prune()
+        self._queue.put(job)
+        return job
+
+    def poll(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                job.last_polled = time.monotonic()
+            return job
+
+    def cancel(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or not job.active:
+                return
+            if job.state == PENDING:
+                self._finish(job, CANCELLED)
+            else:
+                job.cancel_requested = True
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        finished = [k for k, j in self._jobs.items() if not j.active]
+        for key in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[key]
+
+    def _stop_reason(self, job):
+        now = time.monotonic()
+        if job.cancel_requested:
+            return CANCELLED
+        if now - job.last_polled > self.abandon_after:
+            return CANCELLED
+        if job.started is not None and now - job.started > self.timeout:
+            return TIMED_OUT
+        return None
+
+    def _finish(self, job, state, result=None, error=None):
+        job.state, job.result, job.error = state, result, error
+        job.finished = time.monotonic()
+        job.args = job.kwargs = None
+        if state == DONE:
+            observe(job.page, "model_fit", job.finished - job.started)
+
+    def _work(self):
+        process = None
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.state != PENDING:
+                    continue
+                reason = self._stop_reason(job)
+                if reason is not None:
+                    self._finish(job, reason)
+                    continue
+                job.started = time.monotonic()
+                job.state = RUNNING
+            try:
+                request = pickle.dumps((job.fn, job.args, job.kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self._finish(job, FAILED, error=traceback.format_exc())
+                continue
+            if process is None or process.poll() is not None:
+                process = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__)],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                )
+            if not self._run(job, process, request):
+                process.kill()
+                process.wait()
+                process = None
+
+    def _run(self, job, process, request):
+        # Hand one job to a worker process and wait for its result. Returns
+        # False when the worker had to be stopped or died.
+        try:
+            process.stdin.write(request)
+            process.stdin.flush()
+        except OSError:
+            self._finish(job, FAILED, error=f"worker exited with code {process.poll()}")
+            return False
+        while not select.select([process.stdout], [], [], 0.5)[0]:
+            reason = self._stop_reason(job)
+            if reason is not None:
+                self._finish(job, reason)
+                return False
+        try:
+            state, payload = pickle.load(process.stdout)
+        except Exception:
+            self._finish(job, FAILED, error=f"worker exited with code {process.poll()}")
+            return False
+        if state == DONE:
+            self._finish(job, DONE, result=payload)
+        else:
+            self._finish(job, FAILED, error=payload)
+        return True
+
+
+if __name__ == "__main__":
+    _serve()
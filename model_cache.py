@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+
+import pandas as pd
+
+from storage import DATA_DIR
+from telemetry import count_cache
+
+
+MODEL_CACHE_DIR = os.environ.get("DASH_MODEL_CACHE_DIR", os.path.join(DATA_DIR, "_models"))
+# Size budget for the on-disk model cache, in MB; least recently used fits go first.
+MODEL_CACHE_MB = float(os.environ.get("DASH_MODEL_CACHE_MB", "512"))
+
+
+def data_fingerprint(data):
+    # Cheap content hash of a Series/DataFrame (values, index, names, dtypes).
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(zip(data.columns, data.dtypes.astype(str)))).encode())
+    else:
+        digest.update(repr((data.name, str(data.dtype))).encode())
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """Fitted models pickled to disk, shared by every process and replica.
+
+    Entries are keyed by model type, hyperparameters and a fingerprint of the
+    training data, so an identical fit is never repeated after a restart. The
+    directory is kept under a size budget by evicting the least recently used
+    entries (hits refresh the file's mtime).
+    """
+
+    def __init__(self, root=MODEL_CACHE_DIR, budget_mb=MODEL_CACHE_MB):
+        self.root = root
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, model_type, params, data):
+        # `data` is the training data, or a string that already identifies it.
+        payload = json.dumps(
+            {"model": model_type, "params": params, "data": data if isinstance(data, str) else data_fingerprint(data)},
+            sort_keys=True, default=str,
+        )
+        return f"{model_type}-{hashlib.sha1(payload.encode()).hexdigest()[:20]}"
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            with self._lock:
+                self.misses += 1
+            count_cache("model", False)
+            return None
+        with self._lock:
+            self.hits += 1
+        count_cache("model", True)
+        return model
+
+    def put(self, key, model):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            # Unpicklable models are simply not persisted.
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.evict()
+
+    def get_or_fit(self, model_type, params, data, fit):
+        key = self.key(model_type, params, data)
+        model = self.get(key)
+        if model is None:
+            model = fit()
+            self.put(key, model)
+        return model
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.root, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+            total -= size
+
+
+model_cache = ModelCache()
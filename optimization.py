@@ -0,0 +1,140 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from tariffs import BANDS, TARIFF
+from telemetry import timed
+
+
+# Load shifting: move the flexible share of every building's demand out of the
+# tariff's expensive bands. Each building and hour with recorded (baseline)
+# consumption b gets two variables, the demand moved out (d) and moved in (u),
+# so its consumption after shifting is x = b - d + u:
+#
+#   minimize    sum of BAND_WEIGHTS[band of the hour] * (u - d) + MOVE_COST * (u + d)
+#   subject to  sum of (u - d) over a day = 0                   (per building and day)
+#               sum of x over the buildings <= site capacity    (per hour)
+#               0 <= d <= flexible * b
+#               0 <= u <= headroom * the building's highest hour - b
+#
+# MOVE_COST keeps demand where it is unless moving it lowers the band. No
+# constraint spans two days, so the year splits into independent LPs of
+# DAYS_PER_SOLVE days, each with sparse constraint matrices (two non-zeros per
+# cell in each family) solved by HiGHS.
+
+BAND_WEIGHTS = {"peak": 1.0, "shoulder": 0.5, "off_peak": 0.0}
+MOVE_COST = 1e-3
+DAYS_PER_SOLVE = 7
+HOUR = pd.Timedelta(hours=1)
+DAY = pd.Timedelta(days=1)
+
+
+def hourly_grid(df):
+    # Readings as a (day, campus, hour) array of consumption, a mask of the
+    # cells that have readings, the days and the campus ids.
+    ts = df['timestamp']
+    first = ts.min().normalize()
+    day = ((ts - first) // DAY).to_numpy()
+    campuses, campus = np.unique(df['campus_id'].to_numpy(), return_inverse=True)
+    hour = ((ts - first) // HOUR).to_numpy() % 24
+    shape = (int(day.max()) + 1 if len(df) else 0, len(campuses), 24)
+    cell = np.ravel_multi_index((day, campus, hour), shape)
+    size = int(np.prod(shape))
+    grid = np.bincount(cell, weights=df['consumption'].to_numpy(dtype=float), minlength=size).reshape(shape)
+    present = (np.bincount(cell, minlength=size) > 0).reshape(shape)
+    return grid, present, pd.date_range(first, periods=shape[0], freq="D"), campuses
+
+
+def solve_block(base, present, weights, movable, room, capacity):
+    # One LP over the (day, campus, hour) cells of `base`; returns (x, result).
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    days, campuses, hours = base.shape
+    n = base.size
+    cell = np.arange(n)
+    columns = np.concatenate([cell, cell + n])  # d, then u
+    signs = np.concatenate([-np.ones(n), np.ones(n)])
+    # Per building and day: the day's total is kept.
+    a_eq = sparse.csr_matrix((signs, (np.tile(cell // hours, 2), columns)), shape=(days * campuses, 2 * n))
+    # Per day and hour: all buildings together stay under the site capacity.
+    slot = (cell // (campuses * hours)) * hours + cell % hours
+    a_ub = sparse.csr_matrix((signs, (np.tile(slot, 2), columns)), shape=(days * hours, 2 * n))
+    weight = np.broadcast_to(weights[:, None, :], base.shape).ravel()
+    result = linprog(
+        np.concatenate([MOVE_COST - weight, MOVE_COST + weight]),
+        A_ub=a_ub, b_ub=(capacity - base.sum(axis=1)).ravel(), A_eq=a_eq, b_eq=np.zeros(days * campuses),
+        bounds=np.column_stack([np.zeros(2 * n), np.concatenate([movable.ravel(), np.where(present, room, 0.0).ravel()])]),
+        method="highs",
+    )
+    if result.status != 0:
+        return base, result
+    return base - result.x[:n].reshape(base.shape) + result.x[n:].reshape(base.shape), result
+
+
+@timed("model_fit", "load shifting LP")
+def shift_load(df, utility, flexible=0.2, headroom=1.0, capacity=1.0, tariff=TARIFF, days_per_solve=DAYS_PER_SOLVE):
+    """Shift hourly demand in `df` (timestamp, campus_id, consumption) out of peak bands.
+
+    `flexible` is the share of each hour's demand that may move (a number or a
+    Series by campus_id), `headroom` caps every building at that multiple of
+    its own highest hour and `capacity` caps each hour of the site at that
+    multiple of its highest total hour. Returns the plan (one row per reading
+    with its band, baseline and optimized consumption) and solver statistics.
+    """
+    start = time.perf_counter()
+    grid, present, days, campuses = hourly_grid(df)
+    if isinstance(flexible, pd.Series):
+        flexible = flexible.reindex(campuses).fillna(0.0).to_numpy()
+    flexible = np.clip(np.broadcast_to(np.asarray(flexible, dtype=float), len(campuses)), 0.0, 1.0)
+    movable = flexible[None, :, None] * np.clip(grid, 0.0, None)
+    room = np.clip(headroom * grid.max(axis=(0, 2), initial=0.0)[None, :, None] - grid, 0.0, None)
+    site_capacity = capacity * grid.sum(axis=1).max(initial=0.0)
+    hours = days.repeat(24) + pd.to_timedelta(np.tile(np.arange(24), len(days)), unit="h")
+    bands = tariff.band_codes(hours).reshape(len(days), 24)
+    weights = np.array([BAND_WEIGHTS[band] for band in BANDS])[bands]
+    built = time.perf_counter()
+
+    optimized = grid.copy()
+    stats = {"solves": 0, "failed_days": 0, "variables": 0, "constraints": 0, "nonzeros": 0, "solve_seconds": 0.0}
+    for first in range(0, len(days), days_per_solve):
+        block = slice(first, first + days_per_solve)
+        solve_start = time.perf_counter()
+        x, result = solve_block(grid[block], present[block], weights[block], movable[block], room[block], site_capacity)
+        stats["solve_seconds"] += time.perf_counter() - solve_start
+        optimized[block] = x
+        n_days = x.shape[0]
+        stats["solves"] += 1
+        stats["failed_days"] += 0 if result.status == 0 else n_days
+        stats["variables"] += 2 * x.size
+        stats["constraints"] += n_days * (len(campuses) + 24)
+        stats["nonzeros"] += 4 * x.size
+
+    day, campus, hour = np.nonzero(present)
+    plan = pd.DataFrame({
+        'timestamp': days[day] + pd.to_timedelta(hour, unit="h"),
+        'campus_id': campuses[campus],
+        'band': pd.Categorical.from_codes(bands[day, hour], categories=BANDS),
+        'baseline': grid[day, campus, hour],
+        'optimized': optimized[day, campus, hour],
+    })
+    rates = tariff.rates[utility]
+    band_totals = plan.groupby('band', observed=False)[['baseline', 'optimized']].sum()
+    stats.update({
+        "campuses": len(campuses),
+        "days": len(days),
+        "build_seconds": built - start,
+        "seconds": time.perf_counter() - start,
+        "shifted": float(np.abs(optimized - grid).sum() / 2),
+        "peak_before": float(band_totals.loc['peak', 'baseline']),
+        "peak_after": float(band_totals.loc['peak', 'optimized']),
+        "cost_before": float((band_totals['baseline'] * rates).sum()),
+        "cost_after": float((band_totals['optimized'] * rates).sum()),
+    })
+    return plan, stats
+
+
+def hourly_profile(plan):
+    # Average baseline and optimized consumption by hour of the day.
+    return plan.groupby(plan['timestamp'].dt.hour)[['baseline', 'optimized']].mean()
@@ -1,18 +1,16 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 import plotly.express as px
 
-from utils import DataManager
+from analytics import night_usage_alerts
+from utils import DataManager, plotly_chart
 
 st.set_page_config(page_title="Anomaly Detection", layout="wide")
 st.title("🔍 Anomaly Detection")
 
 # Load Data
-dm = DataManager()
+dm = DataManager("Anomalies_Detection")
 df_energy = dm.load_energy()
-df_gas = dm.load_gas()
 df_water = dm.load_water()
 
 
@@ -31,7 +29,7 @@ fig.add_scatter(x=anomalies['timestamp'], y=anomalies['consumption'],
                 mode='markers', name='Anomalies',
                 marker=dict(color='red', size=8, symbol='x'))
 
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
 
 st.subheader("📋 Detected Anomalies")
 st.dataframe(anomalies[['timestamp', 'consumption', 'z_score']], use_container_width=True)
@@ -49,13 +47,13 @@ st.subheader("🚨Gas Abnormal Consumption Detection")
 rolling_window = 7
 threshold_factor = 1.5
 
-df_gas['rolling_avg'] = df_gas['consumption'].rolling(window=rolling_window).mean()
-df_gas['abnormal'] = df_gas['consumption'] > (df_gas['rolling_avg'] * threshold_factor)
-abnormal_instances = df_gas[df_gas['abnormal']]
+# Scored per building by the shared anomaly engine; only new readings are scored on reruns.
+gas_anomalies = dm.anomalies("gas", window=rolling_window, threshold_factor=threshold_factor)
+abnormal_instances = gas_anomalies[gas_anomalies['abnormal']]
 
 if not abnormal_instances.empty:
     st.warning(
-        f"⚠️ Abnormal gas consumption detected! **{len(abnormal_instances)}** instances where consumption exceeded **{threshold_factor}×** the 7-day rolling average."
+        f"⚠️ Abnormal gas consumption detected! **{len(abnormal_instances)}** instances where consumption exceeded **{threshold_factor}×** the building's rolling average of the previous {rolling_window} readings."
     )
 
     # Side-by-side layout
@@ -64,7 +62,7 @@ if not abnormal_instances.empty:
     with col1:
         st.markdown("#### 📋 Abnormal Consumption Table")
         st.dataframe(
-            abnormal_instances[['timestamp', 'campus_id', 'consumption', 'rolling_avg']],
+            abnormal_instances[['timestamp', 'campus_id', 'consumption', 'rolling_mean', 'z_score']],
             use_container_width=True
         )
 
@@ -77,7 +75,7 @@ if not abnormal_instances.empty:
             title='Abnormal Gas Consumption Instances',
             labels={'consumption': 'Gas Consumption (Units)', 'timestamp': 'Date'}
         )
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True)
 
 else:
     st.success("✅ No abnormal gas consumption detected.")
@@ -103,13 +101,13 @@ st.markdown("---")
 
 st.subheader("💧 Abnormal Water Consumption")
 
-rolling_avg = df_water["consumption"].rolling(window=7).mean()
 abnormal_threshold = 1.5
-abnormal = df_water[df_water["consumption"] > abnormal_threshold * rolling_avg]
+water_anomalies = dm.anomalies("water", window=7, threshold_factor=abnormal_threshold)
+abnormal = water_anomalies[water_anomalies["abnormal"]]
 
 if not abnormal.empty:
     st.warning(
-        f"🚱 Abnormal water consumption detected! **{len(abnormal)}** instances where consumption exceeded **{abnormal_threshold}×** the 7-day rolling average."
+        f"🚱 Abnormal water consumption detected! **{len(abnormal)}** instances where consumption exceeded **{abnormal_threshold}×** the building's rolling average of the previous 7 readings."
     )
 
     # Display table and chart side by side
@@ -131,7 +129,7 @@ if not abnormal.empty:
             title="Abnormal Water Consumption Over Time",
             labels={"timestamp": "Time", "consumption": "Units"}
         )
-        st.plotly_chart(fig_abnormal, use_container_width=True)
+        plotly_chart(fig_abnormal, use_container_width=True)
 
 else:
     st.success("✅ No abnormal water consumption detected.")
@@ -139,10 +137,7 @@ else:
 
 st.markdown("##### 💡 Off-Peak Hour Alerts")
 
-off_peak_hours = list(range(0, 7))  # Midnight to 6 AM
-off_peak_data = df_water[df_water["hour"].isin(off_peak_hours)]
-threshold = df_water["consumption"].quantile(0.75)
-high_off_peak = off_peak_data[off_peak_data["consumption"] > threshold]
+high_off_peak = night_usage_alerts(df_water)
 
 if not high_off_peak.empty:
     st.warning(f"🚱 **{len(high_off_peak)} instances** of high usage during off-peak hours.")
@@ -165,7 +160,7 @@ if not high_off_peak.empty:
             title="High Usage During Off-Peak",
             labels={"hour": "Hour", "consumption": "Avg Usage"},
         )
-        st.plotly_chart(fig_alert, use_container_width=True)
+        plotly_chart(fig_alert, use_container_width=True)
 
     st.markdown("##### Recommendations for water optimasation")
     for _, row in alert_summary.iterrows():
@@ -2,13 +2,16 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from sklearn.ensemble import IsolationForest
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from statsmodels.tsa.seasonal import seasonal_decompose
+import time
 import warnings
-from utils import DataManager
+from backtest import ACCURACY_TOLERANCE, BACKTEST_FOLDS, Backtest
+from batch_forecast import BatchForecast
+from decomposition import METHODS, RESOLUTIONS, SEASONALITIES, seasonal_strength
+from forecasting import MODELS
+from model_cache import data_fingerprint
+from scoring import fit_scorer
+from storage import DATASETS, read_forecast_table
+from utils import DataManager, get_backtests, get_batch_pool, get_batch_runs, plotly_chart, render_in_background
 
 warnings.filterwarnings("ignore")
 
@@ -16,74 +19,151 @@ st.set_page_config(page_title="🔮 Forecast Energy Consumption", layout="wide")
 st.title("📈 Forecast Energy Consumption")
 
 # Load Data
-dm = DataManager()
-df_energy = dm.load_energy()
-data = df_energy.groupby('day')['consumption'].sum().reset_index()
+dm = DataManager("Consumption_Forcast")
+data = dm.rollup("energy", 'day').reset_index()
 data.columns = ['date', 'consumption']
 data.set_index('date', inplace=True)
 
 st.sidebar.header("🔧 Configuration")
-model_choice = st.sidebar.selectbox("Choose Forecasting Model", ["SARIMAX", "Holt-Winters"])
+model_choice = st.sidebar.selectbox("Choose Forecasting Model", list(MODELS))
 horizon = st.sidebar.slider("Forecast Days", 7, 90, 30)
 contamination = st.sidebar.slider("Anomaly Sensitivity (0 = strict)", 0.01, 0.15, 0.05, step=0.01)
 
-iso = IsolationForest(contamination=contamination, random_state=42)
-data['anomaly'] = iso.fit_predict(data[['consumption']])
-data['anomaly'] = data['anomaly'].apply(lambda x: 1 if x == -1 else 0)
+data['anomaly'] = fit_scorer(data, contamination).predict(data).astype(int)
 
 train = data.iloc[:-horizon]
 test = data.iloc[-horizon:]
 
-# Caching model training
-@st.cache_resource
-def train_sarimax_model(train_data):
-    model = SARIMAX(train_data, order=(1, 1, 1), seasonal_order=(1, 1, 1, 7))
-    return model.fit(disp=False)
-
-@st.cache_resource
-def train_holt_winters_model(train_data):
-    model = ExponentialSmoothing(train_data, trend="add", seasonal="add", seasonal_periods=7)
-    return model.fit()
-
-if model_choice == "SARIMAX":
-    results = train_sarimax_model(train['consumption'])
-    forecast_obj = results.get_forecast(steps=horizon)
-    forecast = forecast_obj.predicted_mean
-    conf_int = forecast_obj.conf_int()
-    forecast.index = test.index
-    conf_int.index = test.index
-else:
-    results = train_holt_winters_model(train['consumption'])
-    forecast = results.forecast(horizon)
-    forecast.index = test.index
-    conf_int = pd.DataFrame({
-        'lower consumption': forecast * 0.95,
-        'upper consumption': forecast * 1.05
-    }, index=test.index)
+def plot_forecast(result):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+    forecast = result['forecast'].set_axis(test.index)
+    conf_int = result[['lower', 'upper']].set_axis(test.index)
+
+    fig1 = go.Figure()
+    fig1.add_trace(go.Scatter(x=train.index, y=train['consumption'], name='Train', line=dict(color='royalblue')))
+    fig1.add_trace(go.Scatter(x=test.index, y=test['consumption'], name='Test (Actual)', line=dict(color='green')))
+    fig1.add_trace(go.Scatter(x=forecast.index, y=forecast, name='Forecast', line=dict(color='orange', dash='dash')))
+    fig1.add_trace(go.Scatter(x=conf_int.index, y=conf_int.iloc[:, 0], name='Lower Bound', line=dict(color='orange', width=0.5), showlegend=False))
+    fig1.add_trace(go.Scatter(x=conf_int.index, y=conf_int.iloc[:, 1], fill='tonexty', mode='lines', name='Confidence Interval', line=dict(color='orange', width=0.5), showlegend=False))
+    fig1.update_layout(title='Forecast vs Actual', xaxis_title='Date', yaxis_title='Consumption', legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    plotly_chart(fig1, use_container_width=True)
+
+    mae = mean_absolute_error(test['consumption'], forecast)
+    rmse = np.sqrt(mean_squared_error(test['consumption'], forecast))
+    col1, col2 = st.columns(2)
+    col1.metric("📉 MAE", f"{mae:.2f}")
+    col2.metric("📈 RMSE", f"{rmse:.2f}")
 
 st.subheader(f"📊 Forecast Using {model_choice}")
-fig1 = go.Figure()
-fig1.add_trace(go.Scatter(x=train.index, y=train['consumption'], name='Train', line=dict(color='royalblue')))
-fig1.add_trace(go.Scatter(x=test.index, y=test['consumption'], name='Test (Actual)', line=dict(color='green')))
-fig1.add_trace(go.Scatter(x=forecast.index, y=forecast, name='Forecast', line=dict(color='orange', dash='dash')))
-fig1.add_trace(go.Scatter(x=conf_int.index, y=conf_int.iloc[:, 0], name='Lower Bound', line=dict(color='orange', width=0.5), showlegend=False))
-fig1.add_trace(go.Scatter(x=conf_int.index, y=conf_int.iloc[:, 1], fill='tonexty', mode='lines', name='Confidence Interval', line=dict(color='orange', width=0.5), showlegend=False))
-fig1.update_layout(title='Forecast vs Actual', xaxis_title='Date', yaxis_title='Consumption', legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-st.plotly_chart(fig1, use_container_width=True)
-
-mae = mean_absolute_error(test['consumption'], forecast)
-rmse = np.sqrt(mean_squared_error(test['consumption'], forecast))
-col1, col2, col3 = st.columns(3)
-col1.metric("📉 MAE", f"{mae:.2f}")
-col2.metric("📈 RMSE", f"{rmse:.2f}")
-col3.metric("📌 Anomaly Ratio", f"{(data['anomaly'].mean() * 100):.2f}%")
+forecast_fn, params = MODELS[model_choice]
+# Fitted in the background pool; the anomaly and decomposition sections render meanwhile.
+render_in_background(
+    f"{model_choice}-{horizon}-{data_fingerprint(train['consumption'])}", f"The {model_choice} forecast",
+    plot_forecast, forecast_fn, train['consumption'], horizon, **params,
+)
+st.metric("📌 Anomaly Ratio", f"{(data['anomaly'].mean() * 100):.2f}%")
+
+st.subheader("🏢 Forecast Every Building")
+runs = get_batch_runs()
+if st.button(f"Forecast all buildings with {model_choice} ({horizon} days)"):
+    runs[model_choice] = BatchForecast(get_batch_pool(), model_choice, horizon, dm.daily_series())
+run = runs.get(model_choice)
+
+if run is not None and not run.complete:
+    # Every building of every utility is fitted in the batch pool; progress
+    # refreshes until the forecast table has been written.
+    @st.fragment(run_every=2)
+    def batch_progress():
+        if run.complete:
+            st.rerun()
+        progress = run.progress()
+        st.progress(
+            progress['finished'] / progress['total'],
+            text=f"{progress['finished']}/{progress['total']} series · {progress['series_per_second']:.2f} series/s",
+        )
+
+    batch_progress()
+elif run is not None:
+    progress = run.progress()
+    states = ", ".join(f"{n} {state}" for state, n in progress['states'].items())
+    st.caption(
+        f"Last {run.model} run ({run.horizon} days): {progress['total']} series in {progress['elapsed']:.1f}s "
+        f"({progress['series_per_second']:.2f} series/s) — {states}."
+    )
+
+forecasts = read_forecast_table()
+forecasts = forecasts[forecasts['model'] == model_choice] if forecasts is not None else None
+if forecasts is None or forecasts.empty:
+    st.info(f"No building forecasts for {model_choice} yet.")
+else:
+    col1, col2 = st.columns(2)
+    utility = col1.selectbox("Utility", sorted(forecasts['utility'].unique()))
+    building = col2.selectbox("Building", sorted(forecasts.loc[forecasts['utility'] == utility, 'campus_id'].unique()))
+    building_forecast = forecasts[(forecasts['utility'] == utility) & (forecasts['campus_id'] == building)]
+    fig4 = go.Figure()
+    fig4.add_trace(go.Scatter(x=building_forecast['date'], y=building_forecast['lower'], name='Lower Bound', line=dict(color='orange', width=0.5), showlegend=False))
+    fig4.add_trace(go.Scatter(x=building_forecast['date'], y=building_forecast['upper'], fill='tonexty', mode='lines', name='Confidence Interval', line=dict(color='orange', width=0.5), showlegend=False))
+    fig4.add_trace(go.Scatter(x=building_forecast['date'], y=building_forecast['forecast'], name='Forecast', line=dict(color='orange', dash='dash')))
+    fig4.update_layout(title=f"{utility.title()} Forecast for Building {building}", xaxis_title='Date', yaxis_title='Consumption')
+    plotly_chart(fig4, use_container_width=True)
+    st.download_button(
+        label="Download Building Forecasts CSV", data=forecasts.to_csv(index=False).encode('utf-8'),
+        file_name=f"building_forecasts_{model_choice}.csv", mime='text/csv',
+    )
+
+st.subheader("🏁 Backtest the Models")
+# The metrics above score one holdout. Here every model is scored on several
+# rolling origins of every building's electricity series, fitted in the
+# batch pool; folds already scored are read back from the model cache.
+utility = DATASETS["energy"][1]
+col1, col2 = st.columns(2)
+backtest_models = col1.multiselect("Models", list(MODELS), default=list(MODELS))
+folds = col2.slider("Origins per building", 2, 12, BACKTEST_FOLDS)
+backtests = get_backtests()
+if st.button(f"Backtest {len(backtest_models)} models on every building ({horizon} days)", disabled=not backtest_models):
+    series = {key: s for key, s in dm.daily_series().items() if key[0] == utility}
+    backtests[utility] = Backtest(get_batch_pool(), backtest_models, horizon, series, folds)
+backtest = backtests.get(utility)
+
+if backtest is not None and not backtest.complete:
+    @st.fragment(run_every=2)
+    def backtest_progress():
+        if backtest.complete:
+            st.rerun()
+        progress = backtest.progress()
+        st.progress(
+            progress['finished'] / progress['total'],
+            text=f"{progress['finished']}/{progress['total']} folds · {progress['folds_per_second']:.2f} folds/s",
+        )
+
+    backtest_progress()
+elif backtest is not None:
+    progress = backtest.progress()
+    board = backtest.leaderboard()
+    st.caption(
+        f"{progress['total']} folds ({backtest.horizon}-day horizon, up to {backtest.folds} origins per building) "
+        f"in {progress['elapsed']:.1f}s — " + ", ".join(f"{n} {state}" for state, n in progress['states'].items()) + "."
+    )
+    st.dataframe(board.round(4), use_container_width=True)
+    fig5 = go.Figure(go.Scatter(
+        x=board['fit_seconds'], y=board['mase'], text=board.index, mode='markers+text', textposition='top center',
+        marker=dict(size=14, color=np.where(board['recommended'], 'green', 'royalblue')),
+    ))
+    fig5.update_layout(title='Accuracy vs. Fit Latency', xaxis_title='Median fit (s)', yaxis_title='MASE (lower is better)', xaxis_type='log')
+    plotly_chart(fig5, use_container_width=True)
+    if board['recommended'].any():
+        best = board.index[board['recommended']][0]
+        st.success(
+            f"✅ {best} is the fastest model within {ACCURACY_TOLERANCE:.0%} of the best MASE "
+            f"({board.loc[best, 'mase']:.3f}, {board.loc[best, 'fit_seconds']:.2f}s per fit)."
+        )
 
 st.subheader("🚨 Anomaly Detection")
 fig2 = go.Figure()
 fig2.add_trace(go.Scatter(x=data.index, y=data['consumption'], name='Consumption', line=dict(color='skyblue')))
 fig2.add_trace(go.Scatter(x=data[data['anomaly'] == 1].index, y=data[data['anomaly'] == 1]['consumption'], mode='markers', name='Anomalies', marker=dict(color='red', size=9, symbol='x')))
 fig2.update_layout(title="Detected Anomalies", xaxis_title="Date", yaxis_title="Consumption")
-st.plotly_chart(fig2, use_container_width=True)
+plotly_chart(fig2, use_container_width=True)
 
 st.subheader("📤 Export Anomalies")
 anomalies = data[data['anomaly'] == 1].copy()
@@ -93,13 +173,56 @@ csv = anomalies.to_csv(index=False).encode('utf-8')
 st.download_button(label="Download Anomalies CSV", data=csv, file_name="anomalies.csv", mime='text/csv')
 
 st.subheader("🧩 Trend & Seasonality Decomposition")
-decomp = seasonal_decompose(data['consumption'], model='additive', period=7)
-fig3 = go.Figure()
-fig3.add_trace(go.Scatter(x=decomp.trend.index, y=decomp.trend, name='Trend', line=dict(color='blue')))
-fig3.add_trace(go.Scatter(x=decomp.seasonal.index, y=decomp.seasonal, name='Seasonal', line=dict(color='orange')))
-fig3.add_trace(go.Scatter(x=decomp.resid.index, y=decomp.resid, name='Residuals', line=dict(color='gray')))
-fig3.update_layout(title='Time Series Decomposition', xaxis_title='Date', yaxis_title='Value')
-st.plotly_chart(fig3, use_container_width=True)
+col1, col2, col3 = st.columns(3)
+method = col1.selectbox("Method", METHODS)
+freq = col2.selectbox("Resolution", list(RESOLUTIONS), format_func=RESOLUTIONS.get)
+seasonalities = col3.multiselect("Seasonalities", list(SEASONALITIES[freq]), default=["weekly"])
+robust = method == "STL" and st.checkbox("Robust to outliers")
+if method == "Classical" and len(seasonalities) > 1:
+    st.caption(f"Classical decomposition takes a single period; using {seasonalities[0]}.")
+
+if not seasonalities:
+    st.info("Choose at least one seasonality.")
+else:
+    # Served from the shared decomposition cache: reruns that only change the
+    # forecast settings reuse it, and new readings refit the latest weeks only
+    # when that matches the cached fit.
+    start = time.perf_counter()
+    try:
+        decomp, how = dm.decompose("energy", freq, method, seasonalities, robust)
+    except ValueError as e:
+        decomp = None
+        st.warning(str(e))
+    if decomp is not None:
+        st.caption(f"{method} decomposition {how} in {(time.perf_counter() - start) * 1000:.0f} ms.")
+        left_out = [name for name in seasonalities[:1 if method == "Classical" else None] if f"seasonal_{name}" not in decomp]
+        if left_out:
+            st.caption(f"Left out {', '.join(left_out)}: the data does not span two full cycles.")
+        fig3 = go.Figure()
+        fig3.add_trace(go.Scatter(x=decomp.index, y=decomp['trend'], name='Trend', line=dict(color='blue')))
+        for column in decomp.columns[decomp.columns.str.startswith('seasonal_')]:
+            fig3.add_trace(go.Scatter(x=decomp.index, y=decomp[column], name=f"Seasonal ({column[len('seasonal_'):]})"))
+        fig3.add_trace(go.Scatter(x=decomp.index, y=decomp['resid'], name='Residuals', line=dict(color='gray')))
+        fig3.update_layout(title='Time Series Decomposition', xaxis_title='Date', yaxis_title='Value')
+        plotly_chart(fig3, use_container_width=True)
+
+    # Every building from the daily rollup, each cached on its own.
+    daily = [name for name in seasonalities if name in SEASONALITIES["D"]] or ["weekly"]
+    start = time.perf_counter()
+    decomps, served = dm.decompose_campuses("energy", "D", method, daily, robust)
+    if decomps:
+        strength = pd.DataFrame({campus_id: seasonal_strength(d) for campus_id, d in decomps.items()}).T
+        strength.columns = [f"{name} strength" for name in strength.columns]
+        strength['trend change %'] = pd.Series({
+            campus_id: (d['trend'].dropna().iloc[-1] / d['trend'].dropna().iloc[0] - 1) * 100
+            for campus_id, d in decomps.items()
+        })
+        st.markdown(f"**{' & '.join(daily).title()} Seasonality by Building**")
+        st.dataframe(strength.rename_axis('campus_id').round(3), use_container_width=True)
+        st.caption(
+            f"{len(decomps)} buildings in {(time.perf_counter() - start) * 1000:.0f} ms — "
+            + ", ".join(f"{n} {how}" for how, n in served.items()) + "."
+        )
 
 st.markdown("---")
 # st.markdown("<br><br><hr><p style='text-align:left;'>Developed by Ismail Sadouki ❤️</p>", unsafe_allow_html=True)
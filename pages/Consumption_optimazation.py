@@ -1,12 +1,11 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from sklearn.ensemble import IsolationForest
-from statsmodels.tsa.arima.model import ARIMA
 import warnings
-from scipy.optimize import linprog
-from utils import DataManager
+from forecasting import forecast_arima
+from scoring import FEATURES
+from tariffs import TARIFF
+from utils import DataManager, plotly_chart, render_in_background
 
 
 
@@ -17,42 +16,28 @@ st.title("🛢️ Gas Consumption Optimization")
 
 
 # Load Data
-dm = DataManager()
+dm = DataManager("Consumption_optimazation")
 data = dm.load_gas()
-@st.cache_data
-def detect_anomalies(df, contamination=0.05):
-    iso = IsolationForest(contamination=contamination, random_state=42)
-    df['anomaly'] = iso.fit_predict(df[['consumption']])
-    df['anomaly'] = df['anomaly'].apply(lambda x: 1 if x == -1 else 0)
-    return df
-
-def arima_forecasting(df, order=(5, 1, 0)):
-    model = ARIMA(df['consumption'], order=order)
-    model_fit = model.fit()
-    forecast = model_fit.forecast(steps=48)  # Forecast next 48 hours (or any suitable time period)
-    return forecast
-
-def optimize_consumption(df, peak_hours=[17, 18, 19, 20]):
-    consumption_peak = df[df['hour'].isin(peak_hours)]['consumption'].values
-    consumption_off_peak = df[~df['hour'].isin(peak_hours)]['consumption'].values
-    
-    c = np.ones(len(consumption_peak))  # Objective function: minimize total peak consumption
-    A = [np.ones(len(consumption_peak))]  # Constraint: peak consumption <= limit
-    b = [500]  # Max peak consumption (arbitrary value)
-    
-    result = linprog(c, A_ub=A, b_ub=b, method='highs')
-    optimized_peak_consumption = result.x  # Optimized consumption distribution during peak hours
-    return optimized_peak_consumption
+
+def plot_arima_forecast(forecast):
+    fig5 = go.Figure()
+    fig5.add_trace(go.Scatter(x=np.arange(len(forecast)), y=forecast, name='Forecasted Consumption', line=dict(color='blue')))
+    fig5.update_layout(title="Gas Consumption Forecast with ARIMA", xaxis_title="Time", yaxis_title="Gas Consumption (m³)")
+    plotly_chart(fig5, use_container_width=True)
 
 
 st.sidebar.header("🔧 Configuration")
 optimization_method = st.sidebar.selectbox("Select Optimization Method", ["Energy Savings", "Cost Reduction", "Peak Consumption", "Smart Optimization"])
 contamination = st.sidebar.slider("Anomaly Sensitivity (0 = strict)", 0.01, 0.15, 0.05, step=0.01)
+anomaly_features = st.sidebar.multiselect(
+    "Anomaly Features", list(FEATURES), default=["consumption"], format_func=FEATURES.get,
+) or ["consumption"]
 arima_order = st.sidebar.slider("ARIMA Model Order (p)", 1, 10, 5)
 arima_d = st.sidebar.slider("ARIMA Model Differencing (d)", 0, 3, 1)
 arima_q = st.sidebar.slider("ARIMA Model Order (q)", 0, 10, 0)
 
-data = detect_anomalies(data, contamination)
+# Fitted once per dataset version, sensitivity and feature set, then shared.
+data['anomaly'] = dm.outliers("gas", contamination, anomaly_features).astype(int)
 
 if optimization_method == "Energy Savings":
 
@@ -73,7 +58,7 @@ if optimization_method == "Energy Savings":
                               mode='markers', name='Anomalies', 
                               marker=dict(color='red', size=9, symbol='x')))
     fig1.update_layout(title="Gas Consumption with Detected Anomalies", xaxis_title="Timestamp", yaxis_title="Gas Consumption (m³)")
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 
 elif optimization_method == "Cost Reduction":
     st.subheader("💰 Estimated Cost Reduction")
@@ -93,7 +78,7 @@ elif optimization_method == "Cost Reduction":
                          y=[total_cost, anomaly_cost, cost_savings], 
                          marker_color=['blue', 'red', 'green']))
     fig2.update_layout(title="Cost Reduction Breakdown", xaxis_title="Category", yaxis_title="Cost ($)")
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, use_container_width=True)
 
 elif optimization_method == "Peak Consumption":
     st.subheader("⏰ Peak Consumption Analysis")
@@ -108,31 +93,44 @@ elif optimization_method == "Peak Consumption":
     fig3.add_trace(go.Bar(x=peak_consumption.index, y=peak_consumption.values, 
                          marker=dict(color='orange')))
     fig3.update_layout(title="Peak Hour Gas Consumption", xaxis_title="Hour", yaxis_title="Average Consumption (m³)")
-    st.plotly_chart(fig3, use_container_width=True)
+    plotly_chart(fig3, use_container_width=True)
 
 elif optimization_method == "Smart Optimization":
-    st.subheader("🔧 Smart Optimization (Peak Consumption Minimization)")
-    optimized_peak_consumption = optimize_consumption(data)
-    st.write("Optimized Peak Consumption Distribution:")
-    st.write(optimized_peak_consumption)
-
-    st.write(f"By distributing consumption more evenly across non-peak hours, peak consumption can be reduced by **{np.sum(optimized_peak_consumption):.2f} m³**. This approach minimizes energy costs while still meeting needs.")
-    
-    st.subheader("📊 Optimized Peak Consumption Visualization")
+    st.subheader("🔧 Smart Optimization (Peak Load Shifting)")
+    flexible = st.sidebar.slider("Flexible Demand Share", 0.0, 0.5, 0.2, step=0.05)
+    headroom = st.sidebar.slider("Building Headroom (× its highest hour)", 1.0, 2.0, 1.0, step=0.1)
+    capacity = st.sidebar.slider("Site Capacity (× highest hour)", 0.8, 1.5, 1.0, step=0.05)
+    # Solved once per dataset version and settings, then shared.
+    profile, stats = dm.load_shift("gas", flexible, headroom, capacity)
+    shifted_peak = stats["peak_before"] - stats["peak_after"]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("⏰ Peak Consumption Shifted", f"{shifted_peak:,.2f} m³")
+    col2.metric(f"💰 Cost at the {TARIFF.name} tariff", f"${stats['cost_after']:,.2f}",
+                f"{stats['cost_after'] - stats['cost_before']:,.2f}", delta_color="inverse")
+    col3.metric("🧮 Solver Time", f"{stats['solve_seconds']:.2f} s")
+    st.caption(
+        f"{stats['variables']:,} variables, {stats['constraints']:,} constraints and {stats['nonzeros']:,} non-zeros "
+        f"in {stats['solves']} sparse LPs, covering {stats['days']} days of {stats['campuses']} buildings."
+    )
+    if stats["failed_days"]:
+        st.warning(f"No feasible plan for {stats['failed_days']} days at this site capacity; they are left unchanged.")
+
+    st.write(f"Moving up to {flexible:.0%} of each hour's demand to cheaper hours of the same day, within each building's headroom and the site capacity, takes **{shifted_peak:,.2f} m³** out of peak hours. Daily consumption is unchanged.")
+
+    st.subheader("📊 Optimized Daily Load Profile")
     fig4 = go.Figure()
-    fig4.add_trace(go.Scatter(x=data[data['hour'].isin([17, 18, 19, 20])]['timestamp'], 
-                             y=optimized_peak_consumption, 
-                             mode='lines', name='Optimized Consumption', 
-                             line=dict(color='green')))
-    fig4.update_layout(title="Optimized Gas Consumption During Peak Hours", xaxis_title="Timestamp", yaxis_title="Gas Consumption (m³)")
-    st.plotly_chart(fig4, use_container_width=True)
+    fig4.add_trace(go.Scatter(x=profile.index, y=profile['baseline'], mode='lines', name='Current Consumption', line=dict(color='skyblue')))
+    fig4.add_trace(go.Scatter(x=profile.index, y=profile['optimized'], mode='lines', name='Optimized Consumption', line=dict(color='green')))
+    fig4.update_layout(title="Average Hourly Gas Consumption Before and After Load Shifting", xaxis_title="Hour", yaxis_title="Gas Consumption (m³)")
+    plotly_chart(fig4, use_container_width=True)
 
 st.subheader("📊 Forecasted Gas Consumption with ARIMA")
-forecast = arima_forecasting(data, order=(arima_order, arima_d, arima_q))
-fig5 = go.Figure()
-fig5.add_trace(go.Scatter(x=np.arange(len(forecast)), y=forecast, name='Forecasted Consumption', line=dict(color='blue')))
-fig5.update_layout(title="Gas Consumption Forecast with ARIMA", xaxis_title="Time", yaxis_title="Gas Consumption (m³)")
-st.plotly_chart(fig5, use_container_width=True)
+order = (arima_order, arima_d, arima_q)
+render_in_background(
+    f"arima-{dm.version('gas')}-{order}", "The ARIMA forecast", plot_arima_forecast,
+    forecast_arima, data['consumption'], 48, order=order,  # Forecast next 48 hours
+)
 
 # Footer Section
 
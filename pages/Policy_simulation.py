@@ -3,83 +3,86 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import DataManager
+from analytics import DEFAULT_REDUCTIONS, POLICIES, campus_totals
+from scenarios import ScenarioEngine, policy_combinations, scenario_label
+from utils import DataManager, plotly_chart
 
 st.set_page_config(page_title="🔄 Smart Resource Allocation & Policy Simulation", layout="wide")
 st.title("💡 Smart Resource Allocation & Policy Impact Simulation")
 
 
 # Load data
-dm = DataManager()
-building = dm.load_energy()
-gas = dm.load_gas()
-water = dm.load_water()
+dm = DataManager("Policy_simulation")
 
 st.sidebar.title("⚙️ Configuration")
-campus = st.sidebar.selectbox("Select Campus", sorted(building['campus_id'].unique()))
-policy = st.sidebar.multiselect("Apply Policies", 
-    ["Reduce Heating by 10%", "Efficient Water Fixtures", "Solar Panels Installed", "Shorten Building Hours"])
+campus = st.sidebar.selectbox("Select Campus", dm.campuses("energy"))
+policy = st.sidebar.multiselect("Apply Policies", POLICIES)
 
-bld_c = building[building["campus_id"] == campus]
-gas_c = gas[gas["campus_id"] == campus]
-water_c = water[water["campus_id"] == campus]
+# Totals per utility for every campus, straight from the rollups; every policy
+# combination is then evaluated for all campuses at once.
+engine = ScenarioEngine(campus_totals(dm.store))
+combinations = policy_combinations(DEFAULT_REDUCTIONS)
+results = engine.evaluate(combinations)
+applied = combinations > 0
+selected = applied.index[(applied == [p in policy for p in POLICIES]).all(axis=1)][0]
 
 st.subheader("💸 Resource Allocation and Optimization Simulation")
 
-def simulate_allocation_reduction(df, policy):
-    impact_factors = {
-        "Reduce Heating by 10%": 0.1,
-        "Efficient Water Fixtures": 0.15,
-        "Solar Panels Installed": 0.2,
-        "Shorten Building Hours": 0.1
-    }
-    
-    total_impact = 0
-    if "Reduce Heating by 10%" in policy:
-        total_impact += impact_factors["Reduce Heating by 10%"] * df["consumption"].sum()
-    if "Efficient Water Fixtures" in policy:
-        total_impact += impact_factors["Efficient Water Fixtures"] * water_c["consumption"].sum()
-    if "Solar Panels Installed" in policy:
-        total_impact += impact_factors["Solar Panels Installed"] * bld_c["consumption"].sum()
-    if "Shorten Building Hours" in policy:
-        total_impact += impact_factors["Shorten Building Hours"] * bld_c["consumption"].sum()
-
-    return total_impact
-
-impact = simulate_allocation_reduction(bld_c, policy)
+impact = results["resource_savings"].loc[selected, campus]
 
 st.metric("Estimated Resource Savings After Policies (kWh)", f"{impact:,.2f}")
 
 fig = go.Figure()
 fig.add_trace(go.Bar(x=["Energy", "Water", "Gas"], y=[impact * 0.5, impact * 0.2, impact * 0.3], name="Savings"))
 fig.update_layout(title="Estimated Resource Savings by Category", xaxis_title="Resource Type", yaxis_title="Savings (kWh)")
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
 
 st.subheader("💵 Cost Savings Simulation")
 
-cost_factors = {"electricity": 0.12, "gas": 0.08, "water": 0.005}  # cost per kWh/unit in USD
+st.metric("Estimated Cost Savings (USD)", f"${results['cost_savings'].loc[selected, campus]:,.2f}")
 
-def simulate_cost_savings(df, impact):
-    energy_cost_savings = impact * cost_factors["electricity"]
-    gas_cost_savings = impact * cost_factors["gas"]
-    water_cost_savings = impact * cost_factors["water"]
+st.subheader("🧾 Metered Cost at the Tariff")
 
-    total_cost_savings = energy_cost_savings + gas_cost_savings + water_cost_savings
-    return total_cost_savings
-
-cost_savings = simulate_cost_savings(bld_c, impact)
-
-st.metric("Estimated Cost Savings (USD)", f"${cost_savings:,.2f}")
+# Cost, peak share and meter coverage of every campus, computed once per data
+# version from the aligned utility table.
+kpis = dm.utility_kpis()
+col1, col2, col3 = st.columns(3)
+col1.metric("Metered Cost (USD)", f"${kpis.loc[campus, 'cost']:,.2f}")
+col2.metric("Peak Share of Cost", f"{kpis.loc[campus, 'peak_cost_share']:.1%}")
+col3.metric("Meter Coverage", f"{kpis.loc[campus, 'coverage']:.1%}")
+st.dataframe(kpis.sort_values('cost', ascending=False), use_container_width=True)
 
 st.subheader("📊 Policy Comparison")
 
-policy_effects = {policy: simulate_allocation_reduction(bld_c, [policy]) for policy in ["Reduce Heating by 10%", "Efficient Water Fixtures", "Solar Panels Installed", "Shorten Building Hours"]}
+singles = applied.sum(axis=1) == 1
+policy_effects = pd.Series(
+    results["resource_savings"].loc[singles, campus].to_numpy(), index=applied[singles].idxmax(axis=1),
+).reindex(POLICIES)
 
 fig = go.Figure()
 for policy, savings in policy_effects.items():
     fig.add_trace(go.Bar(x=[policy], y=[savings], name=policy))
 
 fig.update_layout(title="Policy Impact Comparison", xaxis_title="Policy", yaxis_title="Savings (kWh)")
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
+
+st.subheader("🏆 Policy Combination Ranking")
+
+ranking = pd.DataFrame({
+    "Policies": [scenario_label(row) for _, row in combinations.iterrows()],
+    "Resource Savings (kWh)": results["resource_savings"][campus],
+    "Cost Savings (USD)": results["cost_savings"][campus],
+}).sort_values("Resource Savings (kWh)", ascending=False, ignore_index=True)
+st.dataframe(ranking, use_container_width=True)
+
+st.subheader("🏫 Campus Ranking for the Selected Policies")
+
+by_campus = results["resource_savings"].loc[selected].sort_values(ascending=False)
+fig = px.bar(
+    x=by_campus.index.astype(str), y=by_campus.values,
+    color=np.where(by_campus.index == campus, "Selected Campus", "Other Campuses"),
+    labels={"x": "Campus", "y": "Savings (kWh)", "color": ""}, title="Resource Savings by Campus",
+)
+plotly_chart(fig, use_container_width=True)
 
 
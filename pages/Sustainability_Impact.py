@@ -3,12 +3,11 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
-from statsmodels.tsa.arima.model import ARIMA
 import warnings
-from sklearn.metrics import silhouette_score
-from utils import DataManager
+from simulation import UTILITIES, run_monte_carlo
+from analytics import POLICIES, campus_totals, co2_emissions, efficiency_scores, monte_carlo_reductions
+from scenarios import ScenarioEngine, frontier, scenario_grid
+from utils import DataManager, plotly_chart
 
 warnings.filterwarnings("ignore")
 
@@ -17,13 +16,10 @@ st.title("🌱 Smart Sustainability Optimization")
 
 
 # Load data
-dm = DataManager()
-building = dm.load_energy()
-gas = dm.load_gas()
-water = dm.load_water()
+dm = DataManager("Sustainability_Impact")
 
 st.sidebar.title("⚙️ Configuration")
-campus = st.sidebar.selectbox("Select Campus", sorted(building['campus_id'].unique()))
+campus = st.sidebar.selectbox("Select Campus", dm.campuses("energy"))
 
 st.sidebar.subheader("Customize Policy Impact")
 heating_reduction = st.sidebar.slider("Heating Reduction (%)", 0, 20, 10, 1) / 100
@@ -45,53 +41,37 @@ electricity_co2_factor = st.sidebar.number_input("Electricity CO₂ Factor (kg/k
 gas_co2_factor = st.sidebar.number_input("Gas CO₂ Factor (kg/m³)", value=2.204)
 water_co2_factor = st.sidebar.number_input("Water CO₂ Factor (kg/L)", value=0.0015)
 
-policy = st.sidebar.multiselect("Apply Policies", 
-    ["Reduce Heating by 10%", "Efficient Water Fixtures", "Solar Panels Installed", "Shorten Building Hours"])
+policy = st.sidebar.multiselect("Apply Policies", POLICIES)
 
-bld_c = building[building["campus_id"] == campus]
-gas_c = gas[gas["campus_id"] == campus]
-water_c = water[water["campus_id"] == campus]
+reductions = {
+    "Reduce Heating by 10%": heating_reduction,
+    "Efficient Water Fixtures": water_efficiency,
+    "Solar Panels Installed": solar_efficiency,
+    "Shorten Building Hours": hours_reduction,
+}
+co2_factors = {"electricity": electricity_co2_factor, "gas": gas_co2_factor, "water": water_co2_factor}
 
-st.subheader("📊 Building Consumption Benchmarking")
-grouped = building.groupby("campus_id")["consumption"].mean()
-best = grouped.nsmallest(1).values[0]
-campus_avg = grouped[campus]
+# Totals per utility for every campus and the campus's averages, straight from
+# the rollups. CO₂ for any set of policies and reductions is then evaluated
+# for all campuses at once.
+engine = ScenarioEngine(campus_totals(dm.store), co2_factors)
+means = campus_totals(dm.store, [campus], agg="mean").loc[campus]
+scenario = pd.DataFrame([{p: reductions[p] if p in policy else 0.0 for p in POLICIES}])
 
-efficiency_ratio = best / campus_avg
+st.subheader("📊 Building Consumption Benchmarking")
+grouped = dm.rollup("energy", "campus_id", agg="mean")
+efficiency_ratio = efficiency_scores(dm.store)[campus]
 st.metric("Efficiency Score (1=Best)", f"{efficiency_ratio:.2f}")
 
 fig = px.bar(grouped, title="Average Electricity Consumption by Campus")
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
 
 st.subheader("🌍 CO₂ Emissions Estimation")
-total_co2 = (
-    bld_c["consumption"].sum() * electricity_co2_factor
-    + gas_c["consumption"].sum() * gas_co2_factor
-    + water_c["consumption"].sum() * water_co2_factor
-)
-
-policy_impact = 0
-impact_details = {}
-
-if "Reduce Heating by 10%" in policy:
-    heating_impact = heating_reduction * gas_c["consumption"].sum() * gas_co2_factor
-    policy_impact += heating_impact
-    impact_details["Heating Reduction"] = heating_impact
-
-if "Efficient Water Fixtures" in policy:
-    water_impact = water_efficiency * water_c["consumption"].sum() * water_co2_factor
-    policy_impact += water_impact
-    impact_details["Water Efficiency"] = water_impact
-
-if "Solar Panels Installed" in policy:
-    solar_impact = solar_efficiency * bld_c["consumption"].sum() * electricity_co2_factor
-    policy_impact += solar_impact
-    impact_details["Solar Panel Efficiency"] = solar_impact
+total_co2 = engine.co2_total[campus]
 
-if "Shorten Building Hours" in policy:
-    hours_impact = hours_reduction * bld_c["consumption"].sum() * electricity_co2_factor
-    policy_impact += hours_impact
-    impact_details["Building Hours Reduction"] = hours_impact
+# One scenario per policy, to split the savings by policy.
+impact_details = engine.evaluate(pd.DataFrame(np.diag(scenario.iloc[0]), index=POLICIES, columns=POLICIES))["co2_saved"][campus]
+policy_impact = impact_details.sum()
 
 reduction = total_co2 - policy_impact
 st.metric("Estimated CO₂ After Policies (kg)", f"{reduction:,.2f}")
@@ -108,66 +88,80 @@ st.write(pd.DataFrame([real_data]))
 
 st.subheader("📊 Policy Impact Visualization")
 
-policy_names = list(impact_details.keys())
-impact_values = list(impact_details.values())
+policy_names = list(impact_details.index)
+impact_values = list(impact_details.values)
 
 impact_df = pd.DataFrame({"Policy": policy_names, "Impact (kg CO2)": impact_values})
 impact_df = impact_df[impact_df["Impact (kg CO2)"] > 0]  # Filter out non-applied policies
 
 fig = px.bar(impact_df, x="Policy", y="Impact (kg CO2)", title="Impact of Policies on CO₂ Emissions", color="Policy")
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
+
+st.subheader("🧭 Policy Frontier")
+
+# Every combination of policy reductions in the slider ranges.
+grid = scenario_grid()
+effort = grid.sum(axis=1) * 100
+saved = engine.evaluate(grid)["co2_saved"][campus]
+best = frontier(effort, saved)
+
+fig = px.scatter(
+    grid.assign(**{"Total Reduction (% points)": effort, "CO₂ Saved (kg)": saved}),
+    x="Total Reduction (% points)", y="CO₂ Saved (kg)", hover_data=POLICIES, opacity=0.35,
+    title="CO₂ Saved by Every Policy Combination",
+)
+fig.add_trace(go.Scatter(x=effort[best], y=saved[best], mode="lines+markers", name="Frontier"))
+fig.add_trace(go.Scatter(
+    x=[scenario.iloc[0].sum() * 100], y=[policy_impact], mode="markers", name="Current Settings",
+    marker=dict(size=14, symbol="star"),
+))
+plotly_chart(fig, use_container_width=True)
+
+st.subheader("🏫 Campus Ranking")
+
+current = engine.evaluate(scenario)
+ranking = pd.DataFrame({
+    "CO₂ Emissions (kg)": engine.co2_total,
+    "CO₂ Saved by Policies (kg)": current["co2_saved"].iloc[0],
+    "CO₂ After Policies (kg)": current["co2_after"].iloc[0],
+}).sort_values("CO₂ Saved by Policies (kg)", ascending=False)
+st.dataframe(ranking, use_container_width=True)
+
+st.subheader("🔗 Daily CO₂ by Utility")
+
+# Every utility of the campus on one time grid, so the day's emissions of all
+# three come from a single frame.
+profile = dm.utility_table([campus])
+daily = profile.groupby(profile['timestamp'].dt.normalize())[UTILITIES].sum()
+daily_co2 = co2_emissions(daily, co2_factors).drop(columns='total')
+fig = px.area(
+    daily_co2, title=f"Daily CO₂ Emissions of Campus {campus} by Utility",
+    labels={"timestamp": "Date", "value": "CO₂ (kg)", "variable": "Utility"},
+)
+plotly_chart(fig, use_container_width=True)
 
 st.subheader("💡 Policy Simulation (Monte Carlo)")
 
-base_consumption = {
-    "electricity": bld_c["consumption"].mean(),
-    "gas": gas_c["consumption"].mean(),
-    "water": water_c["consumption"].mean()
-}
+base_consumption = means.to_dict()
+utility_reductions = monte_carlo_reductions(policy, reductions)
 
-def run_simulation(base_consumption, policy_impact, years=10, simulations=1000):
-    np.random.seed(42)
-    simulated_results = []
-    
-    for _ in range(simulations):
-        yearly_changes = []
-        
-        for year in range(years):
-            electricity_change = np.random.normal(0, electricity_variability)  # Variability in electricity consumption
-            gas_change = np.random.normal(0, gas_variability)  # Variability in gas consumption
-            water_change = np.random.normal(0, water_variability)  # Variability in water consumption
-            
-            simulated_electricity = base_consumption["electricity"] * (1 + electricity_change)
-            simulated_gas = base_consumption["gas"] * (1 + gas_change)
-            simulated_water = base_consumption["water"] * (1 + water_change)
-            
-            if "Reduce Heating by 10%" in policy:
-                simulated_gas *= (1 - heating_reduction)  # Apply custom heating reduction
-            if "Efficient Water Fixtures" in policy:
-                simulated_water *= (1 - water_efficiency)  # Apply custom water efficiency
-            if "Solar Panels Installed" in policy:
-                simulated_electricity *= (1 - solar_efficiency)  # Apply custom solar efficiency
-            if "Shorten Building Hours" in policy:
-                simulated_electricity *= (1 - hours_reduction)  # Apply custom building hours reduction
-            
-            simulated_co2 = (
-                simulated_electricity * electricity_co2_factor +
-                simulated_gas * gas_co2_factor +
-                simulated_water * water_co2_factor
-            )
-            yearly_changes.append(simulated_co2)
-        
-        simulated_results.append(np.sum(yearly_changes))
-    
-    return simulated_results
-
-simulation_results = run_simulation(base_consumption, policy_impact, years, simulations)
+simulation_results, simulation_summary = run_monte_carlo(
+    base_consumption,
+    variability={"electricity": electricity_variability, "gas": gas_variability, "water": water_variability},
+    co2_factors=co2_factors,
+    reductions=utility_reductions,
+    years=years,
+    simulations=simulations,
+)
 
 st.write(f"Simulated Total CO₂ Emissions Over {years} Years ({simulations} Simulations)")
 
 fig = px.histogram(simulation_results, nbins=30, title="Simulated CO₂ Emissions Over 10 Years")
-st.plotly_chart(fig, use_container_width=True)
+plotly_chart(fig, use_container_width=True)
 
-avg_emissions = np.mean(simulation_results)
+avg_emissions = simulation_summary["mean"]
 st.metric("Average Total CO₂ Emissions (kg)", f"{avg_emissions:,.2f}")
+col1, col2 = st.columns(2)
+col1.metric("5th Percentile (kg)", f"{simulation_summary['p5']:,.2f}")
+col2.metric("95th Percentile (kg)", f"{simulation_summary['p95']:,.2f}")
 
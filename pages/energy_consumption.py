@@ -1,11 +1,10 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.express as px
-from utils import DataManager
+from forecasting import forecast_prophet
+from model_cache import data_fingerprint
+from utils import DataManager, plotly_chart, render_in_background
 
-from prophet import Prophet
 import plotly.graph_objects as go
 
 st.set_page_config(page_title="Utility Consumption", layout="wide")
@@ -13,44 +12,33 @@ st.title("📊 Utility Consumption Dashboard")
 
 
 # Load data
-dm = DataManager()
-df = dm.load_energy()
+dm = DataManager("energy_consumption")
+all_campuses = dm.campuses("energy")
 
 
 
 st.sidebar.header("Filters")
 campuses = st.sidebar.multiselect(
     "Select Building ID(s)",
-    df['campus_id'].unique(),
-    default=df['campus_id'].unique()
+    all_campuses,
+    default=all_campuses
 )
-df = df[df['campus_id'].isin(campuses)]
-
-# Cache the model training process
-@st.cache_resource
-def fit_prophet_model(df):
-    df_daily = df.groupby('day')['consumption'].sum().reset_index()
-    df_daily.columns = ['ds', 'y']  # Prophet expects 'ds' and 'y' column names
-    
-    model = Prophet()
-    model.fit(df_daily)  # Fit the model once, reuse it on subsequent runs
-    
-    return model, df_daily
 
 # Forecasting function
-def forecast_utility(df):
+def forecast_utility(daily_total):
     st.subheader("🔮 Utility Consumption Forecast (Next 30 Days)")
 
-    # Fit model and get daily data
-    model, df_daily = fit_prophet_model(df)
-    
-    last_date = df_daily['ds'].max()
-    future_dates = pd.date_range(last_date, periods=31, freq='D')[1:]  # Exclude the last date (already present)
-
-    future_df = pd.DataFrame({'ds': future_dates})
+    df_daily = daily_total.copy()
+    df_daily.columns = ['ds', 'y']  # Prophet expects 'ds' and 'y' column names
 
-    forecast = model.predict(future_df)
+    # Prophet trains in the background pool; the charts below render meanwhile.
+    render_in_background(
+        f"prophet-{data_fingerprint(df_daily)}", "The Prophet forecast",
+        lambda forecast: plot_forecast(df_daily, forecast),
+        forecast_prophet, df_daily, 30,
+    )
 
+def plot_forecast(df_daily, forecast):
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(x=df_daily['ds'], y=df_daily['y'], mode='lines', name='Historical Consumption', line=dict(color='blue', width=2)))
@@ -80,15 +68,16 @@ def forecast_utility(df):
         yaxis=dict(range=[df_daily['y'].min() * 0.9, forecast['yhat_upper'].max() * 1.1]),  # Adjust y-axis range to include forecast confidence
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
+
+daily_total = dm.rollup("energy", 'day', campuses).reset_index()
 
-forecast_utility(df)
+forecast_utility(daily_total)
 
-daily_total = df.groupby('day')['consumption'].sum().reset_index()
 fig1 = px.line(daily_total, x='day', y='consumption', title="📈 Daily Total Consumption")
 fig1.update_layout(xaxis_title="Date", yaxis_title="Consumption")
 
-campus_totals = df.groupby('campus_id')['consumption'].sum().reset_index()
+campus_totals = dm.rollup("energy", 'campus_id', campuses).reset_index()
 fig2 = px.bar(
     campus_totals,
     x='campus_id',
@@ -99,11 +88,10 @@ fig2 = px.bar(
 
 st.markdown("### 🔎 Breakdown per Building")
 selected = st.selectbox("Choose a building:", campus_totals['campus_id'])
-df_subset = df.tail(1000)
-campus_data = df_subset[df_subset['campus_id'] == selected]
+campus_data = dm.load_energy([selected]).tail(1000)
 fig3 = px.line(campus_data, x='timestamp', y='consumption', title=f"📍 {selected} Consumption Over Time")
 
-monthly = df.groupby(['month', 'campus_id'])['consumption'].sum().reset_index()
+monthly = dm.rollup("energy", ['month', 'campus_id'], campuses).reset_index()
 fig4 = px.line(
     monthly,
     x='month',
@@ -114,7 +102,7 @@ fig4 = px.line(
 )
 fig4.update_layout(xaxis_title="Month", yaxis_title="Consumption")
 
-heatmap_data = df.groupby(['weekday', 'hour'])['consumption'].mean().unstack().reindex(
+heatmap_data = dm.rollup("energy", ['weekday', 'hour'], campuses, agg="mean").unstack().reindex(
     ['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday']
 )
 fig5 = px.imshow(
@@ -124,27 +112,28 @@ fig5 = px.imshow(
     color_continuous_scale='Viridis'
 )
 
-recent = df[df['timestamp'] >= df['timestamp'].max() - pd.Timedelta(days=7)]
+latest = dm.time_bounds("energy", campuses)[1]
+recent = dm.load_energy(campuses, start=latest - pd.Timedelta(days=7)) if latest is not None else dm.load_energy([])
 daily_recent = recent.groupby(recent['timestamp'].dt.date)['consumption'].sum().reset_index()
 fig6 = px.bar(daily_recent, x='timestamp', y='consumption', title="📊 Last 7 Days Consumption")
 fig6.update_layout(xaxis_title="Date", yaxis_title="Consumption")
 
 col1, col2 = st.columns(2)
 with col1:
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 with col2:
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, use_container_width=True)
 
 col3, col4 = st.columns(2)
 with col3:
-    st.plotly_chart(fig3, use_container_width=True)
+    plotly_chart(fig3, use_container_width=True)
 with col4:
-    st.plotly_chart(fig4, use_container_width=True)
+    plotly_chart(fig4, use_container_width=True)
 
 col5, col6 = st.columns(2)
 with col5:
-    st.plotly_chart(fig5, use_container_width=True)
+    plotly_chart(fig5, use_container_width=True)
 with col6:
-    st.plotly_chart(fig6, use_container_width=True)
+    plotly_chart(fig6, use_container_width=True)
 
 #st.markdown("<br><br><hr><p style='text-align:left;'>Developed by Ismail Sadouki ❤️</p>", unsafe_allow_html=True)
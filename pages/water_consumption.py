@@ -1,38 +1,39 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from utils import DataManager
+from analytics import night_usage_alerts, peak_ratio, time_of_use
+from tariffs import BAND_LABELS, TARIFF
+from utils import DataManager, plotly_chart
 
 
 # Load Data
-dm = DataManager()
-df_water = dm.load_water()
+dm = DataManager("water_consumption")
+all_campuses = dm.campuses("water")
 
 st.sidebar.header("💧 Water Filters")
-campuses = st.sidebar.multiselect("Choose Campus ID(s):", df_water["campus_id"].unique(), default=df_water["campus_id"].unique())
-df_water = df_water[df_water["campus_id"].isin(campuses)]
+campuses = st.sidebar.multiselect("Choose Campus ID(s):", all_campuses, default=all_campuses)
 
 st.title("💧 Water Consumption Dashboard")
 
 st.subheader("📈 Daily Water Consumption")
-daily = df_water.groupby("day")["consumption"].sum().reset_index()
+daily = dm.rollup("water", "day", campuses).reset_index()
 fig_daily = px.line(daily, x="day", y="consumption", title="Daily Water Consumption", labels={"day": "Date", "consumption": "Units"})
-st.plotly_chart(fig_daily, use_container_width=True)
+plotly_chart(fig_daily, use_container_width=True)
 
 st.subheader("⏰ Peak vs Off-Peak Water Comparison")
-peak_hours = list(range(6, 10)) + list(range(17, 22))
-df_water["time_type"] = df_water["hour"].apply(lambda h: "Peak" if h in peak_hours else "Off-Peak")
-time_compare = df_water.groupby(["day", "time_type"])["consumption"].sum().reset_index()
+bands = TARIFF.bands()
+tou = time_of_use(dm.store, "water", campuses)
+time_compare = tou[bands].groupby(level="day").sum().rename(columns=BAND_LABELS).rename_axis(columns="time_type")
+time_compare = time_compare.stack().rename("consumption").reset_index().sort_values(["day", "time_type"], ignore_index=True)
 fig_compare = px.line(time_compare, x="day", y="consumption", color="time_type", title="Peak vs Off-Peak Water Consumption", labels={"day": "Date", "consumption": "Units", "time_type": "Time Type"})
-st.plotly_chart(fig_compare, use_container_width=True)
+plotly_chart(fig_compare, use_container_width=True)
 
 st.subheader("📊 Summary: Peak vs Off-Peak Water")
-total_peak = time_compare[time_compare["time_type"] == "Peak"]["consumption"].sum()
-total_offpeak = time_compare[time_compare["time_type"] == "Off-Peak"]["consumption"].sum()
-ratio = total_peak / total_offpeak if total_offpeak else float("inf")
-st.markdown(f"**Total Peak Water Consumption:** {total_peak:.2f} units")
-st.markdown(f"**Total Off-Peak Water Consumption:** {total_offpeak:.2f} units")
+totals = tou.sum()
+ratio = peak_ratio(totals.get('peak', 0.0), totals.get('off_peak', 0.0))
+for band in bands:
+    st.markdown(f"**Total {BAND_LABELS[band]} Water Consumption:** {totals[band]:.2f} units")
 st.markdown(f"**Peak to Off-Peak Ratio:** {ratio:.2f}")
+st.markdown(f"**Cost at the {TARIFF.name} tariff:** ${totals['cost']:,.2f}")
 
 
 
@@ -55,22 +56,18 @@ st.markdown(f"**Peak to Off-Peak Ratio:** {ratio:.2f}")
 
 
 
-df = df_water
+df = dm.load_water(campuses, columns=["consumption"])
 
 
 
 st.markdown("## 💧 Water Savings Opportunities")
 st.markdown("---")
 
-df["timestamp"] = pd.to_datetime(df["timestamp"])
-df["hour"] = df["timestamp"].dt.hour
-df["weekday"] = df["timestamp"].dt.day_name()
-
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("#### ⏱️ Hourly Water Usage Trend")
-    hourly_avg = df.groupby("hour")["consumption"].mean().reset_index()
+    hourly_avg = dm.rollup("water", "hour", campuses, agg="mean").reset_index()
     fig_hourly = px.line(
         hourly_avg,
         x="hour",
@@ -80,11 +77,11 @@ with col1:
         markers=True,
         line_shape="spline"
     )
-    st.plotly_chart(fig_hourly, use_container_width=True)
+    plotly_chart(fig_hourly, use_container_width=True)
 
 with col2:
     st.markdown("### 📆 Weekly Pattern")
-    weekday_avg = df.groupby("weekday")["consumption"].mean().reindex([
+    weekday_avg = dm.rollup("water", "weekday", campuses, agg="mean").reindex([
         "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"
     ]).reset_index()
     fig_week = px.bar(
@@ -94,16 +91,13 @@ with col2:
         title="Avg Consumption per Day of Week",
         labels={"consumption": "Avg Consumption", "weekday": "Day"}
     )
-    st.plotly_chart(fig_week, use_container_width=True)
+    plotly_chart(fig_week, use_container_width=True)
 
 st.markdown("---")
 
 st.subheader("🚨 High Off-Peak Usage Alerts")
 
-off_peak_hours = list(range(0, 7))  # Midnight to 6 AM
-off_peak_data = df[df["hour"].isin(off_peak_hours)]
-threshold = df["consumption"].quantile(0.75)
-high_off_peak = off_peak_data[off_peak_data["consumption"] > threshold]
+high_off_peak = night_usage_alerts(df)
 
 if not high_off_peak.empty:
     st.warning(f"🚱 **{len(high_off_peak)} instances** of high usage during off-peak hours.")
@@ -126,7 +120,7 @@ if not high_off_peak.empty:
             title="High Usage During Off-Peak",
             labels={"hour": "Hour", "consumption": "Avg Usage"},
         )
-        st.plotly_chart(fig_alert, use_container_width=True)
+        plotly_chart(fig_alert, use_container_width=True)
 
     st.markdown("### ✅ Recommendations")
     for _, row in alert_summary.iterrows():
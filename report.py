@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from analytics import POLICIES, build_report, daily_series
+from batch_forecast import BATCH_WORKERS, BatchForecast, batch_pool
+from forecasting import MODELS
+from utils import DatasetStore
+
+
+# Computes every dashboard KPI for all buildings in one run, without a
+# Streamlit session, and writes kpis / anomalies / forecasts tables plus a
+# summary.json to the output directory.
+#
+#   python report.py reports/nightly --format parquet --forecast-model Holt-Winters
+
+
+def write_table(df, path, fmt):
+    if fmt == "parquet":
+        df.to_parquet(f"{path}.parquet", index=False)
+    else:
+        df.to_json(f"{path}.json", orient="records", date_format="iso", indent=1)
+
+
+def run_forecasts(store, campus_ids, model, horizon, workers):
+    run = BatchForecast(batch_pool(workers), model, horizon, daily_series(store, campus_ids))
+    while not run.complete:
+        progress = run.progress()
+        print(f"\rforecasts: {progress['finished']}/{progress['total']} series", end="", file=sys.stderr)
+        time.sleep(1)
+    progress = run.progress()
+    print(
+        f"\rforecasts: {progress['total']} series in {progress['elapsed']:.1f}s "
+        f"({progress['series_per_second']:.2f} series/s) {progress['states']}",
+        file=sys.stderr,
+    )
+    return run.table(), progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute every dashboard KPI for all buildings.")
+    parser.add_argument("out", help="output directory")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    parser.add_argument("--campuses", nargs="+", help="only these campus ids (default: all)")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=POLICIES)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--simulations", type=int, default=1000)
+    parser.add_argument("--contamination", type=float, default=0.05)
+    parser.add_argument("--forecast-model", choices=sorted(MODELS) + ["none"], default="Holt-Winters")
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = DatasetStore()
+    campus_ids = args.campuses
+    if campus_ids is not None:
+        known = {str(c): c for c in store.campuses("energy")}
+        campus_ids = [known.get(c, c) for c in campus_ids]
+
+    report = build_report(
+        store, campus_ids, policies=args.policies, years=args.years,
+        simulations=args.simulations, contamination=args.contamination,
+    )
+    tables = {"kpis": report["kpis"], "anomalies": report["anomalies"]}
+    summary = report["summary"]
+    if args.forecast_model != "none":
+        forecasts, progress = run_forecasts(store, campus_ids, args.forecast_model, args.horizon, args.workers)
+        if forecasts is not None:
+            tables["forecasts"] = forecasts
+        summary["forecasts"] = {
+            "model": args.forecast_model, "horizon": args.horizon,
+            "states": progress["states"], "series_per_second": progress["series_per_second"],
+        }
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, df in tables.items():
+        write_table(df, os.path.join(args.out, name), args.format)
+    summary["generated_at"] = datetime.now(timezone.utc).isoformat()
+    summary["seconds"] = time.perf_counter() - start
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=1, default=str)
+    print(f"{summary['campuses']} campuses, {len(tables['anomalies'])} anomalies -> {args.out} ({summary['seconds']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from analytics import ALLOCATION_FACTORS, CO2_FACTORS, COST_FACTORS, POLICIES, POLICY_UTILITY, co2_emissions
+
+
+# Policy scenarios for every campus at once. A scenario is the reduction each
+# policy achieves (0 = not applied). Savings are linear in those reductions,
+# so the per-campus totals are turned once into a (campus × policy) matrix of
+# savings per unit of reduction, and a whole grid of scenarios is evaluated
+# for every campus with one matrix product.
+
+# Reductions swept per policy, matching the ranges of the Sustainability sliders.
+LEVELS = {
+    "Reduce Heating by 10%": np.linspace(0.0, 0.20, 5),
+    "Efficient Water Fixtures": np.linspace(0.0, 0.50, 6),
+    "Solar Panels Installed": np.linspace(0.0, 0.50, 6),
+    "Shorten Building Hours": np.linspace(0.0, 0.50, 6),
+}
+
+
+def scenario_grid(levels=LEVELS, policies=POLICIES):
+    # Every combination of the levels, one row per scenario and one column per policy.
+    mesh = np.meshgrid(*[np.asarray(levels[policy], dtype=float) for policy in policies], indexing="ij")
+    return pd.DataFrame(np.column_stack([m.ravel() for m in mesh]), columns=list(policies))
+
+
+def policy_combinations(reductions, policies=POLICIES):
+    # Every subset of `policies` (including none) at the given reductions.
+    applied = scenario_grid({policy: [0.0, 1.0] for policy in policies}, policies)
+    return applied * pd.Series(reductions)[list(policies)]
+
+
+def scenario_label(scenario):
+    applied = [policy for policy, reduction in scenario.items() if reduction > 0]
+    return " + ".join(applied) or "No policy"
+
+
+class ScenarioEngine:
+
+    def __init__(self, totals, co2_factors=CO2_FACTORS, cost_factors=COST_FACTORS, policies=POLICIES):
+        # `totals`: consumption per utility (columns) for every campus (rows).
+        self.policies = list(policies)
+        self.campuses = totals.index
+        self.co2_total = co2_emissions(totals, co2_factors)['total']
+        # CO₂ saved by a full (100%) reduction of each policy's utility.
+        self.co2_per_reduction = np.column_stack([
+            totals[POLICY_UTILITY[policy]].to_numpy() * co2_factors[POLICY_UTILITY[policy]] for policy in self.policies
+        ])
+        # Resources saved once a policy is applied, whatever its reduction.
+        self.resources_if_applied = np.column_stack([
+            ALLOCATION_FACTORS[policy][1] * totals[ALLOCATION_FACTORS[policy][0]].to_numpy() for policy in self.policies
+        ])
+        self.cost_per_resource = sum(cost_factors.values())
+
+    def evaluate(self, scenarios):
+        # (scenario × campus) frames of every metric for every scenario row.
+        reductions = scenarios[self.policies].to_numpy(dtype=float)
+        co2_saved = reductions @ self.co2_per_reduction.T
+        resources = (reductions > 0) @ self.resources_if_applied.T
+
+        def frame(values):
+            return pd.DataFrame(values, index=scenarios.index, columns=self.campuses)
+        return {
+            "co2_saved": frame(co2_saved),
+            "co2_after": frame(self.co2_total.to_numpy() - co2_saved),
+            "resource_savings": frame(resources),
+            "cost_savings": frame(resources * self.cost_per_resource),
+        }
+
+
+def frontier(effort, benefit):
+    # Labels of the scenarios no other scenario beats with at most the same
+    # effort, in order of effort.
+    order = np.lexsort((-benefit.to_numpy(), effort.to_numpy()))
+    values = benefit.to_numpy()[order]
+    efficient = np.r_[True, values[1:] > np.maximum.accumulate(values)[:-1]]
+    return effort.index[order[efficient]]
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from model_cache import model_cache
+from telemetry import timed
+
+
+SCORING_JOBS = int(os.environ.get("DASH_SCORING_JOBS", "-1"))
+SCORE_BATCH_ROWS = 256 * 1024
+
+# Feature name -> how it is derived from a frame with timestamp/consumption
+# (and campus_id for the baseline).
+FEATURES = {
+    "consumption": "raw consumption",
+    "hour": "hour of day",
+    "weekday": "day of week",
+    "vs_baseline": "consumption relative to the building's mean",
+}
+
+
+def feature_matrix(df, features, baselines=None, baseline_mean=None):
+    # Campuses without a baseline (not in the fit frame) are compared with
+    # `baseline_mean`, by default the mean of the baselines.
+    columns = []
+    for feature in features:
+        if feature == "consumption":
+            column = df['consumption']
+        elif feature == "hour":
+            column = df['hour'] if 'hour' in df else df['timestamp'].dt.hour
+        elif feature == "weekday":
+            column = df['weekday'].cat.codes if 'weekday' in df else df['timestamp'].dt.dayofweek
+        elif feature == "vs_baseline":
+            if baseline_mean is None:
+                baseline_mean = np.mean(list(baselines.values()))
+            column = df['consumption'] / df['campus_id'].map(baselines).astype(np.float64).fillna(baseline_mean)
+        else:
+            raise ValueError(f"Unknown anomaly feature {feature!r}; expected one of {list(FEATURES)}")
+        columns.append(np.asarray(column, dtype=np.float32))
+    return np.column_stack(columns)
+
+
+class IsolationScorer:
+    """IsolationForest over consumption and optional calendar/baseline features.
+
+    Fitted once and then reused: scoring splits the rows into fixed-size
+    batches that are scored in parallel threads, and flags are derived from
+    the decision function without any per-row Python.
+    """
+
+    def __init__(self, contamination=0.05, features=("consumption",), n_estimators=100, random_state=42):
+        self.contamination = contamination
+        self.features = tuple(features)
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.baselines = None
+        self.baseline_mean = None
+        self.model = None
+
+    @timed("model_fit", "isolation forest fit")
+    def fit(self, df, n_jobs=SCORING_JOBS):
+        from sklearn.ensemble import IsolationForest
+        if "vs_baseline" in self.features:
+            self.baselines = df.groupby('campus_id', observed=True)['consumption'].mean().to_dict()
+            self.baseline_mean = float(np.mean(list(self.baselines.values())))
+        X = feature_matrix(df, self.features, self.baselines, self.baseline_mean)
+        # Build the trees only, then set the contamination threshold from the
+        # batched scores, as IsolationForest.fit would with a serial pass.
+        self.model = IsolationForest(
+            n_estimators=self.n_estimators, contamination="auto",
+            random_state=self.random_state, n_jobs=n_jobs,
+        ).fit(X)
+        self.model.set_params(contamination=self.contamination, n_jobs=None)
+        self.model.offset_ = np.percentile(self._score_samples(X, n_jobs), 100.0 * self.contamination)
+        return self
+
+    def _score_samples(self, X, n_jobs=SCORING_JOBS, batch_rows=SCORE_BATCH_ROWS):
+        if len(X) <= batch_rows:
+            return self.model.score_samples(X)
+        from joblib import Parallel, delayed
+        batches = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(self.model.score_samples)(X[start:start + batch_rows])
+            for start in range(0, len(X), batch_rows)
+        )
+        return np.concatenate(batches)
+
+    def decision_function(self, df, n_jobs=SCORING_JOBS, batch_rows=SCORE_BATCH_ROWS):
+        # Negative for outliers, like IsolationForest.decision_function.
+        # Scorers pickled in the model cache before baseline_mean existed lack it.
+        X = feature_matrix(df, self.features, self.baselines, getattr(self, "baseline_mean", None))
+        return self._score_samples(X, n_jobs, batch_rows) - self.model.offset_
+
+    @timed("score", "isolation forest score")
+    def predict(self, df, n_jobs=SCORING_JOBS, batch_rows=SCORE_BATCH_ROWS):
+        # True for outliers.
+        return self.decision_function(df, n_jobs, batch_rows) < 0
+
+
+def fit_scorer(df, contamination=0.05, features=("consumption",), data_key=None):
+    # Scorer fitted on `df`, reused from the model cache when an identical one
+    # was fitted before. `data_key` (e.g. a dataset version) avoids hashing
+    # large frames to build the cache key.
+    params = {"contamination": contamination, "features": list(features)}
+    if data_key is None:
+        data_key = df[[c for c in ('campus_id', 'timestamp', 'consumption') if c in df]]
+    return model_cache.get_or_fit(
+        "isolation_forest", params, data_key,
+        lambda: IsolationScorer(contamination, features).fit(df),
+    )
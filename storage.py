@@ -0,0 +1,306 @@
+import functools
+import glob
+import hashlib
+import json
+import operator
+import os
+import shutil
+import tempfile
+import uuid
+from urllib.parse import unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# Root of the campus/year partitioned copies of the source parquet files.
+DATA_DIR = os.environ.get("DASH_DATA_DIR", "data")
+# Arrow IPC snapshots of the enriched frames and their rollups.
+CACHE_DIR = os.environ.get("DASH_CACHE_DIR", os.path.join(DATA_DIR, "_cache"))
+# Per-building forecasts written by batch forecasting runs.
+FORECAST_TABLE = os.path.join(DATA_DIR, "_forecasts", "forecasts.parquet")
+# Bump when the layout of the cached frames changes to invalidate old snapshots.
+CACHE_FORMAT = "3"
+ROWS_PER_GROUP = 64 * 1024
+# Rows per record batch when a dataset is streamed rather than loaded.
+SCAN_BATCH_ROWS = int(os.environ.get("DASH_SCAN_BATCH_ROWS", str(1024 * 1024)))
+REQUIRED_COLUMNS = ['timestamp', 'campus_id', 'consumption']
+
+# dataset name -> (parquet file, utility_type)
+DATASETS = {
+    "energy": ("building_consumption.parquet", "electricity"),
+    "gas": ("gas_consumption.parquet", "gas"),
+    "water": ("water_consumption.parquet", "water"),
+}
+
+
+def dataset_root(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def _partitioning(schema):
+    return ds.partitioning(pa.schema([schema.field('campus_id'), schema.field('year')]), flavor="hive")
+
+
+def build_partitioned_dataset(name):
+    # One-off conversion of the flat source file into
+    # data/<name>/campus_id=<id>/year=<yyyy>/*.parquet, sorted by timestamp so
+    # row-group statistics make date filters selective.
+    path, _ = DATASETS[name]
+    df = pd.read_parquet(path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values(['campus_id', 'timestamp'], kind="stable")
+    create_dataset(name, [df])
+
+
+def create_dataset(name, frames, data_dir=None):
+    # Write `frames` (timestamp/campus_id/consumption, each sorted by campus and
+    # time, no campus spread over two frames) as the partitioned dataset.
+    root = os.path.join(data_dir or DATA_DIR, name)
+    os.makedirs(os.path.dirname(root), exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{name}-", dir=os.path.dirname(root))
+    schema = None
+    for i, df in enumerate(frames):
+        df = df.assign(year=df['timestamp'].dt.year.astype('int16'))
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        schema = table.schema
+        ds.write_dataset(
+            table, tmp, format="parquet",
+            partitioning=_partitioning(schema),
+            basename_template=f"part-{i}-{{i}}.parquet",
+            max_rows_per_group=ROWS_PER_GROUP,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    pq.write_metadata(schema, os.path.join(tmp, "_common_metadata"))
+    try:
+        os.rename(tmp, root)
+    except OSError:
+        # Another worker finished the conversion first.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def open_dataset(name):
+    root = dataset_root(name)
+    if not os.path.isdir(root):
+        build_partitioned_dataset(name)
+    schema = pq.read_schema(os.path.join(root, "_common_metadata"))
+    return ds.dataset(root, schema=schema, format="parquet", partitioning=_partitioning(schema))
+
+
+def dataset_files(name):
+    # path -> (size, mtime_ns) of every data file currently in the dataset.
+    open_dataset(name)
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(dataset_root(name)):
+        dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+        for f in filenames:
+            if f.endswith(".parquet"):
+                path = os.path.join(dirpath, f)
+                stat = os.stat(path)
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def fingerprint(files):
+    digest = hashlib.sha1()
+    for path in sorted(files):
+        digest.update(f"{path}:{files[path]}".encode())
+    return digest.hexdigest()[:16]
+
+
+def read_files(name, paths):
+    dataset = open_dataset(name)
+    subset = ds.dataset(
+        sorted(paths), schema=dataset.schema, format="parquet",
+        partitioning=dataset.partitioning, partition_base_dir=dataset_root(name),
+    )
+    return subset.to_table().to_pandas()
+
+
+def scan_files(name, paths, batch_rows=SCAN_BATCH_ROWS):
+    # The readings of `paths` as a stream of DataFrames of at most `batch_rows`
+    # rows. Read-ahead is kept low so memory stays near one batch.
+    dataset = open_dataset(name)
+    subset = ds.dataset(
+        sorted(paths), schema=dataset.schema, format="parquet",
+        partitioning=dataset.partitioning, partition_base_dir=dataset_root(name),
+    )
+    batches = subset.to_batches(
+        columns=REQUIRED_COLUMNS, batch_size=batch_rows, batch_readahead=1, fragment_readahead=1,
+    )
+    for batch in batches:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def campus_files(files):
+    # Data files grouped by the campus_id=<id> partition they belong to.
+    groups = {}
+    for path in sorted(files):
+        groups.setdefault(os.path.basename(os.path.dirname(os.path.dirname(path))), []).append(path)
+    return groups
+
+
+def validate_batch(name, batch):
+    missing = [c for c in REQUIRED_COLUMNS if c not in batch.columns]
+    if missing:
+        raise ValueError(f"{name} batch is missing columns: {missing}")
+    batch = batch[REQUIRED_COLUMNS].reset_index(drop=True)
+    batch['timestamp'] = pd.to_datetime(batch['timestamp'], errors="coerce", format="mixed")
+    batch['consumption'] = pd.to_numeric(batch['consumption'], errors="coerce")
+    bad = batch.isna().any(axis=1) | (batch['consumption'] < 0)
+    if bad.any():
+        raise ValueError(f"{name} batch has {int(bad.sum())} rows with missing, unparseable or negative values")
+    schema = open_dataset(name).schema
+    batch['campus_id'] = pa.array(batch['campus_id']).cast(schema.field('campus_id').type).to_pandas()
+    return batch.drop_duplicates(['campus_id', 'timestamp'], keep="last")
+
+
+def write_batch(name, batch):
+    # Append a batch of readings as new files in the partitioned dataset,
+    # skipping readings that are already stored. Returns the rows written.
+    batch = validate_batch(name, batch)
+    existing = read_dataset(
+        name, batch['campus_id'].unique(), batch['timestamp'].min(),
+        batch['timestamp'].max() + pd.Timedelta(1, "ns"), columns=[],
+    )
+    if len(existing):
+        seen = pd.MultiIndex.from_frame(existing[['campus_id', 'timestamp']])
+        batch = batch[~pd.MultiIndex.from_frame(batch[['campus_id', 'timestamp']]).isin(seen)]
+    if batch.empty:
+        return batch
+    batch = batch.assign(year=batch['timestamp'].dt.year.astype('int16'))
+    dataset = open_dataset(name)
+    table = pa.Table.from_pandas(batch, schema=dataset.schema, preserve_index=False)
+    ds.write_dataset(
+        table, dataset_root(name), format="parquet",
+        partitioning=dataset.partitioning,
+        basename_template=f"ingest-{uuid.uuid4().hex}-{{i}}.parquet",
+        max_rows_per_group=ROWS_PER_GROUP,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return batch
+
+
+def read_dataset(name, campus_ids=None, start=None, end=None, columns=None):
+    # Filters are pushed down to pyarrow: campus_id and year prune whole
+    # partitions, the timestamp bounds ([start, end)) skip row groups, and only
+    # the requested columns are decoded.
+    dataset = open_dataset(name)
+    ts_type = dataset.schema.field('timestamp').type
+    filters = []
+    if campus_ids is not None:
+        filters.append(ds.field('campus_id').isin(list(campus_ids)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [ds.field('year') >= start.year, ds.field('timestamp') >= pa.scalar(start, type=ts_type)]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [ds.field('year') <= end.year, ds.field('timestamp') < pa.scalar(end, type=ts_type)]
+    if columns is not None:
+        columns = list(dict.fromkeys(['timestamp', 'campus_id'] + list(columns)))
+    expr = functools.reduce(operator.and_, filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def list_campuses(name):
+    root = dataset_root(name)
+    if not os.path.isdir(root):
+        build_partitioned_dataset(name)
+    schema = pq.read_schema(os.path.join(root, "_common_metadata"))
+    values = [unquote(d.split("=", 1)[1]) for d in os.listdir(root) if d.startswith("campus_id=")]
+    return sorted(pa.array(values).cast(schema.field('campus_id').type).to_pylist())
+
+
+def _write_ipc(table, path):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_ipc(path):
+    # Memory-mapped and uncompressed: numeric and datetime columns come back
+    # as read-only views of the page cache, shared by every process.
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _cache_prefix(name, kind):
+    return name if kind is None else f"{name}_{kind}"
+
+
+def write_frame_cache(name, df, rollups, files, kind=None, tag=""):
+    # Snapshot an enriched frame and its rollups, keyed by the fingerprint of
+    # the source files they were derived from. Older snapshots are removed.
+    # `kind` keeps a separate series of snapshots (e.g. rollups without rows);
+    # `tag` names anything else the rollups depend on (e.g. the tariff).
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    key = fingerprint(files)
+    prefix = _cache_prefix(name, kind)
+    base = os.path.join(CACHE_DIR, f"{prefix}-{key}")
+    for grain, cube in rollups.items():
+        _write_ipc(pa.Table.from_pandas(cube, preserve_index=False), f"{base}.{grain}.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **table.schema.metadata,
+        b"dash_format": CACHE_FORMAT.encode(),
+        b"dash_files": json.dumps(files).encode(),
+        b"dash_grains": json.dumps(sorted(rollups)).encode(),
+        b"dash_tag": tag.encode(),
+    })
+    _write_ipc(table, f"{base}.arrow")
+    for path in glob.glob(os.path.join(CACHE_DIR, f"{prefix}-*.arrow")):
+        if not path.startswith(base + "."):
+            os.remove(path)
+
+
+def read_frame_cache(name, kind=None, tag=""):
+    # Latest snapshot whose source files are all still present and unchanged,
+    # as (frame, rollups, files); files added since then are left for the
+    # caller to read incrementally. None when there is no usable snapshot.
+    snapshots = [
+        p for p in glob.glob(os.path.join(CACHE_DIR, f"{_cache_prefix(name, kind)}-*.arrow"))
+        if os.path.basename(p).count(".") == 1
+    ]
+    if not snapshots:
+        return None
+    path = max(snapshots, key=os.path.getmtime)
+    try:
+        metadata = pa.ipc.open_file(pa.memory_map(path)).schema.metadata
+        if metadata.get(b"dash_format") != CACHE_FORMAT.encode() or metadata.get(b"dash_tag") != tag.encode():
+            return None
+        files = {p: tuple(stat) for p, stat in json.loads(metadata[b"dash_files"]).items()}
+        current = dataset_files(name)
+        if any(current.get(p) != stat for p, stat in files.items()):
+            return None
+        base = path[:-len(".arrow")]
+        rollups = {grain: _read_ipc(f"{base}.{grain}.arrow") for grain in json.loads(metadata[b"dash_grains"])}
+        return _read_ipc(path), rollups, files
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+        return None
+
+
+def read_forecast_table():
+    try:
+        return pd.read_parquet(FORECAST_TABLE)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def write_forecast_table(forecasts):
+    # Replace the forecasts of the (model, utility, campus) series in
+    # `forecasts`, keeping every other series.
+    existing = read_forecast_table()
+    if existing is not None:
+        keys = ['model', 'utility', 'campus_id']
+        replaced = pd.MultiIndex.from_frame(existing[keys]).isin(pd.MultiIndex.from_frame(forecasts[keys].drop_duplicates()))
+        existing = existing[~replaced]
+        forecasts = pd.concat([existing, forecasts], ignore_index=True)
+    os.makedirs(os.path.dirname(FORECAST_TABLE), exist_ok=True)
+    tmp = f"{FORECAST_TABLE}.{uuid.uuid4().hex}.tmp"
+    forecasts.to_parquet(tmp, index=False)
+    os.replace(tmp, FORECAST_TABLE)
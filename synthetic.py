@@ -0,0 +1,161 @@
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage import DATASETS, create_dataset
+
+
+# Deterministic hourly gas, water and electricity readings at production size,
+# written straight into the partitioned layout the dashboard reads:
+#
+#   python synthetic.py data-10m --rows 10M --years 3
+#   DASH_DATA_DIR=data-10m streamlit run Home.py
+#
+# The same seed always gives the same readings, whatever the chunk size.
+# Injected anomalies are listed in <out>/_labels/<dataset>.parquet.
+
+# Base load per building (units/hour), seasonal amplitude and the day of the
+# year it peaks, the daily occupancy bump (height, peak hour, width in hours),
+# the weekend share of that bump and multiplicative noise.
+PROFILES = {
+    "energy": dict(base=80.0, annual=0.15, peak_day=200, daily=0.8, peak_hour=13, width=4.0, weekend=0.5, noise=0.08),
+    "gas": dict(base=30.0, annual=0.6, peak_day=15, daily=0.6, peak_hour=7, width=3.0, weekend=0.7, noise=0.12),
+    "water": dict(base=15.0, annual=0.2, peak_day=200, daily=1.2, peak_hour=12, width=3.0, weekend=0.4, noise=0.15),
+}
+# Anomaly kind -> (shortest, longest) duration in hours.
+ANOMALY_KINDS = {"spike": (1, 1), "shift": (24, 168), "leak": (24, 336), "dropout": (1, 12)}
+CHUNK_ROWS = 2_000_000
+
+
+def parse_rows(text):
+    # "10M", "2.5k", "1000000".
+    text = str(text).strip().upper().replace("_", "")
+    scale = {"K": 1e3, "M": 1e6, "B": 1e9}.get(text[-1:], 1)
+    return int(float(text.rstrip("KMB")) * scale)
+
+
+def hours(start, years):
+    start = pd.Timestamp(start)
+    return pd.date_range(start, start + pd.DateOffset(years=years), freq="H", inclusive="left")
+
+
+def profile_shape(ts, profile, seasonality=1.0):
+    # Expected consumption of a building with base load 1 at each timestamp.
+    day = ts.dayofyear.to_numpy()
+    hour = ts.hour.to_numpy()
+    annual = 1 + seasonality * profile["annual"] * np.cos(2 * np.pi * (day - profile["peak_day"]) / 365.25)
+    occupancy = np.exp(-0.5 * ((hour - profile["peak_hour"]) / profile["width"]) ** 2)
+    occupancy = occupancy * np.where(ts.dayofweek.to_numpy() >= 5, profile["weekend"], 1.0)
+    return annual * (1 + profile["daily"] * occupancy)
+
+
+def inject_anomalies(values, base, rng, rate):
+    # Modify `values` in place; returns (start, stop, kind, magnitude) per event.
+    events = []
+    n = len(values)
+    for _ in range(rng.poisson(rate * n)):
+        kind = list(ANOMALY_KINDS)[rng.integers(len(ANOMALY_KINDS))]
+        shortest, longest = ANOMALY_KINDS[kind]
+        start = int(rng.integers(n))
+        stop = min(n, start + int(rng.integers(shortest, longest + 1)))
+        if kind == "spike":
+            magnitude = rng.uniform(3, 6)
+            values[start:stop] *= magnitude
+        elif kind == "shift":
+            magnitude = rng.uniform(1.5, 2.5)
+            values[start:stop] *= magnitude
+        elif kind == "leak":
+            # Constant extra flow, most visible at night.
+            magnitude = rng.uniform(0.5, 1.5) * base
+            values[start:stop] += magnitude
+        else:
+            magnitude = 0.0
+            values[start:stop] = 0.0
+        events.append((start, stop, kind, magnitude))
+    return events
+
+
+def generate_campus(name, campus_id, ts, shape, seed=0, anomaly_rate=0.001):
+    # One building's readings, seeded by (seed, dataset, campus) alone.
+    profile = PROFILES[name]
+    rng = np.random.default_rng([seed, list(DATASETS).index(name), campus_id])
+    base = profile["base"] * rng.lognormal(0.0, 0.5)
+    values = base * shape * rng.lognormal(0.0, profile["noise"], len(ts))
+    events = inject_anomalies(values, base, rng, anomaly_rate)
+    readings = pd.DataFrame({"timestamp": ts, "campus_id": np.int64(campus_id), "consumption": values})
+    labels = pd.DataFrame(
+        [(campus_id, ts[start], ts[stop - 1], kind, magnitude) for start, stop, kind, magnitude in events],
+        columns=["campus_id", "start", "end", "kind", "magnitude"],
+    )
+    return readings, labels
+
+
+def generate(name, campuses, start="2023-01-01", years=1, seed=0, anomaly_rate=0.001, seasonality=1.0,
+             chunk_rows=CHUNK_ROWS):
+    # Yields (readings, labels) chunks of whole campuses, in campus order.
+    ts = hours(start, years)
+    shape = profile_shape(ts, PROFILES[name], seasonality)
+    per_chunk = max(1, chunk_rows // len(ts))
+    for first in range(1, campuses + 1, per_chunk):
+        parts = [
+            generate_campus(name, campus_id, ts, shape, seed, anomaly_rate)
+            for campus_id in range(first, min(campuses, first + per_chunk - 1) + 1)
+        ]
+        yield (
+            pd.concat([readings for readings, _ in parts], ignore_index=True),
+            pd.concat([labels for _, labels in parts], ignore_index=True),
+        )
+
+
+def write_synthetic(out, name, campuses, **kwargs):
+    # Writes <out>/<name>/ and <out>/_labels/<name>.parquet; returns (rows, anomalies).
+    labels = []
+    rows = [0]
+
+    def frames():
+        for readings, chunk_labels in generate(name, campuses, **kwargs):
+            rows[0] += len(readings)
+            labels.append(chunk_labels)
+            yield readings
+
+    create_dataset(name, frames(), data_dir=out)
+    labels = pd.concat(labels, ignore_index=True)
+    os.makedirs(os.path.join(out, "_labels"), exist_ok=True)
+    labels.to_parquet(os.path.join(out, "_labels", f"{name}.parquet"), index=False)
+    return rows[0], len(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic hourly utility readings.")
+    parser.add_argument("out", help="data directory to create (use it as DASH_DATA_DIR)")
+    parser.add_argument("--rows", type=parse_rows, default=parse_rows("1M"),
+                        help="rows per dataset, e.g. 1M, 10M, 100M; sets the number of campuses")
+    parser.add_argument("--campuses", type=int, help="number of buildings (overrides --rows)")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--anomaly-rate", type=float, default=0.001, help="anomalies per reading")
+    parser.add_argument("--seasonality", type=float, default=1.0, help="scales the annual cycle (0 disables it)")
+    parser.add_argument("--datasets", nargs="+", choices=sorted(DATASETS), default=list(DATASETS))
+    args = parser.parse_args()
+
+    periods = len(hours(args.start, args.years))
+    campuses = args.campuses or max(1, math.ceil(args.rows / periods))
+    for name in args.datasets:
+        if os.path.exists(os.path.join(args.out, name)):
+            parser.error(f"{os.path.join(args.out, name)} already exists")
+    for name in args.datasets:
+        start = time.perf_counter()
+        rows, anomalies = write_synthetic(
+            args.out, name, campuses, start=args.start, years=args.years, seed=args.seed,
+            anomaly_rate=args.anomaly_rate, seasonality=args.seasonality,
+        )
+        print(f"{name}: {rows:,} rows, {campuses} campuses, {anomalies} anomalies ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
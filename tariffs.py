@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Time-of-use tariffs. A reading's band (peak, shoulder or off-peak) depends on
+# the season of its month, the type of its day (weekday, weekend or holiday)
+# and its hour, and is found with one table lookup for a whole column of
+# timestamps. The dashboard uses one tariff, DEFAULT_SPEC unless
+# DASH_TARIFF_FILE names a JSON file with the same layout:
+#
+#   {"name": "summer peak",
+#    "seasons": {"summer": [6, 7, 8, 9], "winter": [1, 2, 3, 4, 5, 10, 11, 12]},
+#    "hours": {"summer": {"weekday": {"peak": [13, 14, 15, 16, 17, 18], "shoulder": [8, 9, 10, 11, 12]}},
+#              "winter": {"weekday": {"peak": [17, 18, 19, 20]}}},
+#    "holidays": ["2023-12-25", "2024-01-01"],
+#    "rates": {"electricity": {"peak": 0.21, "shoulder": 0.14, "off_peak": 0.08}, "gas": 0.08, "water": 0.005}}
+#
+# Hours not listed are off-peak; holidays follow the weekend hours unless the
+# season lists its own. A single rate applies to every band.
+
+BANDS = ["peak", "shoulder", "off_peak"]
+BAND_LABELS = {"peak": "Peak", "shoulder": "Shoulder", "off_peak": "Off-Peak"}
+DAY_TYPES = ["weekday", "weekend", "holiday"]
+
+PEAK_HOURS = list(range(6, 10)) + list(range(17, 22))
+NIGHT_HOURS = list(range(0, 7))  # Midnight to 6 AM
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+FLAT_RATES = {"electricity": 0.12, "gas": 0.08, "water": 0.005}  # USD per unit
+
+DEFAULT_SPEC = {
+    "name": "flat peak",
+    "seasons": {"all": list(range(1, 13))},
+    "hours": {"all": {"weekday": {"peak": PEAK_HOURS}, "weekend": {"peak": PEAK_HOURS}}},
+    "holidays": [],
+    "night_hours": NIGHT_HOURS,
+    "rates": FLAT_RATES,
+}
+
+
+class Tariff:
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get("name", "custom")
+        seasons = list(spec["seasons"])
+        self.month_season = np.full(13, -1, dtype=np.int8)
+        for i, season in enumerate(seasons):
+            self.month_season[spec["seasons"][season]] = i
+        if (self.month_season[1:] < 0).any():
+            raise ValueError(f"tariff {self.name!r}: seasons do not cover every month")
+
+        # (season, day type, hour) -> band code
+        self.table = np.full((len(seasons), len(DAY_TYPES), 24), BANDS.index("off_peak"), dtype=np.int8)
+        for i, season in enumerate(seasons):
+            days = spec.get("hours", {}).get(season, {})
+            for day_type in DAY_TYPES:
+                hours_by_band = days.get(day_type)
+                if hours_by_band is None and day_type == "holiday":
+                    hours_by_band = days.get("weekend")
+                for band, hours in (hours_by_band or {}).items():
+                    self.table[i, DAY_TYPES.index(day_type), hours] = BANDS.index(band)
+
+        self.holidays = pd.DatetimeIndex(pd.to_datetime(spec.get("holidays", []))).normalize()
+        self.night_hours = list(spec.get("night_hours", NIGHT_HOURS))
+        self.rates = {}
+        for utility, rate in spec["rates"].items():
+            rate = rate if isinstance(rate, dict) else dict.fromkeys(BANDS, rate)
+            missing = [band for band in self.bands() if band not in rate]
+            if missing:
+                raise ValueError(f"tariff {self.name!r}: no {utility} rate for {', '.join(missing)}")
+            self.rates[utility] = pd.Series({band: float(rate.get(band, 0.0)) for band in BANDS})
+        # Changes whenever the classification or the prices change.
+        self.key = hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+    def bands(self):
+        # Bands that occur in this tariff, in BANDS order.
+        used = set(np.unique(self.table))
+        return [band for i, band in enumerate(BANDS) if i in used]
+
+    def band_codes(self, timestamps):
+        # Calendar fields straight from the int64 nanoseconds, which is several
+        # times faster than the DatetimeIndex accessors.
+        ns = pd.DatetimeIndex(timestamps).asi8
+        days = ns // DAY_NS
+        hour = ns // HOUR_NS % 24
+        month = days.astype('M8[D]').astype('M8[M]').astype(np.int64) % 12 + 1
+        day_type = ((days + 3) % 7 >= 5).astype(np.int8)  # 1970-01-01 was a Thursday
+        if len(self.holidays):
+            day_type[np.isin(days, self.holidays.asi8 // DAY_NS)] = DAY_TYPES.index("holiday")
+        return self.table[self.month_season[month], day_type, hour]
+
+    def classify(self, timestamps):
+        # The band of every timestamp, as a Categorical over BANDS.
+        return pd.Categorical.from_codes(self.band_codes(timestamps), categories=BANDS)
+
+    def cost(self, usage, utility):
+        # Price the band columns of `usage` (consumption per band).
+        return usage * self.rates[utility][list(usage.columns)]
+
+
+def load_tariff(path=None):
+    if not path:
+        return Tariff(DEFAULT_SPEC)
+    with open(path, encoding="utf-8") as f:
+        return Tariff(json.load(f))
+
+
+TARIFF = load_tariff(os.environ.get("DASH_TARIFF_FILE"))
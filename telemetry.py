@@ -0,0 +1,251 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Span timing for the hot paths (dataset reads, derivation, filters, rollups,
+# model fits, scoring, chart serialization). Each span is attributed to the
+# page whose run started on the current thread and recorded as its self time,
+# so the stages of one run add up. Latency histograms and cache hit counters
+# are exported in Prometheus text format:
+#   DASH_METRICS_PORT=9464  serve /metrics from the dashboard process, on
+#                           localhost unless DASH_METRICS_HOST says otherwise
+#                           (e.g. 0.0.0.0 to expose it)
+#   DASH_METRICS_FILE=path  rewrite the file every DASH_METRICS_INTERVAL_S
+# api.py also serves them at /metrics. DASH_TELEMETRY=0 turns spans off.
+
+ENABLED = os.environ.get("DASH_TELEMETRY", "1") != "0"
+METRICS_PORT = int(os.environ.get("DASH_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("DASH_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("DASH_METRICS_FILE")
+METRICS_INTERVAL_S = float(os.environ.get("DASH_METRICS_INTERVAL_S", "15"))
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Spans outside a page run (API requests, pool threads) are attributed here.
+NO_PAGE = "background"
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+
+    def __init__(self):
+        self.histograms = {}  # (page, stage) -> Histogram
+        self.cache = {}  # (cache, "hit" | "miss") -> count
+        self.runs = {}  # page -> count
+        self._lock = threading.Lock()
+
+    def observe(self, page, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get((page, stage))
+            if histogram is None:
+                histogram = self.histograms[(page, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    def count_cache(self, cache, hit):
+        key = (cache, "hit" if hit else "miss")
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def count_run(self, page):
+        with self._lock:
+            self.runs[page] = self.runs.get(page, 0) + 1
+
+    def prometheus(self):
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            cache = dict(self.cache)
+            runs = dict(self.runs)
+        lines = [
+            "# HELP dash_stage_seconds Self time of instrumented spans by page and stage.",
+            "# TYPE dash_stage_seconds histogram",
+        ]
+        for (page, stage), (counts, total, count) in sorted(histograms.items()):
+            labels = f'page="{page}",stage="{stage}"'
+            cumulative = 0
+            for le, n in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f'dash_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"dash_stage_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"dash_stage_seconds_count{{{labels}}} {count}")
+        lines += ["# HELP dash_page_runs_total Page script runs.", "# TYPE dash_page_runs_total counter"]
+        lines += [f'dash_page_runs_total{{page="{page}"}} {n}' for page, n in sorted(runs.items())]
+        lines += ["# HELP dash_cache_requests_total Cache lookups by result.", "# TYPE dash_cache_requests_total counter"]
+        lines += [f'dash_cache_requests_total{{cache="{c}",result="{r}"}} {n}' for (c, r), n in sorted(cache.items())]
+        lines += ["# HELP dash_cache_hit_ratio Share of cache lookups that hit.", "# TYPE dash_cache_hit_ratio gauge"]
+        for name in sorted({c for c, _ in cache}):
+            hits, misses = cache.get((name, "hit"), 0), cache.get((name, "miss"), 0)
+            lines.append(f'dash_cache_hit_ratio{{cache="{name}"}} {hits / (hits + misses):.4f}')
+        return "\n".join(lines) + "\n"
+
+
+class Run:
+    # The spans of one page run, for the debug panel.
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.ended = self.started
+        self.spans = []  # (depth, stage, name, seconds, self seconds)
+
+    def stages(self):
+        totals = {}
+        for _, stage, _, _, own in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + own
+        return totals
+
+    @property
+    def seconds(self):
+        return self.ended - self.started
+
+
+registry = Registry()
+_local = threading.local()
+_exporters = threading.Lock()
+_exporting = False
+
+
+def begin_run(page):
+    # Attribute the spans of this thread to `page` from now on.
+    run = Run(page)
+    _local.run = run
+    _local.stack = []
+    registry.count_run(page)
+    start_exporters()
+    return run
+
+
+def current_page():
+    run = getattr(_local, "run", None)
+    return run.page if run is not None else NO_PAGE
+
+
+@contextmanager
+def attached(page):
+    # Attribute this thread's spans to `page` (e.g. from a fragment rerun or a
+    # pool thread), restoring the previous attribution afterwards.
+    previous = getattr(_local, "run", None), getattr(_local, "stack", [])
+    _local.run, _local.stack = Run(page), []
+    try:
+        yield _local.run
+    finally:
+        _local.run, _local.stack = previous
+
+
+@contextmanager
+def span(stage, name=None):
+    if not ENABLED:
+        yield
+        return
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = [0.0]  # time spent in child spans
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        seconds = end - start
+        stack.pop()
+        if stack:
+            stack[-1][0] += seconds
+        own = max(seconds - frame[0], 0.0)
+        run = getattr(_local, "run", None)
+        registry.observe(run.page if run is not None else NO_PAGE, stage, own)
+        if run is not None:
+            run.spans.append((len(stack), stage, name or stage, seconds, own))
+            run.ended = end
+
+
+def timed(stage, name=None):
+    # Decorator form of span().
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(page, stage, seconds):
+    # Record work timed elsewhere, e.g. a fit that ran in a worker process.
+    if ENABLED:
+        registry.observe(page, stage, seconds)
+
+
+def count_cache(cache, hit):
+    if ENABLED:
+        registry.count_cache(cache, hit)
+
+
+def _metrics_server(port, host=METRICS_HOST):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), MetricsHandler)
+
+
+def write_metrics(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.prometheus())
+    os.replace(tmp, path)
+
+
+def _write_forever(path):
+    while True:
+        time.sleep(METRICS_INTERVAL_S)
+        try:
+            write_metrics(path)
+        except OSError:
+            pass
+
+
+def start_exporters():
+    # Once per process: the /metrics endpoint and/or the metrics file writer.
+    global _exporting
+    with _exporters:
+        if _exporting or not ENABLED:
+            return
+        _exporting = True
+    if METRICS_PORT:
+        try:
+            server = _metrics_server(METRICS_PORT)
+        except OSError:
+            # Another process (e.g. a second replica) already serves the port.
+            server = None
+        if server is not None:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+    if METRICS_FILE:
+        threading.Thread(target=_write_forever, args=(METRICS_FILE,), daemon=True).start()
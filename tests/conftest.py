@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Tests are run from the repo root: `python -m pytest tests`. Anything written
+# outside a test's own directory (model cache, forecast table) goes to a
+# scratch directory rather than data/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DASH_DATA_DIR", tempfile.mkdtemp(prefix="dash-tests-"))
+
+import storage  # noqa: E402
+
+
+def make_readings(campuses=3, days=10, seed=0):
+    # Hourly readings for campuses 1..`campuses`, sorted by campus and time.
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2023-12-25", periods=days * 24, freq="H")
+    return pd.DataFrame({
+        "timestamp": np.tile(ts.values, campuses),
+        "campus_id": np.repeat(np.arange(1, campuses + 1), len(ts)).astype(np.int64),
+        "consumption": rng.uniform(10, 100, campuses * len(ts)),
+    })
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Every dataset written afresh under tmp_path, with its own snapshot cache.
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "CACHE_DIR", str(tmp_path / "_cache"))
+    for seed, name in enumerate(storage.DATASETS):
+        storage.create_dataset(name, [make_readings(seed=seed)])
+    return tmp_path
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+from utils import DatasetStore  # noqa: E402
+
+
+@pytest.fixture
+def client(data_dir, monkeypatch):
+    monkeypatch.setattr(api, "store", DatasetStore())
+    monkeypatch.setattr(api, "cache", api.ResponseCache())
+    monkeypatch.setattr(api, "_engines", type(api._engines)())
+    return TestClient(api.app)
+
+
+def test_etag_revalidation(client):
+    first = client.get("/rollups/gas", params={"by": "campus_id"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert [row["campus_id"] for row in first.json()] == [1, 2, 3]
+
+    # Same query and data: 304 without a body, or the cached body again.
+    revalidated = client.get("/rollups/gas", params={"by": "campus_id"}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    hits = api.cache.hits
+    again = client.get("/rollups/gas", params={"by": "campus_id"})
+    assert again.content == first.content and again.headers["etag"] == etag
+    assert api.cache.hits == hits + 1
+
+    # Other queries and formats get their own tags.
+    assert client.get("/rollups/gas", params={"by": "day"}).headers["etag"] != etag
+    arrow = client.get("/rollups/gas", params={"by": "campus_id", "format": "arrow"})
+    assert arrow.headers["content-type"] == api.ARROW_STREAM and arrow.headers["etag"] != etag
+
+
+def test_new_data_changes_the_etag(client):
+    first = client.get("/rollups/gas", params={"by": "campus_id"})
+    last = api.store.time_bounds("gas")[1]
+    api.store.ingest("gas", pd.DataFrame({"timestamp": [last + pd.Timedelta(hours=1)], "campus_id": [1], "consumption": [5.0]}))
+    after = client.get("/rollups/gas", params={"by": "campus_id"}, headers={"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != first.headers["etag"]
+    assert after.json()[0]["consumption"] == pytest.approx(first.json()[0]["consumption"] + 5.0)
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/rollups/gas", {"by": "year"}),
+    ("/rollups/gas", {"by": "day", "agg": "max"}),
+    ("/rollups/gas", {"by": "day", "format": "csv"}),
+    ("/anomalies/gas", {"window": 0}),
+    ("/anomalies/gas", {"z": -1}),
+    ("/outliers/gas", {"feature": "bogus"}),
+    ("/outliers/gas", {"contamination": 2}),
+    ("/co2", {"policy": "Plant Trees"}),
+])
+def test_invalid_queries_are_rejected(client, path, params):
+    assert client.get(path, params=params).status_code == 400
+    assert not api._engines
+
+
+def test_unknown_dataset(client):
+    assert client.get("/rollups/steam", params={"by": "day"}).status_code == 404
+
+
+def test_anomaly_engines_are_bounded(client, monkeypatch):
+    monkeypatch.setattr(api, "API_ENGINES", 2)
+    for window in (3, 4, 5, 3):
+        assert client.get("/anomalies/gas", params={"window": window}).status_code == 200
+    assert list(api._engines) == [("gas", 5, 1.5, 3.0), ("gas", 3, 1.5, 3.0)]
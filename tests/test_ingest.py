@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from storage import read_dataset, write_batch
+from utils import DatasetStore
+
+
+def readings(rows):
+    return pd.DataFrame(rows, columns=["timestamp", "campus_id", "consumption"])
+
+
+def test_write_batch_skips_stored_and_repeated_readings(data_dir):
+    last = read_dataset("gas", [1])['timestamp'].max()
+    new = last + pd.Timedelta(hours=1)
+    batch = readings([
+        (last, 1, 5.0),                 # already stored
+        (new, 1, 6.0),
+        (new, 1, 7.0),                  # same reading again; the last one wins
+        (str(new), 2, 8.0),             # timestamps may arrive as text
+    ])
+    written = write_batch("gas", batch)
+    assert len(written) == 2
+    stored = read_dataset("gas", start=new)
+    assert sorted(zip(stored['campus_id'], stored['consumption'])) == [(1, 7.0), (2, 8.0)]
+    # Writing the same batch again adds nothing.
+    assert write_batch("gas", batch).empty
+
+
+@pytest.mark.parametrize("batch, message", [
+    (pd.DataFrame({"timestamp": ["2024-01-10"], "consumption": [1.0]}), "missing columns"),
+    (readings([("2024-01-10", 1, -1.0)]), "negative"),
+    (readings([("not a date", 1, 1.0)]), "unparseable"),
+    (readings([("2024-01-10", 1, "n/a")]), "unparseable"),
+])
+def test_write_batch_rejects_invalid_readings(data_dir, batch, message):
+    rows = len(read_dataset("gas"))
+    with pytest.raises(ValueError, match=message):
+        write_batch("gas", batch)
+    assert len(read_dataset("gas")) == rows
+
+
+def test_ingest_updates_views_and_rollups(data_dir):
+    store = DatasetStore()
+    before = store.rollup("water", "campus_id")
+    last = store.time_bounds("water", [3])[1]
+    store.ingest("water", readings([(last + pd.Timedelta(hours=1), 3, 50.0)]))
+    after = store.rollup("water", "campus_id")
+    assert after[3] == pytest.approx(before[3] + 50.0)
+    assert after[[1, 2]].equals(before[[1, 2]])
+    assert store.time_bounds("water", [3])[1] == last + pd.Timedelta(hours=1)
+    assert len(store.view("water", [3])) == 10 * 24 + 1
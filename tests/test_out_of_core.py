@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import storage
+import utils
+from storage import DATASETS
+from utils import ROLLUP_GRAINS, DatasetStore
+
+
+def sorted_cube(cube):
+    return cube.sort_values(list(cube.columns[:-2]), ignore_index=True)
+
+
+def assert_same_store(in_core, streamed, name):
+    for grain in ROLLUP_GRAINS:
+        pd.testing.assert_frame_equal(
+            sorted_cube(streamed.rollups(name)[grain]), sorted_cube(in_core.rollups(name)[grain]),
+            check_dtype=False, check_categorical=False,
+        )
+    assert streamed.campuses(name) == in_core.campuses(name)
+    assert streamed.time_bounds(name) == in_core.time_bounds(name)
+    assert streamed.time_bounds(name, [2]) == in_core.time_bounds(name, [2])
+    assert streamed.version(name) == in_core.version(name)
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Stream in batches much smaller than a campus and merge often, so the
+    # partial rollups of one campus are split across batches and merges.
+    monkeypatch.setattr(utils, "scan_files", lambda name, paths: storage.scan_files(name, paths, batch_rows=100))
+    monkeypatch.setattr(utils, "MERGE_EVERY", 3)
+
+
+@pytest.mark.parametrize("name", list(DATASETS))
+def test_streamed_rollups_match_in_core(data_dir, small_batches, name):
+    assert_same_store(DatasetStore(out_of_core=()), DatasetStore(out_of_core=DATASETS), name)
+
+
+def test_streamed_rollups_match_after_ingest_and_snapshot(data_dir, small_batches):
+    streamed = DatasetStore(out_of_core=DATASETS)
+    streamed.rollups("gas")
+    last = streamed.time_bounds("gas")[1]
+    streamed.ingest("gas", pd.DataFrame({
+        "timestamp": [last + pd.Timedelta(hours=1), last + pd.Timedelta(hours=2)],
+        "campus_id": [1, 4],
+        "consumption": [5.0, 6.0],
+    }))
+    assert_same_store(DatasetStore(out_of_core=()), streamed, "gas")
+    # A new process starts from the rollup snapshot plus the new files.
+    assert_same_store(DatasetStore(out_of_core=()), DatasetStore(out_of_core=DATASETS), "gas")
+
+
+def test_streamed_views_read_the_partitioned_dataset(data_dir):
+    in_core, streamed = DatasetStore(out_of_core=()), DatasetStore(out_of_core=DATASETS)
+    start, end = pd.Timestamp("2023-12-28"), pd.Timestamp("2023-12-30")
+    columns = ['timestamp', 'campus_id', 'consumption']
+    expected = in_core.view("energy", [1, 3], start, end)[columns].reset_index(drop=True)
+    got = streamed.view("energy", [1, 3], start, end)
+    got = got.sort_values(['campus_id', 'timestamp'], ignore_index=True)[columns]
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
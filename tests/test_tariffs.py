@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tariffs import BANDS, DEFAULT_SPEC, PEAK_HOURS, Tariff
+
+SPEC = {
+    "name": "summer peak",
+    "seasons": {"summer": [6, 7, 8, 9], "winter": [1, 2, 3, 4, 5, 10, 11, 12]},
+    "hours": {
+        "summer": {"weekday": {"peak": [13, 14, 15, 16, 17, 18], "shoulder": [8, 9, 10, 11, 12]}},
+        "winter": {"weekday": {"peak": [17, 18, 19, 20]}, "holiday": {"shoulder": [10, 11]}},
+    },
+    "holidays": ["2024-07-04", "2024-12-25"],
+    "rates": {"electricity": {"peak": 0.21, "shoulder": 0.14, "off_peak": 0.08}, "gas": 0.08, "water": 0.005},
+}
+
+
+def reference_band(spec, ts):
+    # The band of one timestamp, read straight from the spec.
+    season = next(s for s, months in spec["seasons"].items() if ts.month in months)
+    days = spec.get("hours", {}).get(season, {})
+    if ts.normalize() in pd.to_datetime(spec.get("holidays", [])):
+        hours = days.get("holiday", days.get("weekend", {}))
+    else:
+        hours = days.get("weekend" if ts.dayofweek >= 5 else "weekday", {})
+    return next((band for band, band_hours in hours.items() if ts.hour in band_hours), "off_peak")
+
+
+@pytest.mark.parametrize("spec", [DEFAULT_SPEC, SPEC])
+def test_classify_matches_the_spec(spec):
+    # Every 7 hours cycles through each hour of each weekday over the year.
+    timestamps = pd.date_range("2023-12-20", "2025-01-10", freq="7H")
+    bands = Tariff(spec).classify(timestamps)
+    expected = [reference_band(spec, ts) for ts in timestamps]
+    assert list(bands.categories) == BANDS
+    assert list(bands.astype(str)) == expected
+
+
+def test_default_tariff_peak_hours():
+    timestamps = pd.date_range("2024-03-02", periods=48, freq="H")  # a weekend and a weekday
+    peak = Tariff(DEFAULT_SPEC).classify(timestamps) == "peak"
+    assert list(timestamps[peak].hour) == PEAK_HOURS * 2
+
+
+def test_holidays_follow_weekend_hours_unless_listed():
+    tariff = Tariff(SPEC)
+    # 2024-07-04 is a summer Thursday with no holiday or weekend hours: all off-peak.
+    assert set(tariff.classify(pd.date_range("2024-07-04", periods=24, freq="H"))) == {"off_peak"}
+    # 2024-12-25 is a winter Wednesday; winter lists its own holiday hours.
+    christmas = tariff.classify(pd.date_range("2024-12-25", periods=24, freq="H"))
+    assert [i for i, band in enumerate(christmas) if band == "shoulder"] == [10, 11]
+    assert "peak" not in set(christmas)
+
+
+def test_cost_prices_each_band():
+    tariff = Tariff(SPEC)
+    usage = pd.DataFrame({"peak": [10.0], "shoulder": [20.0], "off_peak": [30.0]})
+    cost = tariff.cost(usage, "electricity")
+    np.testing.assert_allclose(cost.iloc[0], [2.1, 2.8, 2.4])
+    np.testing.assert_allclose(tariff.cost(usage, "gas").iloc[0], [0.8, 1.6, 2.4])
+
+
+def test_invalid_specs_are_rejected():
+    with pytest.raises(ValueError, match="do not cover every month"):
+        Tariff({**SPEC, "seasons": {"summer": [6, 7, 8, 9]}})
+    with pytest.raises(ValueError, match="no electricity rate for shoulder"):
+        Tariff({**SPEC, "rates": {"electricity": {"peak": 0.2, "off_peak": 0.1}}})
+
+
+def test_key_changes_with_the_spec():
+    assert Tariff(SPEC).key == Tariff(dict(SPEC)).key
+    assert Tariff(SPEC).key != Tariff({**SPEC, "holidays": []}).key
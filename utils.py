@@ -1,56 +1,720 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from alignment import ALIGN_FREQ
+from analytics import cross_utility_kpis, daily_series, utility_table
+from anomalies import RollingAnomalyEngine
+from batch_forecast import batch_pool
+from decomposition import Decomposer, decompose_campuses, total_series
+from jobs import TrainingPool
+from optimization import hourly_profile, shift_load
+from scoring import fit_scorer
+from tariffs import TARIFF
+from telemetry import attached, begin_run, count_cache, current_page, span
+from storage import (
+    DATASETS, campus_files, dataset_files, fingerprint, list_campuses, read_dataset, read_files, read_frame_cache,
+    scan_files, write_batch, write_frame_cache,
+)
+
+log = logging.getLogger(__name__)
+
+# Upper bound for the shared dataset store, in MB (0 disables the budget).
+MEMORY_BUDGET_MB = float(os.environ.get("DASH_MEMORY_BUDGET_MB", "0"))
+# How often a resident dataset checks its partition directory for new batches.
+SYNC_INTERVAL_S = float(os.environ.get("DASH_SYNC_INTERVAL_S", "60"))
+# Show the previous run's span breakdown in the sidebar (also with ?debug=1).
+DEBUG_PANEL = os.environ.get("DASH_DEBUG_PANEL", "0") == "1"
+# Datasets kept out of core ("gas,water" or "all"): only their rollups are held,
+# built by streaming the Parquet files in batches; rows are read per request.
+OUT_OF_CORE = {
+    name.strip() for name in os.environ.get("DASH_OUT_OF_CORE", "").split(",") if name.strip()
+}
+OUT_OF_CORE = set(DATASETS) if "all" in OUT_OF_CORE else OUT_OF_CORE
+# Partial rollups merged at a time while streaming.
+MERGE_EVERY = 16
+# Name of the aligned multi-utility table in the store's stats and budget.
+UTILITY_TABLE = "utility_table"
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Pre-aggregated cubes kept next to each dataset. Every cube stores the sum and
+# count of `consumption`, so any coarser grouping (and its mean) can be
+# recombined from it without touching the raw rows.
+ROLLUP_GRAINS = {
+    "month": ['campus_id', 'month'],
+    "hour": ['campus_id', 'hour'],
+    "weekday_hour": ['campus_id', 'weekday', 'hour'],
+    "day": ['campus_id', 'day'],
+    "day_band": ['campus_id', 'day', 'band'],
+}
+
+
+def enrich(df, utility_type):
+    # Calendar columns are kept compact: small ints, datetime64 days and
+    # categoricals instead of per-row Python dates and strings.
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    ts = df['timestamp'].dt
+    df['year'] = ts.year.astype(np.int16)
+    df['month'] = ts.to_period("M").dt.to_timestamp()
+    df['hour'] = ts.hour.astype(np.int8)
+    df['day'] = ts.normalize()
+    df['weekday'] = pd.Categorical.from_codes(ts.dayofweek.to_numpy(), categories=WEEKDAYS, ordered=True)
+    df['utility_type'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[utility_type])
+    return df
+
+
+def sort_frame(df):
+    return df.sort_values(['campus_id', 'timestamp'], kind="mergesort", ignore_index=True)
+
+
+class CampusTimeIndex:
+    """Offsets of each campus's block in a frame sorted by (campus_id, timestamp).
+
+    Campus selections become dictionary lookups and date ranges binary searches
+    inside each block, so a selection is a handful of contiguous row ranges
+    rather than a full-column boolean mask.
+    """
+
+    def __init__(self, df):
+        campus = df['campus_id'].to_numpy()
+        self.timestamps = df['timestamp'].to_numpy()
+        self.n = len(campus)
+        starts = np.flatnonzero(np.r_[True, campus[1:] != campus[:-1]]) if self.n else np.array([], dtype=int)
+        stops = np.r_[starts[1:], self.n]
+        self.offsets = {campus[lo]: (int(lo), int(hi)) for lo, hi in zip(starts, stops)}
+
+    def ranges(self, campus_ids=None, start=None, end=None):
+        if campus_ids is None:
+            blocks = list(self.offsets.values()) if (start is not None or end is not None) else [(0, self.n)]
+        else:
+            blocks = sorted(self.offsets[c] for c in set(campus_ids) if c in self.offsets)
+        start = None if start is None else pd.Timestamp(start).to_datetime64()
+        end = None if end is None else pd.Timestamp(end).to_datetime64()
+        out = []
+        for lo, hi in blocks:
+            block = self.timestamps[lo:hi]
+            first = lo + int(np.searchsorted(block, start, "left")) if start is not None else lo
+            last = lo + int(np.searchsorted(block, end, "left")) if end is not None else hi
+            if first >= last:
+                continue
+            if out and out[-1][1] == first:
+                out[-1] = (out[-1][0], last)
+            else:
+                out.append((first, last))
+        return out
+
+    def bounds(self, campus_ids=None):
+        blocks = self.offsets.values() if campus_ids is None else [self.offsets[c] for c in campus_ids if c in self.offsets]
+        blocks = [(lo, hi) for lo, hi in blocks if hi > lo]
+        if not blocks:
+            return None, None
+        return (
+            pd.Timestamp(min(self.timestamps[lo] for lo, _ in blocks)),
+            pd.Timestamp(max(self.timestamps[hi - 1] for _, hi in blocks)),
+        )
+
+    def take(self, df, ranges):
+        # A single range is returned as a zero-copy slice.
+        if not ranges:
+            return df.iloc[0:0].copy(deep=False)
+        if len(ranges) == 1:
+            lo, hi = ranges[0]
+            return df.iloc[lo:hi].copy(deep=False)
+        return df.take(np.concatenate([np.arange(lo, hi) for lo, hi in ranges]))
+
+
+def build_rollups(df):
+    return {
+        grain: df.groupby(rollup_keys(df, keys), observed=True)['consumption'].agg(['sum', 'count']).reset_index()
+        for grain, keys in ROLLUP_GRAINS.items()
+    }
+
+
+def rollup_keys(df, keys):
+    # `band` (the tariff's time-of-use band) is looked up per row, not stored.
+    return [
+        pd.Series(TARIFF.classify(df['timestamp']), index=df.index, name='band') if key == 'band' else df[key]
+        for key in keys
+    ]
+
+
+def merge_rollups(rollups, *more):
+    return {
+        grain: pd.concat([rollups[grain]] + [new[grain] for new in more], ignore_index=True)
+        .groupby(ROLLUP_GRAINS[grain], observed=True)[['sum', 'count']].sum().reset_index()
+        for grain in rollups
+    }
+
+
+def time_bounds_of(df):
+    # First/last reading and row count per campus.
+    bounds = df.groupby('campus_id', observed=True)['timestamp'].agg(['min', 'max', 'count'])
+    return bounds.set_axis(['first', 'last', 'rows'], axis=1)
+
+
+def merge_bounds(bounds, *more):
+    return pd.concat([bounds, *more]).groupby(level='campus_id').agg({'first': 'min', 'last': 'max', 'rows': 'sum'})
+
+
+def stream_rollups(name, paths):
+    # Rollups and per-campus time bounds of `paths`, computed batch by batch:
+    # only partial aggregates are ever held, never the readings themselves.
+    empty = enrich(read_files(name, []), DATASETS[name][1])
+    rollups, bounds = build_rollups(empty), time_bounds_of(empty)
+    pending = []
+    for batch in scan_files(name, paths):
+        batch = enrich(batch, DATASETS[name][1])
+        pending.append((build_rollups(batch), time_bounds_of(batch)))
+        if len(pending) >= MERGE_EVERY:
+            rollups = merge_rollups(rollups, *[r for r, _ in pending])
+            bounds = merge_bounds(bounds, *[b for _, b in pending])
+            pending = []
+    if pending:
+        rollups = merge_rollups(rollups, *[r for r, _ in pending])
+        bounds = merge_bounds(bounds, *[b for _, b in pending])
+    return rollups, bounds
+
+
+def rollup_bytes(rollups):
+    return int(sum(r.memory_usage(deep=True).sum() for r in rollups.values()))
+
+
+class DatasetStore:
+    """Process-wide, read-only store of the enriched datasets.
+
+    One instance is shared by every Streamlit session (see ``get_store``), so
+    each dataset is held in memory once no matter how many users are connected.
+    Sessions only ever receive shallow copies, which lets pages add their own
+    columns without touching the shared frame.
+
+    Datasets in ``out_of_core`` are never held: their rollups and per-campus
+    time bounds are built by streaming the files, and rows are read from the
+    partitioned dataset for each request.
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, out_of_core=OUT_OF_CORE):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.out_of_core = set(out_of_core)
+        self._frames = OrderedDict()
+        self._bounds = {}
+        self._rollups = {}
+        self._versions = {}
+        self._files = {}
+        self._indexes = {}
+        self._synced_at = {}
+        self._stats = {}
+        # ((dataset versions, freq), (table, index, kpis)) of the utility table.
+        self._aligned = None
+        self._lock = threading.RLock()
+
+    def streamed(self, name):
+        return name in self.out_of_core
+
+    def _ensure(self, name):
+        # Load the dataset (or, out of core, its rollups) and sync it periodically.
+        with self._lock:
+            count_cache("dataset", name in self._rollups)
+            if name not in self._rollups:
+                self._load(name)
+            elif time.monotonic() - self._synced_at[name] > SYNC_INTERVAL_S:
+                self.sync(name)
+            if name in self._frames:
+                self._frames.move_to_end(name)
+
+    def get(self, name):
+        with self._lock:
+            self._ensure(name)
+            df = self._frames.get(name)
+        if df is None:
+            # Out of core: every row is read for this call and not kept.
+            with span("read", f"read all {name} rows"):
+                df = read_dataset(name)
+            with span("derive", f"derive {name}"):
+                df = sort_frame(enrich(df, DATASETS[name][1]))
+        return df
+
+    def batches(self, name):
+        # (frames sorted by campus and time, source files): the whole frame,
+        # or out of core one campus at a time from the files as of this call.
+        with self._lock:
+            self._ensure(name)
+            files = dict(self._files[name])
+            df = self._frames.get(name)
+        if df is not None:
+            return iter([df.copy(deep=False)]), files
+
+        def campus_frames():
+            for paths in campus_files(files).values():
+                with span("read", f"read {name} campus"):
+                    df = read_files(name, paths)
+                yield sort_frame(enrich(df, DATASETS[name][1]))
+        return campus_frames(), files
+
+    def ingest(self, name, batch):
+        # Validate and persist a batch of new readings, then fold it into the
+        # resident frame and rollups. Returns the rows actually added.
+        written = write_batch(name, batch)
+        with self._lock:
+            if name in self._rollups:
+                self.sync(name)
+        return written
+
+    def sync(self, name):
+        # Pick up batch files written since the last load (by this process or
+        # by `ingest.py`) without re-reading the history. Returns True when
+        # rows were added.
+        with self._lock:
+            files = dataset_files(name)
+            known = self._files[name]
+            self._synced_at[name] = time.monotonic()
+            if any(files.get(path) != stat for path, stat in known.items()):
+                self._load(name, use_cache=False)
+                return True
+            new = [path for path in files if path not in known]
+            if not new:
+                return False
+            if self.streamed(name):
+                with span("aggregate", f"stream new {name} files"):
+                    rollups, bounds = stream_rollups(name, new)
+                self._rollups[name] = merge_rollups(self._rollups[name], rollups)
+                self._bounds[name] = merge_bounds(self._bounds[name], bounds)
+                self._files[name] = files
+                self._versions[name] = fingerprint(files)
+                self._stats[name]["rows"] += int(bounds['rows'].sum())
+                self._stats[name]["bytes"] = self._streamed_bytes(name)
+                return True
+            with span("read", f"read new {name} files"):
+                batch = read_files(name, new)
+            with span("derive", f"merge new {name} rows"):
+                batch = enrich(batch, DATASETS[name][1])
+                self._frames[name] = sort_frame(pd.concat([self._frames[name], batch], ignore_index=True))
+                self._indexes[name] = CampusTimeIndex(self._frames[name])
+                self._rollups[name] = merge_rollups(self._rollups[name], build_rollups(batch))
+            self._files[name] = files
+            self._versions[name] = fingerprint(files)
+            stats = self._stats[name]
+            stats["rows"] += len(batch)
+            stats["bytes"] = int(self._frames[name].memory_usage(deep=True).sum()) + rollup_bytes(self._rollups[name])
+            self._enforce_budget(keep=name)
+            return True
+
+    def rollups(self, name):
+        with self._lock:
+            self._ensure(name)
+            return self._rollups[name]
+
+    def version(self, name):
+        with self._lock:
+            self._ensure(name)
+            return self._versions[name]
+
+    def files(self, name):
+        with self._lock:
+            self._ensure(name)
+            return dict(self._files[name])
+
+    def rollup(self, name, by, campus_ids=None, agg="sum"):
+        # Answer `groupby(by)['consumption'].agg(agg)` from the smallest cube
+        # that contains every requested key.
+        by = [by] if isinstance(by, str) else list(by)
+        rollups = self.rollups(name)
+        with span("aggregate", f"rollup {name} by {'/'.join(by)}"):
+            grain = min(
+                (g for g, keys in ROLLUP_GRAINS.items() if set(by) <= set(keys)),
+                key=lambda g: len(rollups[g]),
+            )
+            cube = rollups[grain]
+            if campus_ids is not None:
+                cube = cube[cube['campus_id'].isin(campus_ids)]
+            out = cube.groupby(by, observed=True)[['sum', 'count']].sum()
+            out['mean'] = out['sum'] / out['count']
+        if agg is None:
+            return out
+        return out[agg].rename('consumption')
+
+    def view(self, name, campus_ids=None, start=None, end=None, columns=None):
+        # Full-dataset requests go through the shared frame. Narrower ones are
+        # sliced from it when it is already resident, otherwise read straight
+        # from the partitioned dataset without loading everything.
+        if campus_ids is None and start is None and end is None:
+            return self.get(name).copy(deep=False)
+        with self._lock:
+            if name in self._frames:
+                # Synced like get(), so a slice is as fresh as the full view.
+                self._ensure(name)
+            df = self._frames.get(name)
+            index = self._indexes.get(name)
+        if df is None:
+            with span("read", f"read {name} subset"):
+                df = read_dataset(name, campus_ids, start, end, columns)
+            with span("derive", f"derive {name} subset"):
+                return enrich(df, DATASETS[name][1])
+        with span("filter", f"slice {name}"):
+            return index.take(df, index.ranges(campus_ids, start, end))
+
+    def utility_table(self, freq=ALIGN_FREQ):
+        # (table, CampusTimeIndex, per-campus KPIs) of every utility aligned on
+        # `freq` (see analytics.utility_table). One table is kept, for the
+        # current dataset versions, and counted in the memory budget.
+        with self._lock:
+            key = (tuple(self.version(name) for name in DATASETS), freq)
+            if self._aligned is not None and self._aligned[0] == key:
+                return self._aligned[1]
+            start = time.perf_counter()
+            with span("aggregate", "align utilities"):
+                table = utility_table(self, freq)
+                kpis = cross_utility_kpis(table)
+            with span("derive", "index utility table"):
+                index = CampusTimeIndex(table)
+            self._aligned = (key, (table, index, kpis))
+            self._stats[UTILITY_TABLE] = {
+                "rows": len(table),
+                "bytes": int(table.memory_usage(deep=True).sum() + kpis.memory_usage(deep=True).sum()),
+                "load_seconds": time.perf_counter() - start,
+                "source": "aligned",
+            }
+            self._enforce_budget(keep=UTILITY_TABLE)
+            return table, index, kpis
+
+    def time_bounds(self, name, campus_ids=None):
+        with self._lock:
+            self._ensure(name)
+            if name in self._indexes:
+                return self._indexes[name].bounds(campus_ids)
+            bounds = self._bounds[name]
+        if campus_ids is not None:
+            bounds = bounds[bounds.index.isin(campus_ids)]
+        bounds = bounds[bounds['rows'] > 0]
+        if bounds.empty:
+            return None, None
+        return pd.Timestamp(bounds['first'].min()), pd.Timestamp(bounds['last'].max())
+
+    def campuses(self, name):
+        with self._lock:
+            index = self._indexes.get(name)
+            bounds = self._bounds.get(name)
+        if index is not None:
+            return sorted(index.offsets)
+        if bounds is not None:
+            return sorted(bounds.index[bounds['rows'] > 0])
+        return list_campuses(name)
+
+    def evict(self, name):
+        with self._lock:
+            if name == UTILITY_TABLE:
+                self._aligned = None
+            self._frames.pop(name, None)
+            self._bounds.pop(name, None)
+            self._rollups.pop(name, None)
+            self._files.pop(name, None)
+            self._indexes.pop(name, None)
+            self._versions.pop(name, None)
+            self._synced_at.pop(name, None)
+            self._stats.pop(name, None)
+
+    def _load(self, name, use_cache=True):
+        # Start from the Arrow snapshot when one matches the source files and
+        # only derive what was ingested since; otherwise derive everything and
+        # leave a snapshot for the next process.
+        if self.streamed(name):
+            return self._load_streamed(name, use_cache)
+        start = time.perf_counter()
+        cached = None
+        if use_cache:
+            with span("read", f"read {name} snapshot"):
+                cached = read_frame_cache(name, tag=TARIFF.key)
+            count_cache("frame_snapshot", cached is not None)
+        if cached is None:
+            files = dataset_files(name)
+            with span("read", f"read {name} parquet"):
+                df = read_files(name, files)
+            with span("derive", f"derive {name}"):
+                df = sort_frame(enrich(df, DATASETS[name][1]))
+                rollups = build_rollups(df)
+            with span("snapshot", f"write {name} snapshot"):
+                write_frame_cache(name, df, rollups, files, tag=TARIFF.key)
+        else:
+            df, rollups, files = cached
+        self._frames[name] = df
+        with span("derive", f"index {name}"):
+            self._indexes[name] = CampusTimeIndex(df)
+        self._rollups[name] = rollups
+        self._files[name] = files
+        self._synced_at[name] = time.monotonic()
+        self._versions[name] = fingerprint(files)
+        self._stats[name] = {
+            "rows": len(df),
+            "bytes": int(df.memory_usage(deep=True).sum()) + rollup_bytes(rollups),
+            "load_seconds": time.perf_counter() - start,
+            "source": "parquet" if cached is None else "arrow cache",
+        }
+        if cached is not None and self.sync(name):
+            write_frame_cache(name, self._frames[name], self._rollups[name], self._files[name], tag=TARIFF.key)
+            self._stats[name]["load_seconds"] = time.perf_counter() - start
+        self._enforce_budget(keep=name)
+
+    def _load_streamed(self, name, use_cache=True):
+        # Out of core: rollups and per-campus bounds only, from their own
+        # snapshot or by streaming every file once.
+        start = time.perf_counter()
+        cached = None
+        if use_cache:
+            with span("read", f"read {name} rollup snapshot"):
+                cached = read_frame_cache(name, kind="streamed", tag=TARIFF.key)
+            count_cache("frame_snapshot", cached is not None)
+        if cached is None:
+            files = dataset_files(name)
+            with span("aggregate", f"stream {name} rollups"):
+                rollups, bounds = stream_rollups(name, files)
+            with span("snapshot", f"write {name} rollup snapshot"):
+                write_frame_cache(name, bounds.reset_index(), rollups, files, kind="streamed", tag=TARIFF.key)
+        else:
+            bounds, rollups, files = cached
+            bounds = bounds.set_index('campus_id')
+        self._bounds[name] = bounds
+        self._rollups[name] = rollups
+        self._files[name] = files
+        self._synced_at[name] = time.monotonic()
+        self._versions[name] = fingerprint(files)
+        self._stats[name] = {
+            "rows": int(bounds['rows'].sum()),
+            "bytes": self._streamed_bytes(name),
+            "load_seconds": time.perf_counter() - start,
+            "source": "streamed parquet" if cached is None else "rollup cache",
+        }
+        if cached is not None and self.sync(name):
+            write_frame_cache(
+                name, self._bounds[name].reset_index(), self._rollups[name], self._files[name],
+                kind="streamed", tag=TARIFF.key,
+            )
+            self._stats[name]["load_seconds"] = time.perf_counter() - start
 
+    def _streamed_bytes(self, name):
+        return int(self._bounds[name].memory_usage(deep=True).sum()) + rollup_bytes(self._rollups[name])
+
+    def _enforce_budget(self, keep):
+        if not self.budget_bytes:
+            return
+        # Drop the utility table, then the least recently used datasets, until
+        # we are back under budget; they are rebuilt on the next request.
+        for name in [UTILITY_TABLE] + list(self._frames):
+            if self.total_bytes() <= self.budget_bytes:
+                break
+            if name != keep:
+                self.evict(name)
+        if self.total_bytes() > self.budget_bytes:
+            log.warning(
+                "Dataset %r alone needs %.1f MB, above the %.1f MB memory budget.",
+                keep, self._stats[keep]['bytes'] / 1e6, self.budget_bytes / 1e6,
+            )
+
+    def total_bytes(self):
+        return sum(s["bytes"] for s in self._stats.values())
+
+    def memory_report(self):
+        with self._lock:
+            report = pd.DataFrame.from_dict(self._stats, orient="index", columns=["rows", "bytes", "load_seconds", "source"])
+        report.index.name = "dataset"
+        report["MB"] = report["bytes"] / 1e6
+        return report
+
+
+@st.cache_resource
+def get_store():
+    return DatasetStore()
+
+
+@st.cache_resource
+def get_anomaly_engine(name, window=7, threshold_factor=1.5, z_threshold=3.0):
+    return RollingAnomalyEngine(name, window, threshold_factor, z_threshold)
+
+
+@st.cache_resource(max_entries=16)
+def get_scorer(name, version, contamination, features):
+    return fit_scorer(get_store().view(name), contamination, features, data_key=f"{name}-{version}")
+
+
+@st.cache_resource(max_entries=16)
+def outlier_flags(name, version, contamination, features):
+    # Outlier mask over the rows of `name` at `version`, shared by every session.
+    return get_scorer(name, version, contamination, features).predict(get_store().view(name))
+
+
+@st.cache_resource(max_entries=16)
+def load_shift_plan(name, version, flexible, headroom, capacity):
+    # Hourly profile and statistics of the load shifting plan for `name` at
+    # `version`, shared by every session. The plan itself has a row per
+    # reading and is not kept.
+    plan, stats = shift_load(get_store().view(name), DATASETS[name][1], flexible, headroom, capacity)
+    return hourly_profile(plan), stats
+
+
+@st.cache_resource
+def get_decomposer():
+    return Decomposer()
+
+
+@st.cache_resource
+def get_training_pool():
+    return TrainingPool()
+
+
+@st.cache_resource
+def get_batch_pool():
+    return batch_pool()
+
+
+@st.cache_resource
+def get_batch_runs():
+    # model -> its latest BatchForecast, shared by every session.
+    return {}
+
+
+@st.cache_resource
+def get_backtests():
+    # utility -> its latest Backtest, shared by every session.
+    return {}
+
+
+def render_in_background(key, label, render, fn, *args, **kwargs):
+    # Run fn(*args, **kwargs) in the shared training pool and draw
+    # render(result) once it is ready. Until then a placeholder polls the job,
+    # so the rest of the page renders without waiting for the fit.
+    pool = get_training_pool()
+    job = pool.submit(key, fn, *args, **kwargs)
+    if job.done:
+        render(job.result)
+        return
+    page = current_page()
+
+    @st.fragment(run_every=2)
+    def placeholder():
+        with attached(page):
+            poll()
+
+    def poll():
+        job = pool.poll(key)
+        if job.done:
+            st.rerun()
+        elif job.active:
+            st.info(f"⏳ {label} is being trained in the background ({job.elapsed():.0f}s)…")
+            if st.button("Cancel", key=f"cancel-{key}"):
+                pool.cancel(key)
+        else:
+            st.warning(f"{label} {job.state}.")
+            if job.error:
+                st.caption(job.error.strip().splitlines()[-1])
+            if st.button("Retry", key=f"retry-{key}"):
+                st.rerun()
+
+    placeholder()
+
+
+def plotly_chart(fig, **kwargs):
+    # st.plotly_chart, timed as the page's chart stage (serialization included).
+    with span("chart", fig.layout.title.text or "chart"):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def debug_enabled():
+    return DEBUG_PANEL or st.query_params.get("debug") == "1"
+
+
+def debug_panel(run):
+    # Where the previous run of this page spent its time.
+    with st.sidebar.expander(f"⏱️ Last run: {run.seconds:.2f}s"):
+        stages = run.stages()
+        stages["page code"] = max(run.seconds - sum(stages.values()), 0.0)
+        st.dataframe(
+            pd.Series(stages, name="seconds").sort_values(ascending=False).round(4),
+            use_container_width=True,
+        )
+        st.dataframe(
+            pd.DataFrame(
+                [("  " * depth + name, stage, seconds, own) for depth, stage, name, seconds, own in run.spans],
+                columns=["span", "stage", "seconds", "self"],
+            ).round(4),
+            use_container_width=True, hide_index=True,
+        )
 
 
 class DataManager:
 
-    @st.cache_data
-    def load_gas(_self):
-        if "gas_data" not in st.session_state:
-
-            df_gas = pd.read_parquet("gas_consumption.parquet")
-            df_gas['timestamp'] = pd.to_datetime(df_gas['timestamp'])
-            df_gas['year'] = df_gas['timestamp'].dt.year
-            df_gas['month'] = df_gas['timestamp'].dt.to_period("M").dt.to_timestamp()
-            df_gas['hour'] = df_gas['timestamp'].dt.hour
-            df_gas['day'] = df_gas['timestamp'].dt.date
-            df_gas['weekday'] = df_gas['timestamp'].dt.day_name()
-            df_gas['utility_type'] = 'gas'
-
-
-            st.session_state["gas_data"] = df_gas
-        return st.session_state["gas_data"]
-    
-    def load_energy(_self):
-        if "energy_data" not in st.session_state:
-            df =  pd.read_parquet("building_consumption.parquet")
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['year'] = df['timestamp'].dt.year
-            df['month'] = df['timestamp'].dt.to_period("M").dt.to_timestamp()
-            df['hour'] = df['timestamp'].dt.hour
-            df['day'] = df['timestamp'].dt.date
-            df['weekday'] = df['timestamp'].dt.day_name()
-            df['utility_type'] = 'electricity'
-            st.session_state["energy_data"] = df
-        return st.session_state["energy_data"]
-
-    
-    @st.cache_data
-    def load_water(_self):
-        if "water_data" not in st.session_state:
-
-            df = pd.read_parquet("water_consumption.parquet")
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['year'] = df['timestamp'].dt.year
-            df['month'] = df['timestamp'].dt.to_period("M").dt.to_timestamp()
-            df['hour'] = df['timestamp'].dt.hour
-            df['day'] = df['timestamp'].dt.date
-            df['weekday'] = df['timestamp'].dt.day_name()
-
-            st.session_state["water_data"] = df
-        return st.session_state["water_data"]
+    def __init__(self, page):
+        self.store = get_store()
+        # Spans from here on belong to this run of `page`.
+        runs = st.session_state.setdefault("telemetry_runs", {})
+        if debug_enabled() and page in runs:
+            debug_panel(runs[page])
+        runs[page] = begin_run(page)
+
+    def load_gas(self, campus_ids=None, start=None, end=None, columns=None):
+        return self.store.view("gas", campus_ids, start, end, columns)
+
+    def load_energy(self, campus_ids=None, start=None, end=None, columns=None):
+        return self.store.view("energy", campus_ids, start, end, columns)
+
+    def load_water(self, campus_ids=None, start=None, end=None, columns=None):
+        return self.store.view("water", campus_ids, start, end, columns)
+
+    def campuses(self, name):
+        return self.store.campuses(name)
+
+    def time_bounds(self, name, campus_ids=None):
+        return self.store.time_bounds(name, campus_ids)
+
+    def ingest(self, name, batch):
+        return self.store.ingest(name, batch)
+
+    def rollup(self, name, by, campus_ids=None, agg="sum"):
+        return self.store.rollup(name, by, campus_ids, agg)
+
+    def version(self, name):
+        return self.store.version(name)
+
+    def daily_series(self, campus_ids=None):
+        return daily_series(self.store, campus_ids)
+
+    def utility_table(self, campus_ids=None, start=None, end=None, freq=ALIGN_FREQ):
+        # Every utility per campus and time step in one frame; see analytics.utility_table.
+        table, index, _ = self.store.utility_table(freq)
+        with span("filter", "slice utility table"):
+            return index.take(table, index.ranges(campus_ids, start, end))
+
+    def utility_kpis(self, freq=ALIGN_FREQ):
+        # Per-campus KPIs of the utility table; see analytics.cross_utility_kpis.
+        return self.store.utility_table(freq)[2]
+
+    def outliers(self, name, contamination=0.05, features=("consumption",)):
+        # IsolationForest outlier mask aligned with the rows of load_<name>().
+        return outlier_flags(name, self.version(name), contamination, tuple(features))
+
+    def load_shift(self, name, flexible=0.2, headroom=1.0, capacity=1.0):
+        # (average hourly profile, solver statistics); see optimization.shift_load.
+        return load_shift_plan(name, self.version(name), flexible, headroom, capacity)
+
+    def decompose(self, name, freq="D", method="STL", seasonalities=("weekly",), robust=False):
+        # (decomposition of the site total, "cached" | "extended" | "fitted").
+        return get_decomposer().decompose(
+            (name, "total", freq), total_series(self.store, name, freq), method, tuple(seasonalities), robust,
+        )
+
+    def decompose_campuses(self, name, freq="D", method="STL", seasonalities=("weekly",), robust=False):
+        # ({campus_id: decomposition}, {how: count}) for every campus.
+        return decompose_campuses(get_decomposer(), self.store, name, freq, method, tuple(seasonalities), robust)
+
+    def anomalies(self, name, window=7, threshold_factor=1.5, z_threshold=3.0):
+        return get_anomaly_engine(name, window, threshold_factor, z_threshold).refresh(self.store)
+
+    def memory_report(self):
+        return self.store.memory_report()
 
 
 
@@ -64,4 +728,3 @@ class DataManager:
 #df.to_parquet("building_consumption.parquet", compression="snappy")
 #df_water.to_parquet("water_consumption.parquet", compression="snappy")
 #df_gas.to_parquet("gas_consumption.parquet", compression="snappy")
-